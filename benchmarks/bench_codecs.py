@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark de codecs de imagem: para cada página de um conjunto de amostras,
+codifica com todos os codecs de IMAGE_CODECS e mede bytes (base64), tempo de
+codificação e fidelidade da decodificação.
+
+Fidelidade é medida em tons de cinza contra a página original: PSNR (dB) e a
+fração de pixels com erro acima de 64 tons, que indica traços de texto
+perdidos ou inventados. Ao final mostra o que encode_image escolheria com os
+codecs configurados (IMAGE_CODECS).
+
+Uso:
+    python benchmarks/bench_codecs.py [arquivos.pdf/imagens ...] [--paginas 10] [--max-size 1536] [--qualidade 85]
+"""
+
+import io
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageChops
+
+from src.image_codecs import IMAGE_CODECS, ACTIVE_CODECS, encode_image, fit_image, page_traits
+from src.rendering import iter_document_images
+from bench_rasterization import make_sample_pdf
+
+
+def fidelity(original: Image.Image, data: bytes):
+    """PSNR e fração de pixels muito divergentes, comparados em tons de cinza."""
+    with Image.open(io.BytesIO(data)) as decoded:
+        reference = original.convert("L")
+        diff = ImageChops.difference(reference, decoded.convert("L")).histogram()
+    total = sum(diff)
+    mse = sum(count * level * level for level, count in enumerate(diff)) / total
+    psnr = float("inf") if mse == 0 else 10 * math.log10(255 * 255 / mse)
+    return psnr, sum(diff[64:]) / total
+
+
+def sample_pages(paths, max_pages, max_size):
+    for path in paths:
+        for index, img in enumerate(iter_document_images(path, max_size)):
+            if index >= max_pages:
+                img.close()
+                break
+            yield f"{os.path.basename(path)}#{index + 1}", fit_image(img, max_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivos", nargs="*", help="PDFs/imagens de amostra (padrão: gera um PDF sintético)")
+    parser.add_argument("--paginas", type=int, default=10, help="Máximo de páginas por arquivo")
+    parser.add_argument("--max-size", type=int, default=1536, help="Maior lado da imagem enviada")
+    parser.add_argument("--qualidade", type=int, default=85, help="Qualidade dos codecs com perda")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    paths = args.arquivos
+    if not paths:
+        tmp_dir = tempfile.TemporaryDirectory()
+        paths = [os.path.join(tmp_dir.name, "amostra.pdf")]
+        make_sample_pdf(paths[0], args.paginas)
+
+    totals = {name: [0, 0.0, 0] for name in IMAGE_CODECS}  # bytes, segundos, páginas
+    chosen_bytes, chosen_time, chosen = 0, 0.0, {}
+    print(f"{'página':<24} {'codec':<11} {'KB':>8} {'ms':>8} {'PSNR':>7} {'erro>64':>8}  tipo")
+    for label, img in sample_pages(paths, args.paginas, args.max_size):
+        gray, bilevel = page_traits(img)
+        kind = "bilevel" if bilevel else ("cinza" if gray else "cor")
+        for name, codec in IMAGE_CODECS.items():
+            start = time.perf_counter()
+            data = codec.encode(img, args.qualidade)
+            elapsed = time.perf_counter() - start
+            size = len(data) * 4 // 3
+            psnr, broken = fidelity(img, data)
+            totals[name][0] += size
+            totals[name][1] += elapsed
+            totals[name][2] += 1
+            print(f"{label:<24} {name:<11} {size / 1024:>8.1f} {elapsed * 1000:>8.1f} {psnr:>7.1f} {broken:>8.2%}  {kind}")
+
+        start = time.perf_counter()
+        codec, data = encode_image(img, args.qualidade)
+        chosen_time += time.perf_counter() - start
+        chosen_bytes += len(data) * 4 // 3
+        chosen[codec.nome] = chosen.get(codec.nome, 0) + 1
+        img.close()
+
+    print("\nTotal por codec (todas as páginas, inclusive onde o codec não seria aplicável):")
+    for name, (size, elapsed, pages) in totals.items():
+        if pages:
+            print(f"  {name:<11} {size / 1024 / 1024:>8.2f}MB {elapsed / pages * 1000:>8.1f}ms/página")
+    active = ",".join(codec.nome for codec in ACTIVE_CODECS)
+    pages = sum(chosen.values())
+    if pages:
+        print(f"\nencode_image ({active}): {chosen_bytes / 1024 / 1024:.2f}MB, "
+              f"{chosen_time / pages * 1000:.1f}ms/página - escolhas: {chosen}")
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark de codificação de páginas: vazão (páginas/s) de iter_encoded_pages
+variando o número de threads de codificação JPEG.
+
+A renderização (PyMuPDF) continua sequencial; apenas redimensionamento,
+JPEG e base64 rodam em paralelo, então o ganho depende dos núcleos livres.
+
+Uso:
+    python benchmarks/bench_encoding.py [--pdf arquivo.pdf] [--paginas 40] [--workers 1 2 4 8]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.rendering import iter_encoded_pages
+from bench_rasterization import make_sample_pdf
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cpus})
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF a usar (padrão: gera um sintético)")
+    parser.add_argument("--paginas", type=int, default=40, help="Páginas do PDF sintético")
+    parser.add_argument("--max-size", type=int, default=1536, help="Maior lado da imagem enviada")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers,
+                        help=f"Números de threads a testar (padrão: {default_workers})")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    pdf_path = args.pdf
+    if not pdf_path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        pdf_path = os.path.join(tmp_dir.name, "amostra.pdf")
+        make_sample_pdf(pdf_path, args.paginas)
+
+    print(f"PDF: {pdf_path} - max_size={args.max_size} - núcleos disponíveis: {cpus}")
+    print(f"{'workers':>8} {'páginas/s':>12} {'speedup':>9}")
+    baseline = None
+    reference = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        pages = list(iter_encoded_pages(pdf_path, args.max_size, workers=workers))
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = pages
+        elif pages != reference:
+            print(f"❌ Saída com {workers} workers difere da execução sequencial")
+        rate = len(pages) / elapsed if elapsed > 0 else 0.0
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>12.1f} {rate / baseline:>8.2f}x")
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
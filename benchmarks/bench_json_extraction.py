@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de JSON das respostas do modelo: scanner de uma passada
+(find_json_span/parse_json_response) contra a implementação anterior com três
+regex DOTALL, a última um `\\{.*\\}` guloso.
+
+Cenários sintéticos, em vários tamanhos:
+- cercado:   análise grande dentro de ```json ... ```, com texto em volta
+- solto:     o mesmo JSON sem cerca, com texto e chaves depois dele
+- truncado:  cerca aberta e JSON cortado no meio (max_tokens)
+- chaves:    texto com muitas "{" sem fechamento (pior caso do regex guloso)
+
+Uso:
+    python benchmarks/bench_json_extraction.py [--tamanhos 10 100 400] [--repeticoes 20]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.json_repair import find_json_span, parse_json_response
+
+
+def legacy_clean_json_response(content: str) -> str:
+    """Implementação anterior (regex), mantida aqui só para comparação."""
+    content = content.strip()
+    match = re.search(r'```json\s*\n(.*?)\n```', content, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'```\s*\n(.*?)\n```', content, re.DOTALL)
+    if match:
+        candidate = match.group(1).strip()
+        if candidate.startswith('{') or candidate.startswith('['):
+            return candidate
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    if match:
+        return match.group(0).strip()
+    return content
+
+
+def analysis_json(target_kb: int) -> str:
+    """Análise com matrículas suficientes para ~target_kb KB de JSON."""
+    entry = {
+        "numero": "10000",
+        "proprietarios": ["Proprietário da Silva", "Cônjuge da Silva"],
+        "descricao": "Lote com frente para a Rua {A} e fundos para o lote \"B\"; área de 300 m²",
+        "confrontantes": ["Lote 2", "Rua 1", "matrícula 20000"],
+        "cadeia_dominial": [{"data": "01/01/2000", "transmitente": "A", "adquirente": "B"}],
+    }
+    count = max(1, target_kb * 1024 // len(json.dumps(entry, ensure_ascii=False)))
+    found = [dict(entry, numero=str(10000 + i)) for i in range(count)]
+    return json.dumps({"matriculas_encontradas": found, "matricula_principal": "10000",
+                       "reasoning": "Texto com {chaves} e ```crases``` dentro de strings."},
+                      ensure_ascii=False, indent=2)
+
+
+def scenarios(target_kb: int):
+    document = analysis_json(target_kb)
+    prose = "Segue a análise solicitada, conforme as regras {1} a {4}.\n"
+    return {
+        "cercado": prose + "```json\n" + document + "\n```\nObservação final {fim}.",
+        "solto": prose + document + "\nObservação: ver {anexo} e {outro}.",
+        "truncado": prose + "```json\n" + document[: len(document) // 2],
+        "chaves": "{ " * (target_kb * 512),
+    }
+
+
+def timed(fn, content: str, repeats: int):
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn(content)
+    return (time.perf_counter() - start) / repeats, result
+
+
+def parse_legacy(content: str):
+    return json.loads(legacy_clean_json_response(content))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10, 100, 400],
+                        help="Tamanhos das respostas sintéticas em KB")
+    parser.add_argument("--repeticoes", type=int, default=20, help="Execuções por medição")
+    args = parser.parse_args()
+
+    print(f"{'cenário':<10} {'KB':>6} {'regex ms':>10} {'scanner ms':>11} {'speedup':>8}  "
+          f"{'parse antigo ms':>15} {'parse novo ms':>14}  resultado")
+    for target_kb in args.tamanhos:
+        for name, content in scenarios(target_kb).items():
+            # O regex guloso é quadrático no cenário "chaves": limita as repetições
+            repeats = 1 if name == "chaves" else args.repeticoes
+            old_s, _ = timed(legacy_clean_json_response, content, repeats)
+            new_s, _ = timed(find_json_span, content, repeats)
+
+            def attempt(fn):
+                try:
+                    return timed(fn, content, repeats)[0], "ok"
+                except json.JSONDecodeError:
+                    return float("nan"), "erro"
+            old_parse_s, old_status = attempt(parse_legacy)
+            new_parse_s, new_status = attempt(parse_json_response)
+            print(f"{name:<10} {len(content) / 1024:>6.0f} {old_s * 1000:>10.2f} {new_s * 1000:>11.2f} "
+                  f"{old_s / new_s if new_s else 0:>7.1f}x  {old_parse_s * 1000:>15.2f} {new_parse_s * 1000:>14.2f}  "
+                  f"parse {old_status}/{new_status}")
+
+
+if __name__ == "__main__":
+    main()
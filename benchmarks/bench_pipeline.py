@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pipeline completo contra um servidor OpenRouter local (mock).
+
+Gera PDFs sintéticos de vários tamanhos, digitalizados (só imagem) e digitais
+(com camada de texto), e mede:
+
+- etapas isoladas: renderização (iter_document_images), image_to_base64, iter_encoded_pages,
+  montagem do payload (StreamingJSONBody) e parse_json_response;
+- análise completa de cada PDF (analyze_with_vision_llm) e do lote inteiro no
+  modo assíncrono (analyze_files), cada cenário num processo separado, com
+  vazão, pico de memória (RSS) e tempo por etapa (ver src/run_metrics.py).
+
+Com --json os resultados são gravados; com --comparar, tempos e memória acima
+da base mais a tolerância são apontados como regressão (código de saída 1).
+
+Uso:
+    python benchmarks/bench_pipeline.py [--paginas 1 5 20 60] [--latencia 0.5] [--latencia-mb 0.02]
+        [--modos sincrono assincrono] [--json atual.json] [--comparar base.json] [--tolerancia 0.2]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fitz  # PyMuPDF
+
+from bench_rasterization import make_sample_pdf
+from mock_openrouter import MockOpenRouter, analysis_content
+
+# Regressões menores que isto (segundos ou MB) são ignoradas, por serem ruído
+_MIN_ABS_DELTA = {"segundos": 0.05, "mb": 5.0}
+
+
+def make_scanned_pdf(path: str, pages: int, dpi: int = 150):
+    """PDF só com imagens: rasteriza o PDF sintético, como uma certidão digitalizada."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "texto.pdf")
+        make_sample_pdf(source_path, pages)
+        source, out = fitz.open(source_path), fitz.open()
+        try:
+            for page in source:
+                pix = page.get_pixmap(dpi=dpi)
+                new_page = out.new_page(width=page.rect.width, height=page.rect.height)
+                new_page.insert_image(new_page.rect, pixmap=pix)
+            out.save(path, deflate=True)
+        finally:
+            source.close()
+            out.close()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo atual (None se indisponível)."""
+    # VmHWM zera no exec; ru_maxrss herdaria o pico do processo pai no Linux
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa KB; macOS, bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# =========================
+# Etapas isoladas
+# =========================
+def run_micro(pdf_path: str, parse_repeats: int = 200) -> Dict[str, Dict[str, float]]:
+    from src import budgets, rendering, image_codecs, openrouter_api, prompts, json_repair
+    from src.openrouter_client import StreamingJSONBody
+
+    pages = len(fitz.open(pdf_path))
+    results: Dict[str, Dict[str, float]] = {}
+
+    max_edge = budgets.ENCODING_TIERS[0][0]
+    images, seconds = timed(lambda: list(rendering.iter_document_images(pdf_path, max_edge=max_edge)))
+    results["renderizacao"] = {"segundos": seconds, "por_pagina_ms": seconds / pages * 1000}
+
+    encoded, seconds = timed(lambda: [image_codecs.image_to_base64(img, max_size=1536) for img in images])
+    results["image_to_base64"] = {"segundos": seconds, "por_pagina_ms": seconds / pages * 1000,
+                                  "kb_por_pagina": sum(map(len, encoded)) / pages / 1024}
+    for img in images:
+        img.close()
+
+    data_urls, seconds = timed(lambda: list(rendering.iter_encoded_pages(pdf_path)))
+    results["iter_encoded_pages"] = {"segundos": seconds, "por_pagina_ms": seconds / pages * 1000,
+                                     "kb_por_pagina": sum(map(len, data_urls)) / pages / 1024}
+
+    def assemble():
+        body = StreamingJSONBody(openrouter_api.build_vision_payload(
+            "modelo", prompts.SYSTEM_PROMPT, prompts.build_analysis_prompt("vision"), data_urls))
+        size = len(body)
+        for _ in body:
+            pass
+        return size
+    size, seconds = timed(assemble)
+    results["montagem_payload"] = {"segundos": seconds, "mb": size / (1024 * 1024)}
+
+    content = analysis_content(matriculas=10)
+
+    def parse():
+        for _ in range(parse_repeats):
+            json_repair.parse_json_response(content)
+    _, seconds = timed(parse)
+    results["parse_json"] = {"segundos": seconds, "por_chamada_ms": seconds / parse_repeats * 1000}
+    return results
+
+
+# =========================
+# Análise completa (processo separado)
+# =========================
+def _scenario_worker(url: str, mode: str, pdf_paths: List[str], queue):
+    """Roda num processo novo: o pico de RSS medido é só deste cenário."""
+    os.environ.setdefault("LOG_FILE_DISABLED", "1")
+    from src import analysis, openrouter_api
+
+    openrouter_api.OPENROUTER_URL = url
+    started = time.perf_counter()
+    if mode == "assincrono":
+        results = analysis.analyze_files("modelo", pdf_paths, "chave", use_cache=False)
+    else:
+        results = [analysis.analyze_with_vision_llm("modelo", path, "chave", use_cache=False) for path in pdf_paths]
+    elapsed = time.perf_counter() - started
+
+    stages: Dict[str, float] = {}
+    for res in results:
+        for name, stage in res.metricas.get("etapas", {}).items():
+            stages[name] = stages.get(name, 0.0) + stage["segundos"]
+    queue.put({
+        "segundos": elapsed,
+        "pico_rss_mb": peak_rss_mb(),
+        "erros": sum(1 for res in results if res.reasoning.startswith("Erro na análise visual")),
+        "requisicoes": sum(res.metricas.get("requisicoes", 0) for res in results),
+        "mb_enviados": sum(res.metricas.get("bytes_enviados", 0) for res in results) / (1024 * 1024),
+        "etapas": stages,
+    })
+
+
+def run_scenario(url: str, mode: str, pdf_paths: List[str]) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_scenario_worker, args=(url, mode, pdf_paths, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+# =========================
+# Relatório e comparação
+# =========================
+def print_micro(name: str, micro: Dict[str, Dict[str, float]]):
+    print(f"\n[{name}] etapas isoladas")
+    for stage, values in micro.items():
+        details = ", ".join(f"{key} {value:.2f}" for key, value in values.items())
+        print(f"  {stage:<20} {details}")
+
+
+def print_scenario(name: str, pages: int, result: Dict):
+    files = len(result.get("arquivos", [])) or 1
+    print(f"\n[{name}] {result['segundos']:.2f}s - {pages / result['segundos']:.2f} pág/s - "
+          f"{files / result['segundos'] * 60:.1f} arquivo(s)/min - pico RSS "
+          f"{result['pico_rss_mb'] or 0:.0f}MB - {result['requisicoes']} requisição(ões), "
+          f"{result['mb_enviados']:.1f}MB enviados, {result['erros']} erro(s)")
+    ordered = sorted(result["etapas"].items(), key=lambda item: item[1], reverse=True)
+    print("  " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in ordered))
+
+
+def _numeric_metrics(report: Dict) -> Dict[str, float]:
+    """Achata o relatório em {"cenario.metrica": valor} para comparação."""
+    flat: Dict[str, float] = {}
+    for name, values in report.get("micro", {}).items():
+        for stage, stage_values in values.items():
+            flat[f"micro.{name}.{stage}.segundos"] = stage_values["segundos"]
+    for name, values in report.get("cenarios", {}).items():
+        flat[f"{name}.segundos"] = values["segundos"]
+        if values.get("pico_rss_mb") is not None:
+            flat[f"{name}.pico_rss_mb"] = values["pico_rss_mb"]
+    return flat
+
+
+def compare(base: Dict, current: Dict, tolerance: float) -> List[str]:
+    base_values, current_values = _numeric_metrics(base), _numeric_metrics(current)
+    regressions = []
+    for key, old in base_values.items():
+        new = current_values.get(key)
+        if new is None or old <= 0:
+            continue
+        min_delta = _MIN_ABS_DELTA["mb"] if key.endswith("_mb") else _MIN_ABS_DELTA["segundos"]
+        if new > old * (1 + tolerance) and new - old > min_delta:
+            regressions.append(f"{key}: {old:.3f} → {new:.3f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 5, 20, 60],
+                        help="Tamanhos (páginas) dos PDFs sintéticos")
+    parser.add_argument("--tipos", nargs="+", choices=["digitalizado", "digital"],
+                        default=["digitalizado", "digital"], help="Tipos de PDF gerados")
+    parser.add_argument("--modos", nargs="+", choices=["sincrono", "assincrono"],
+                        default=["sincrono", "assincrono"], help="Modos de análise completa")
+    parser.add_argument("--paginas-micro", type=int, default=10,
+                        help="Páginas do PDF usado nas etapas isoladas (0 = pular)")
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência do mock por requisição (s)")
+    parser.add_argument("--latencia-mb", type=float, default=0.02, help="Latência adicional por MB enviado (s)")
+    parser.add_argument("--erros", type=float, default=0.0, help="Fração de respostas HTTP 503 do mock")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo")
+    parser.add_argument("--comparar", help="Resultados de referência (gerados com --json)")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Aumento relativo tolerado antes de apontar regressão (padrão: 0.2)")
+    args = parser.parse_args()
+
+    report: Dict = {"parametros": vars(args), "micro": {}, "cenarios": {}}
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockOpenRouter(latency=args.latencia, latency_per_mb=args.latencia_mb, error_rate=args.erros) as mock:
+        print(f"Mock OpenRouter em {mock.url} (latência {args.latencia}s + {args.latencia_mb}s/MB)")
+
+        if args.paginas_micro > 0:
+            micro_pdf = os.path.join(tmp, "micro.pdf")
+            make_scanned_pdf(micro_pdf, args.paginas_micro)
+            name = f"digitalizado_{args.paginas_micro}p"
+            report["micro"][name] = run_micro(micro_pdf)
+            print_micro(name, report["micro"][name])
+
+        for kind in args.tipos:
+            paths = []
+            for pages in args.paginas:
+                path = os.path.join(tmp, f"{kind}_{pages}p.pdf")
+                (make_scanned_pdf if kind == "digitalizado" else make_sample_pdf)(path, pages)
+                paths.append(path)
+
+            for mode in args.modos:
+                if mode == "sincrono":
+                    for pages, path in zip(args.paginas, paths):
+                        name = f"{mode}.{kind}_{pages}p"
+                        result = run_scenario(mock.url, mode, [path])
+                        result["arquivos"] = [os.path.basename(path)]
+                        report["cenarios"][name] = result
+                        print_scenario(name, pages, result)
+                else:
+                    name = f"{mode}.{kind}_lote"
+                    result = run_scenario(mock.url, mode, paths)
+                    result["arquivos"] = [os.path.basename(path) for path in paths]
+                    report["cenarios"][name] = result
+                    print_scenario(name, sum(args.paginas), result)
+
+        report["mock"] = mock.stats()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.json}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        regressions = compare(base, report, args.tolerancia)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressão(ões) acima de {args.tolerancia:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n✅ Sem regressões acima de {args.tolerancia:.0%} em relação a {args.comparar}")
+
+
+if __name__ == "__main__":
+    main()
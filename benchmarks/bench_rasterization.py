@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark de rasterização: renderizar a 2x e reduzir (caminho antigo) versus
+renderizar direto no tamanho final (RGB e tons de cinza).
+
+Uso:
+    python benchmarks/bench_rasterization.py [--pdf arquivo.pdf] [--paginas 20] [--max-size 1536]
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from src.image_codecs import image_to_base64
+from src.rendering import iter_encoded_pages
+
+
+def make_sample_pdf(path: str, pages: int):
+    """Gera PDF sintético com texto denso, simulando uma certidão digitalizada."""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        page.insert_text((60, 60), f"REGISTRO DE IMÓVEIS - MATRÍCULA Nº {10000 + i}", fontsize=14)
+        for line in range(48):
+            page.insert_text(
+                (60, 90 + line * 15),
+                f"{line:02d} Confronta ao norte com o lote {line + 1}, ao sul com a Rua {i}, "
+                f"a leste com a matrícula {2000 + line}.",
+                fontsize=9,
+            )
+    doc.save(path)
+    doc.close()
+
+
+def legacy_pipeline(pdf_path: str, max_size: int):
+    """Reproduz o caminho antigo: Matrix(2.0) → PPM → PIL → thumbnail LANCZOS → JPEG."""
+    doc = fitz.open(pdf_path)
+    try:
+        for page in doc:
+            pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))
+            img = Image.open(io.BytesIO(pix.tobytes("ppm")))
+            yield image_to_base64(img, max_size=max_size)
+            img.close()
+    finally:
+        doc.close()
+
+
+def run_case(name: str, producer):
+    start = time.perf_counter()
+    total_bytes = 0
+    count = 0
+    for b64 in producer():
+        total_bytes += len(b64)
+        count += 1
+    elapsed = time.perf_counter() - start
+    count = count or 1
+    print(f"{name:<28} {elapsed / count * 1000:>9.1f} ms/pág {total_bytes / count / 1024:>9.1f} KB/pág")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF a usar (padrão: gera um sintético)")
+    parser.add_argument("--paginas", type=int, default=20, help="Páginas do PDF sintético")
+    parser.add_argument("--max-size", type=int, default=1536, help="Maior lado da imagem enviada")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    pdf_path = args.pdf
+    if not pdf_path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        pdf_path = os.path.join(tmp_dir.name, "amostra.pdf")
+        make_sample_pdf(pdf_path, args.paginas)
+
+    pages = len(fitz.open(pdf_path))
+    print(f"PDF: {pdf_path} ({pages} páginas) - max_size={args.max_size}")
+    print(f"{'caso':<28} {'tempo':>16} {'tamanho':>16}")
+    legacy = run_case("legado (2x + thumbnail)", lambda: legacy_pipeline(pdf_path, args.max_size))
+    direct = run_case("direto RGB", lambda: iter_encoded_pages(pdf_path, args.max_size, grayscale=False))
+    run_case("direto cinza", lambda: iter_encoded_pages(pdf_path, args.max_size, grayscale=True))
+    if direct > 0:
+        print(f"Ganho de tempo (direto RGB vs legado): {legacy / direct:.2f}x")
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita o endpoint de chat da OpenRouter, para benchmarks e
+testes manuais sem custo.
+
+Todo POST recebe uma análise JSON fixa (entre cercas ```json, como muitos
+modelos respondem) com `--matriculas` matrículas, campo usage estimado a partir
+do corpo (~1100 tokens por imagem) e latência de `--latencia` segundos mais
+`--latencia-mb` por MB recebido. Pedidos da pré-passagem de segmentação
+(cabeçalhos) recebem a mesma matrícula para todas as páginas. Com `--erros`,
+essa fração das requisições responde HTTP 503 (exercita as retentativas).
+Pedidos com "stream": true recebem server-sent events: a latência vira o tempo
+até o primeiro fragmento e o conteúdo chega em fragmentos ao longo de
+`--latencia-stream` segundos (OPENROUTER_STREAM=1 no aplicativo).
+
+Uso:
+    python benchmarks/mock_openrouter.py [--porta 8765] [--latencia 0.5] [--latencia-mb 0.02] [--erros 0] [--latencia-stream 1]
+    OPENROUTER_URL=http://127.0.0.1:8765/api/v1/chat/completions python -m src.cli analyze ...
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+TOKENS_PER_IMAGE = 1100
+STREAM_CHUNK_CHARS = 40
+# A mensagem de sistema vem no início do corpo; basta olhar o começo para classificar o pedido
+_SNIFF_BYTES = 4096
+
+
+def analysis_content(matriculas: int) -> str:
+    """Resposta de análise no formato do prompt de visão, com `matriculas` matrículas."""
+    found = [{
+        "numero": f"{10000 + i}",
+        "proprietarios": [f"Proprietário {i} da Silva", f"Cônjuge {i} da Silva"],
+        "descricao": f"Lote {i} da quadra {i % 7}, com área de {300 + i} m²",
+        "confrontantes": [f"Lote {i + 1}", f"Rua {i}", f"matrícula {20000 + i}"],
+        "evidence": [f"Matrícula nº {10000 + i} - fls. {i + 1}"],
+        "lote": str(i), "quadra": str(i % 7),
+        "cadeia_dominial": [{"data": "01/01/2000", "transmitente": "A", "adquirente": "B",
+                             "tipo_transmissao": "compra e venda", "registro": f"R.1/{10000 + i}"}],
+        "restricoes": [],
+    } for i in range(matriculas)]
+    document = {
+        "matriculas_encontradas": found,
+        "matricula_principal": found[0]["numero"] if found else None,
+        "matriculas_confrontantes": [m["numero"] for m in found[1:]],
+        "lotes_confrontantes": [{"identificador": f"Lote {i}", "tipo": "lote", "matricula_anexada": None,
+                                 "direcao": "norte"} for i in range(matriculas)],
+        "matriculas_nao_confrontantes": [],
+        "lotes_sem_matricula": [],
+        "confrontacao_completa": True,
+        "proprietarios_identificados": {m["numero"]: m["proprietarios"] for m in found},
+        "confidence": 90,
+        "reasoning": "Resposta sintética do servidor de benchmark.",
+    }
+    return "```json\n" + json.dumps(document, ensure_ascii=False, indent=2) + "\n```"
+
+
+def segmentation_content(pages: int) -> str:
+    return json.dumps({"paginas": [{"pagina": i + 1, "matricula": "10000"} for i in range(pages)]})
+
+
+class MockOpenRouter:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5,
+                 latency_per_mb: float = 0.02, error_rate: float = 0.0, matriculas: int = 3,
+                 seed: Optional[int] = 0, stream_duration: float = 1.0):
+        """
+        Servidor HTTP em thread própria
+
+        Args:
+            host: Endereço de escuta
+            port: Porta (0 = escolhida pelo sistema)
+            latency: Segundos de espera fixos por requisição
+            latency_per_mb: Segundos adicionais por MB de corpo recebido
+            error_rate: Fração de requisições respondidas com HTTP 503
+            matriculas: Matrículas na resposta de análise
+            seed: Semente dos erros simulados (None = aleatória)
+            stream_duration: Segundos para entregar o conteúdo em streaming
+        """
+        self.latency = latency
+        self.latency_per_mb = latency_per_mb
+        self.error_rate = error_rate
+        self.stream_duration = stream_duration
+        self.content = analysis_content(matriculas)
+        self.requests = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self) -> "MockOpenRouter":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openrouter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockOpenRouter":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"requisicoes": self.requests, "erros": self.errors, "bytes_recebidos": self.bytes_received}
+
+    def _respond(self, body: bytes):
+        """(status, resposta JSON, espera em segundos) para um pedido."""
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        delay = self.latency + self.latency_per_mb * len(body) / (1024 * 1024)
+        if fail:
+            return 503, {"error": {"message": "sobrecarga simulada"}}, delay
+
+        images = body.count(b'"image_url"')
+        if "cabeçalhos".encode("utf-8") in body[:_SNIFF_BYTES]:
+            content = segmentation_content(images)
+        else:
+            content = self.content
+        completion = len(content) // 4
+        # Só texto: ~4 bytes por token; com imagens, tokens por imagem mais os prompts
+        prompt = images * TOKENS_PER_IMAGE + 2000 if images else len(body) // 4
+        response = {
+            "id": "mock",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": completion,
+                      "total_tokens": prompt + completion, "cost": (prompt + completion) * 1e-6},
+        }
+        return 200, response, delay
+
+    def _stream_events(self, response: Dict):
+        """Eventos SSE (bytes, espera antes do envio) equivalentes à resposta completa."""
+        content = response["choices"][0]["message"]["content"]
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)] or [""]
+        pause = self.stream_duration / len(pieces)
+        yield b": OPENROUTER PROCESSING\n\n", 0.0
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            event = {"id": "mock", "model": "mock", "choices": [{
+                "index": 0, "delta": {"role": "assistant", "content": piece},
+                "finish_reason": "stop" if last else None}]}
+            if last:
+                event["usage"] = response["usage"]
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"), pause
+        yield b"data: [DONE]\n\n", 0.0
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _read_body(self) -> bytes:
+                if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+                    parts = []
+                    while True:
+                        size = int(self.rfile.readline().strip() or b"0", 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return b"".join(parts)
+                        parts.append(self.rfile.read(size))
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                body = self._read_body()
+                status, response, delay = mock._respond(body)
+                time.sleep(delay)
+                if status == 200 and b'"stream":true' in body[-_SNIFF_BYTES:].replace(b" ", b""):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    self.close_connection = True
+                    try:
+                        for event, pause in mock._stream_events(response):
+                            time.sleep(pause)
+                            self.wfile.write(event)
+                            self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # cliente cancelou no meio do streaming
+                    return
+                payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # cliente cancelou a requisição
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8765, help="Porta de escuta")
+    parser.add_argument("--latencia", type=float, default=0.5, help="Segundos por requisição")
+    parser.add_argument("--latencia-mb", type=float, default=0.02, help="Segundos adicionais por MB recebido")
+    parser.add_argument("--erros", type=float, default=0.0, help="Fração de respostas HTTP 503")
+    parser.add_argument("--matriculas", type=int, default=3, help="Matrículas na resposta")
+    parser.add_argument("--latencia-stream", type=float, default=1.0,
+                        help="Segundos para entregar o conteúdo em streaming")
+    args = parser.parse_args()
+
+    mock = MockOpenRouter(port=args.porta, latency=args.latencia, latency_per_mb=args.latencia_mb,
+                          error_rate=args.erros, matriculas=args.matriculas, seed=None,
+                          stream_duration=args.latencia_stream)
+    print(f"Mock OpenRouter em {mock.url} (Ctrl+C para sair)")
+    try:
+        mock.start()._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+        print(mock.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ if os.path.exists(matriculas_path):
     datas.append((matriculas_path, 'matrículas'))
 
 binaries = []
-hiddenimports = ['PIL._tkinter_finder', 'requests', 'fitz', 'pdf2image', 'dotenv', 'src', 'src.main', 'tkinter']
+hiddenimports = ['PIL._tkinter_finder', 'requests', 'fitz', 'pdf2image', 'dotenv', 'src', 'src.main', 'src.analysis', 'tkinter']
 
 # Coleta dependências do PIL (essencial)
 try:
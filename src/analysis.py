@@ -0,0 +1,367 @@
+"""Pipeline de análise de matrículas, independente da interface gráfica.
+
+Escolhe, por arquivo, entre a camada de texto, a análise em blocos e a chamada
+única de visão, com cache de resultados, orçamento de tokens e prazo por arquivo.
+Não importa tkinter, permitindo o uso tanto pela GUI (``main.py``) quanto pelo
+modo em lote (``cli.py``).
+"""
+
+import os
+import asyncio
+from typing import List, Dict, Optional, Callable, Tuple
+
+try:
+    from .settings import env_int
+    from .results import AnalysisResult, build_analysis_result, parse_vision_content
+    from .prompts import SYSTEM_PROMPT, AGGREGATE_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT, build_analysis_prompt
+    from .image_codecs import ACTIVE_CODECS
+    from .budgets import ENCODING_TIERS, MAX_PAYLOAD_MB, MANY_PAGES_THRESHOLD, TokenBudget, BudgetExceededError
+    from .page_filter import PAGE_FILTER, new_page_filter
+    from .rendering import (MAX_RENDER_DPI, RENDER_GRAYSCALE, AUTO_CROP, get_pdf_page_count, prepare_slot,
+                            prepare_vision_images)
+    from .chunking import MAP_REDUCE_PAGE_THRESHOLD, MAP_REDUCE_CHUNK_PAGES, analyze_in_chunks, analyze_in_chunks_async
+    from .segmentation import SEGMENTATION_MODE, SEGMENT_MIN_PAGES, plan_document_chunks, plan_document_chunks_async
+    from .text_layer import TEXT_FAST_PATH, extract_text_layer, analyze_text_with_llm, analyze_text_with_llm_async
+    from .openrouter_api import call_openrouter_vision, call_openrouter_vision_async, stream_items
+    from .openrouter_client import AsyncOpenRouterClient
+    from .result_cache import get_result_cache, file_sha256, text_sha256, make_cache_key
+    from .log_config import get_logger
+    from .run_metrics import span, track_run, current_metrics
+    from .cancellation import CancelToken, AnalysisCancelledError, cancel_scope, check_cancelled
+except ImportError:
+    from settings import env_int
+    from results import AnalysisResult, build_analysis_result, parse_vision_content
+    from prompts import SYSTEM_PROMPT, AGGREGATE_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT, build_analysis_prompt
+    from image_codecs import ACTIVE_CODECS
+    from budgets import ENCODING_TIERS, MAX_PAYLOAD_MB, MANY_PAGES_THRESHOLD, TokenBudget, BudgetExceededError
+    from page_filter import PAGE_FILTER, new_page_filter
+    from rendering import (MAX_RENDER_DPI, RENDER_GRAYSCALE, AUTO_CROP, get_pdf_page_count, prepare_slot,
+                           prepare_vision_images)
+    from chunking import MAP_REDUCE_PAGE_THRESHOLD, MAP_REDUCE_CHUNK_PAGES, analyze_in_chunks, analyze_in_chunks_async
+    from segmentation import SEGMENTATION_MODE, SEGMENT_MIN_PAGES, plan_document_chunks, plan_document_chunks_async
+    from text_layer import TEXT_FAST_PATH, extract_text_layer, analyze_text_with_llm, analyze_text_with_llm_async
+    from openrouter_api import call_openrouter_vision, call_openrouter_vision_async, stream_items
+    from openrouter_client import AsyncOpenRouterClient
+    from result_cache import get_result_cache, file_sha256, text_sha256, make_cache_key
+    from log_config import get_logger
+    from run_metrics import span, track_run, current_metrics
+    from cancellation import CancelToken, AnalysisCancelledError, cancel_scope, check_cancelled
+
+logger = get_logger("analysis")
+
+# Número de arquivos analisados simultaneamente (chamadas de visão em paralelo)
+MAX_PARALLEL_FILES = env_int("ANALYSIS_MAX_WORKERS", 3)
+
+# Prazo por arquivo em segundos (0 = sem prazo); ao expirar, a análise é interrompida
+ANALYSIS_FILE_TIMEOUT = env_int("ANALYSIS_FILE_TIMEOUT", 0, minimum=0)
+
+# Versão do pipeline na chave do cache; incremente ao mudar a preparação das imagens
+PIPELINE_CACHE_VERSION = "2"
+
+
+def _image_pipeline_options() -> str:
+    """Opções da preparação das imagens que também alteram o resultado (entram na chave do cache)."""
+    return (f"filtro={int(PAGE_FILTER)};recorte={int(AUTO_CROP)};"
+            f"codecs={','.join(codec.nome for codec in ACTIVE_CODECS)};"
+            f"cinza={int(RENDER_GRAYSCALE)};dpi={MAX_RENDER_DPI};payload_mb={MAX_PAYLOAD_MB};"
+            f"degraus={','.join(f'{edge}q{quality}' for edge, quality in ENCODING_TIERS)};"
+            f"muitas_paginas={MANY_PAGES_THRESHOLD}")
+
+
+_IMAGE_PIPELINE_OPTIONS = _image_pipeline_options()
+ANALYSIS_PROMPT_HASH = text_sha256(SYSTEM_PROMPT, build_analysis_prompt('vision'), PIPELINE_CACHE_VERSION,
+                                   _IMAGE_PIPELINE_OPTIONS)
+TEXT_PROMPT_HASH = text_sha256(SYSTEM_PROMPT, AGGREGATE_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT,
+                               PIPELINE_CACHE_VERSION, "texto")
+MAP_REDUCE_PROMPT_HASH = text_sha256(SYSTEM_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT, PIPELINE_CACHE_VERSION,
+                                     str(MAP_REDUCE_CHUNK_PAGES), SEGMENTATION_MODE, _IMAGE_PIPELINE_OPTIONS)
+
+
+def new_cancel_token(parent: Optional[CancelToken] = None,
+                     timeout: Optional[float] = None, armed: bool = True) -> Optional[CancelToken]:
+    """Token de um arquivo, com prazo e cancelado junto com parent; None se não houver nenhum dos dois."""
+    timeout = ANALYSIS_FILE_TIMEOUT if timeout is None else timeout
+    if not timeout and parent is None:
+        return None
+    return CancelToken(timeout, parent, armed=armed)
+
+
+@span("cache")
+def _lookup_cached_result(model: str, file_path: str, use_cache: bool,
+                          prompt_hash: str = ANALYSIS_PROMPT_HASH) -> Tuple[Optional[str], Optional[Dict]]:
+    """Retorna (chave do cache, JSON em cache). A chave é None quando o cache não se aplica."""
+    cache = get_result_cache()
+    if not (use_cache and cache.enabled):
+        return None, None
+    try:
+        cache_key = make_cache_key(file_sha256(file_path), model, prompt_hash)
+        return cache_key, cache.get(cache_key)
+    except OSError as e:
+        logger.warning("⚠️ Cache indisponível para %s: %s", os.path.basename(file_path), e)
+        return None, None
+
+
+def _analysis_error_result(fname_placeholder: str, e: Exception) -> AnalysisResult:
+    """Loga o erro e retorna o resultado estruturado de falha da análise visual."""
+    if isinstance(e, BudgetExceededError):
+        logger.warning("🪙 %s não analisado: %s", fname_placeholder, e)
+    elif isinstance(e, AnalysisCancelledError):
+        logger.info("⏹️ %s interrompido: %s", fname_placeholder, e)
+    else:
+        logger.error("🚨 Erro na análise visual de %s: %s: %s", fname_placeholder, type(e).__name__, e,
+                     exc_info=e)
+    
+    # Se análise visual falhar, retorna erro estruturado
+    return AnalysisResult(
+        arquivo=fname_placeholder,
+        matriculas_encontradas=[],
+        matricula_principal=None,
+        matriculas_confrontantes=[],
+        lotes_confrontantes=[],
+        matriculas_nao_confrontantes=[],
+        lotes_sem_matricula=[],
+        confrontacao_completa=None,
+        proprietarios_identificados={},
+        confidence=None,
+        reasoning=f"Erro na análise visual: {str(e)}",
+        raw_json={}
+    )
+
+
+def may_use_chunks(file_path: str) -> Tuple[bool, int]:
+    """Indica, pela contagem de páginas, se o arquivo pode ser analisado em blocos. Retorna (pode, páginas)."""
+    if not file_path.lower().endswith(".pdf"):
+        return False, 0
+    try:
+        total_pages = get_pdf_page_count(file_path)
+    except Exception:
+        return False, 0
+    by_size = bool(MAP_REDUCE_PAGE_THRESHOLD) and total_pages > MAP_REDUCE_PAGE_THRESHOLD
+    by_segments = SEGMENTATION_MODE != "off" and total_pages >= SEGMENT_MIN_PAGES
+    return by_size or by_segments, total_pages
+
+
+def analyze_with_vision_llm(model: str, file_path: str, api_key: str = None, use_cache: bool = True,
+                            budget: Optional[TokenBudget] = None,
+                            on_item: Optional[Callable[[str, Dict], None]] = None,
+                            cancel_token: Optional[CancelToken] = None,
+                            file_timeout: Optional[float] = None) -> AnalysisResult:
+    """
+    Analisa documento usando visão computacional da LLM (análise direta de imagens).
+
+    Args:
+        use_cache: Devolve do cache o resultado anterior do mesmo arquivo, modelo e prompt
+        budget: Orçamento de tokens do lote (ver TokenBudget)
+        on_item: Com respostas em streaming, recebe cada matrícula e confrontante concluído
+        cancel_token: Cancelá-lo interrompe a análise em andamento
+        file_timeout: Prazo do arquivo em segundos (padrão: ANALYSIS_FILE_TIMEOUT)
+    """
+    fname_placeholder = os.path.basename(file_path)
+    with stream_items(on_item), cancel_scope(new_cancel_token(cancel_token, file_timeout)), \
+            track_run(fname_placeholder) as metrics:
+        res = _analyze_with_vision_llm(model, file_path, api_key, use_cache, budget)
+    if budget is not None:
+        budget.settle(metrics)
+    res.metricas = metrics.to_dict()
+    return res
+
+
+def _reserve_tokens(budget: Optional[TokenBudget], total_pages: int, page_texts: Optional[List[str]]):
+    """Reserva o orçamento do arquivo atual antes da primeira chamada à IA."""
+    if budget is None:
+        return
+    budget.reserve(current_metrics(), total_pages,
+                   sum(len(text) for text in page_texts) if page_texts is not None else None)
+
+
+def _analyze_with_vision_llm(model: str, file_path: str, api_key: str = None, use_cache: bool = True,
+                             budget: Optional[TokenBudget] = None) -> AnalysisResult:
+    fname_placeholder = os.path.basename(file_path)
+    
+    try:
+        check_cancelled()
+        page_texts = extract_text_layer(file_path) if TEXT_FAST_PATH else None
+        if page_texts is not None:
+            chunkable, total_pages = False, len(page_texts)
+            prompt_hash = TEXT_PROMPT_HASH
+        else:
+            chunkable, total_pages = may_use_chunks(file_path)
+            prompt_hash = MAP_REDUCE_PROMPT_HASH if chunkable else ANALYSIS_PROMPT_HASH
+        cache_key, cached = _lookup_cached_result(model, file_path, use_cache, prompt_hash)
+        if cached is not None:
+            logger.info("⚡ %s: resultado obtido do cache", fname_placeholder)
+            return build_analysis_result(fname_placeholder, cached)
+        _reserve_tokens(budget, total_pages, page_texts)
+
+        if page_texts is not None:
+            parsed, parse_ok = analyze_text_with_llm(model, page_texts, api_key)
+            if parse_ok and cache_key is not None:
+                get_result_cache().put(cache_key, parsed)
+            return build_analysis_result(fname_placeholder, parsed)
+
+        chunks, labels, segmentation = (plan_document_chunks(file_path, total_pages, api_key)
+                                        if chunkable else ([], [], {}))
+        if chunks:
+            parsed, parse_ok = analyze_in_chunks(model, file_path, total_pages, api_key,
+                                                 chunks, labels, segmentation)
+            if parse_ok and cache_key is not None:
+                get_result_cache().put(cache_key, parsed)
+            return build_analysis_result(fname_placeholder, parsed)
+
+        page_filter = new_page_filter()
+        images_b64 = prepare_vision_images(file_path, page_filter)
+        
+        # Prompt unificado para analise visual
+        vision_prompt = build_analysis_prompt('vision')
+
+        logger.info("[Vision] Enviando %d imagem(ns) para %s (prompt: %d chars)...",
+                    len(images_b64), model, len(vision_prompt))
+
+        data = call_openrouter_vision(
+            model=model,
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=vision_prompt,
+            images_base64=images_b64,
+            temperature=0.0,
+            max_tokens=100000,  # Tokens otimizados para análise eficiente
+            api_key=api_key
+        )
+        
+        parsed, parse_ok = parse_vision_content(data)
+        if page_filter is not None and page_filter.dropped:
+            parsed["paginas_descartadas"] = page_filter.dropped
+        if parse_ok and cache_key is not None:
+            get_result_cache().put(cache_key, parsed)
+
+        return build_analysis_result(fname_placeholder, parsed)
+
+    except Exception as e:
+        return _analysis_error_result(fname_placeholder, e)
+
+
+async def analyze_with_vision_llm_async(client: AsyncOpenRouterClient, model: str, file_path: str,
+                                        api_key: str = None, use_cache: bool = True,
+                                        prepare_semaphore: Optional[asyncio.Semaphore] = None,
+                                        budget: Optional[TokenBudget] = None,
+                                        cancel_token: Optional[CancelToken] = None,
+                                        file_timeout: Optional[float] = None) -> AnalysisResult:
+    """
+    Versão assíncrona de analyze_with_vision_llm. prepare_semaphore limita as
+    rasterizações simultâneas; o prazo só conta a partir da primeira vaga obtida.
+    """
+    fname_placeholder = os.path.basename(file_path)
+    with cancel_scope(new_cancel_token(cancel_token, file_timeout, armed=False)), \
+            track_run(fname_placeholder) as metrics:
+        res = await _analyze_with_vision_llm_async(client, model, file_path, api_key, use_cache,
+                                                   prepare_semaphore, budget)
+    if budget is not None:
+        budget.settle(metrics)
+    res.metricas = metrics.to_dict()
+    return res
+
+
+async def _analyze_with_vision_llm_async(client: AsyncOpenRouterClient, model: str, file_path: str,
+                                         api_key: Optional[str], use_cache: bool,
+                                         prepare_semaphore: Optional[asyncio.Semaphore],
+                                         budget: Optional[TokenBudget]) -> AnalysisResult:
+    fname_placeholder = os.path.basename(file_path)
+
+    try:
+        check_cancelled()
+        page_texts = await asyncio.to_thread(extract_text_layer, file_path) if TEXT_FAST_PATH else None
+        if page_texts is not None:
+            chunkable, total_pages = False, len(page_texts)
+            prompt_hash = TEXT_PROMPT_HASH
+        else:
+            chunkable, total_pages = await asyncio.to_thread(may_use_chunks, file_path)
+            prompt_hash = MAP_REDUCE_PROMPT_HASH if chunkable else ANALYSIS_PROMPT_HASH
+        cache_key, cached = await asyncio.to_thread(_lookup_cached_result, model, file_path, use_cache, prompt_hash)
+        if cached is not None:
+            logger.info("⚡ %s: resultado obtido do cache", fname_placeholder)
+            return build_analysis_result(fname_placeholder, cached)
+        _reserve_tokens(budget, total_pages, page_texts)
+
+        if page_texts is not None:
+            parsed, parse_ok = await analyze_text_with_llm_async(client, model, page_texts, api_key)
+            if parse_ok and cache_key is not None:
+                await asyncio.to_thread(get_result_cache().put, cache_key, parsed)
+            return build_analysis_result(fname_placeholder, parsed)
+
+        chunks, labels, segmentation = [], [], {}
+        if chunkable:
+            chunks, labels, segmentation = await plan_document_chunks_async(
+                client, file_path, total_pages, api_key, prepare_semaphore)
+        if chunks:
+            parsed, parse_ok = await analyze_in_chunks_async(client, model, file_path, total_pages,
+                                                             api_key, prepare_semaphore,
+                                                             chunks, labels, segmentation)
+            if parse_ok and cache_key is not None:
+                await asyncio.to_thread(get_result_cache().put, cache_key, parsed)
+            return build_analysis_result(fname_placeholder, parsed)
+
+        page_filter = new_page_filter()
+        async with prepare_slot(prepare_semaphore):
+            images_b64 = await asyncio.to_thread(prepare_vision_images, file_path, page_filter)
+
+        logger.info("[Vision] Enviando %d imagem(ns) para %s...", len(images_b64), model)
+        data = await call_openrouter_vision_async(
+            client,
+            model=model,
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=build_analysis_prompt('vision'),
+            images_base64=images_b64,
+            temperature=0.0,
+            max_tokens=100000,
+            api_key=api_key
+        )
+        del images_b64
+
+        parsed, parse_ok = parse_vision_content(data)
+        if page_filter is not None and page_filter.dropped:
+            parsed["paginas_descartadas"] = page_filter.dropped
+        if parse_ok and cache_key is not None:
+            await asyncio.to_thread(get_result_cache().put, cache_key, parsed)
+
+        return build_analysis_result(fname_placeholder, parsed)
+
+    except Exception as e:
+        return _analysis_error_result(fname_placeholder, e)
+
+
+def analyze_files(model: str, file_paths: List[str], api_key: str = None, use_cache: bool = True,
+                  max_in_flight: Optional[int] = None, prepare_workers: Optional[int] = None,
+                  on_result: Optional[Callable[[str, AnalysisResult], None]] = None,
+                  budget: Optional[TokenBudget] = None,
+                  cancel_token: Optional[CancelToken] = None,
+                  file_timeout: Optional[float] = None) -> List[AnalysisResult]:
+    """
+    Wrapper síncrono: analisa vários arquivos a partir de um único event loop.
+
+    Args:
+        model: Modelo OpenRouter
+        file_paths: Arquivos a analisar
+        api_key: Chave da API (se None, usa OPENROUTER_API_KEY)
+        use_cache: Consulta/grava o cache de resultados
+        max_in_flight: Requisições simultâneas (se None, usa OPENROUTER_MAX_INFLIGHT)
+        prepare_workers: Arquivos rasterizados ao mesmo tempo (padrão: MAX_PARALLEL_FILES)
+        on_result: Chamado (caminho, resultado) assim que cada arquivo termina, na
+            thread do event loop
+        budget: Orçamento de tokens compartilhado pelos arquivos (ver TokenBudget)
+        cancel_token: Token do lote; cancelá-lo interrompe todos os arquivos
+        file_timeout: Prazo por arquivo em segundos (padrão: ANALYSIS_FILE_TIMEOUT)
+
+    Returns:
+        Resultados na mesma ordem de file_paths
+    """
+    async def run() -> List[AnalysisResult]:
+        prepare_semaphore = asyncio.Semaphore(prepare_workers or MAX_PARALLEL_FILES)
+        async with AsyncOpenRouterClient(max_in_flight=max_in_flight) as client:
+            async def one(path: str) -> AnalysisResult:
+                res = await analyze_with_vision_llm_async(client, model, path, api_key, use_cache,
+                                                          prepare_semaphore, budget, cancel_token, file_timeout)
+                if on_result is not None:
+                    on_result(path, res)
+                return res
+            return list(await asyncio.gather(*(one(path) for path in file_paths)))
+
+    return asyncio.run(run())
@@ -0,0 +1,226 @@
+"""Orçamentos do pipeline: bytes do payload de imagens por arquivo e tokens por lote."""
+
+import os
+import threading
+from typing import List, Dict, Optional, Tuple
+
+try:
+    from .settings import env_int
+    from .run_metrics import current_metrics, RunMetrics
+except ImportError:
+    from settings import env_int
+    from run_metrics import current_metrics, RunMetrics
+
+# Degraus de qualidade (maior lado, qualidade JPEG), do melhor para o mais econômico
+ENCODING_TIERS: List[Tuple[int, int]] = [(1536, 85), (1280, 75), (1024, 60), (800, 50), (640, 40)]
+# Fator aproximado de bytes do JPEG por pixel, relativo à qualidade 85
+_JPEG_QUALITY_FACTOR = {85: 1.0, 75: 0.78, 60: 0.6, 50: 0.52, 40: 0.45}
+# Tamanho típico (base64) de uma página A4 de texto denso no degrau mais alto
+_NOMINAL_PAGE_BYTES = 450 * 1024
+
+MAX_PAYLOAD_MB = env_int("MAX_PAYLOAD_MB", 20)
+MANY_PAGES_THRESHOLD = 50  # acima disso começa direto no degrau (800, 50)
+
+
+def _tier_cost(tier: Tuple[int, int]) -> float:
+    """Custo relativo de um degrau (área × fator de qualidade)."""
+    edge, quality = tier
+    return (edge / ENCODING_TIERS[0][0]) ** 2 * _JPEG_QUALITY_FACTOR.get(quality, quality / 85.0)
+
+
+class PayloadBudgeter:
+    """
+    Escolhe resolução e qualidade de cada página antes de codificá-la, para que
+    o payload caiba no orçamento; o tamanho observado replaneja as restantes.
+    """
+
+    def __init__(self, page_count: int, budget_bytes: int = MAX_PAYLOAD_MB * 1024 * 1024,
+                 tiers: Optional[List[Tuple[int, int]]] = None):
+        self.page_count = max(0, page_count)
+        self.budget_bytes = budget_bytes
+        self.tiers = tiers or ENCODING_TIERS
+        self.used_bytes = 0
+        self.encoded_pages = 0
+        self.planned_pages = 0
+        self.pages_per_tier: Dict[Tuple[int, int], int] = {}
+        self._recorded_cost = 0.0
+        self._pending_cost = 0.0
+        self.max_tier_index = self._initial_tier_index()
+        self.tier_index = self.max_tier_index
+
+    def _initial_tier_index(self) -> int:
+        start = 0
+        if self.page_count > MANY_PAGES_THRESHOLD:
+            start = next((i for i, t in enumerate(self.tiers) if t == (800, 50)), len(self.tiers) - 1)
+        if self.page_count <= 0:
+            return start
+        top_cost = _tier_cost(self.tiers[0])
+        for idx in range(start, len(self.tiers)):
+            estimate = _NOMINAL_PAGE_BYTES * _tier_cost(self.tiers[idx]) / top_cost
+            if estimate * self.page_count <= self.budget_bytes:
+                return idx
+        return len(self.tiers) - 1
+
+    def next_settings(self) -> Tuple[int, int]:
+        """Planeja a próxima página e retorna seu (max_size, jpeg_quality)."""
+        tier = self.tiers[self.tier_index]
+        self.planned_pages += 1
+        self._pending_cost += _tier_cost(tier)
+        return tier
+
+    def skip(self, tier: Tuple[int, int]):
+        """Descarta uma página planejada que não gerou imagem."""
+        self._pending_cost -= _tier_cost(tier)
+
+    def record(self, encoded_bytes: int, tier: Tuple[int, int]):
+        """Registra o tamanho da página codificada no degrau `tier` e replaneja as restantes."""
+        cost = _tier_cost(tier)
+        self._pending_cost -= cost
+        self._recorded_cost += cost
+        self.used_bytes += encoded_bytes
+        self.encoded_pages += 1
+        self.pages_per_tier[tier] = self.pages_per_tier.get(tier, 0) + 1
+
+        remaining = self.page_count - self.planned_pages
+        if remaining <= 0 or self._recorded_cost <= 0:
+            return
+
+        bytes_per_cost = self.used_bytes / self._recorded_cost
+        committed = self.used_bytes + max(0.0, self._pending_cost) * bytes_per_cost
+        chosen = len(self.tiers) - 1
+        for idx in range(self.max_tier_index, len(self.tiers)):
+            if committed + bytes_per_cost * _tier_cost(self.tiers[idx]) * remaining <= self.budget_bytes:
+                chosen = idx
+                break
+        self.tier_index = chosen
+
+    def summary(self) -> str:
+        parts = [f"{n}x{edge}px/q{quality}" for (edge, quality), n in sorted(self.pages_per_tier.items(), reverse=True)]
+        return f"{self.used_bytes / (1024 * 1024):.2f}MB em {self.encoded_pages} página(s) ({', '.join(parts)})"
+
+
+def new_payload_budgeter(page_count: int) -> PayloadBudgeter:
+    """PayloadBudgeter da execução atual, sem os degraus vetados pelo orçamento de tokens."""
+    metrics = current_metrics()
+    floor = min(metrics.degrau_imagem, len(ENCODING_TIERS) - 1) if metrics is not None else 0
+    return PayloadBudgeter(page_count, tiers=ENCODING_TIERS[floor:])
+
+
+# =========================
+# Orçamento de tokens do lote
+# =========================
+# Estimativas iniciais, substituídas pela média observada no lote
+DEFAULT_PAGE_TOKENS = env_int("TOKENS_PER_PAGE", 1100)      # imagem de página no degrau mais alto
+DEFAULT_CALL_TOKENS = env_int("TOKENS_PER_CALL", 4000)      # prompts + resposta de uma chamada
+TEXT_CHARS_PER_TOKEN = 3.5
+
+BATCH_TOKEN_BUDGET = env_int("BATCH_TOKEN_BUDGET", 0, minimum=0)
+BATCH_BUDGET_MODE = os.environ.get("BATCH_BUDGET_MODE", "reduzir").strip().lower()
+
+
+class BudgetExceededError(RuntimeError):
+    """Levantada quando o próximo arquivo ultrapassaria o orçamento de tokens do lote."""
+
+
+class TokenBudget:
+    def __init__(self, limit_tokens: int, mode: str = "reduzir",
+                 page_tokens: int = DEFAULT_PAGE_TOKENS, call_tokens: int = DEFAULT_CALL_TOKENS):
+        """
+        Orçamento de tokens compartilhado pelos arquivos de um lote
+
+        Args:
+            limit_tokens: Total de tokens do lote
+            mode: "parar" recusa arquivos que não cabem; "reduzir" antes desce o degrau das imagens
+            page_tokens: Estimativa inicial por página de imagem no degrau mais alto
+            call_tokens: Estimativa inicial fixa por arquivo (prompts e resposta)
+        """
+        if mode not in ("parar", "reduzir"):
+            raise ValueError(f"Modo de orçamento inválido: {mode}")
+        self.limit_tokens = limit_tokens
+        self.mode = mode
+        self.page_tokens = page_tokens
+        self.call_tokens = call_tokens
+        self.used_tokens = 0
+        self.cost = 0.0
+        self.files = 0
+        self.refused = 0
+        self._reserved: Dict[int, Tuple[int, int]] = {}  # id(metrics) -> (reserva, estimativa sem correção)
+        self._estimated_tokens = 0
+        self._observed_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def reserved_tokens(self) -> int:
+        with self._lock:
+            return sum(tokens for tokens, _ in self._reserved.values())
+
+    @property
+    def correction(self) -> float:
+        """Consumo real / estimado dos arquivos concluídos (1.0 antes do primeiro)."""
+        if self._estimated_tokens <= 0 or self._observed_tokens <= 0:
+            return 1.0
+        return self._observed_tokens / self._estimated_tokens
+
+    def _raw_estimate(self, pages: int, tier_index: int, text_chars: Optional[int]) -> int:
+        if text_chars is not None:
+            return int(text_chars / TEXT_CHARS_PER_TOKEN) + self.call_tokens
+        area = (ENCODING_TIERS[tier_index][0] / ENCODING_TIERS[0][0]) ** 2
+        return int(pages * self.page_tokens * area) + self.call_tokens
+
+    def estimate(self, pages: int, tier_index: int = 0, text_chars: Optional[int] = None) -> int:
+        """Tokens previstos para um arquivo (imagens escalam com a área do degrau)."""
+        return int(self._raw_estimate(pages, tier_index, text_chars) * self.correction)
+
+    def reserve(self, metrics: RunMetrics, pages: int, text_chars: Optional[int] = None) -> int:
+        """Reserva tokens para o arquivo e define metrics.degrau_imagem; levanta BudgetExceededError."""
+        with self._lock:
+            committed = self.used_tokens + sum(tokens for tokens, _ in self._reserved.values())
+            tiers = [0] if text_chars is not None or self.mode == "parar" else range(len(ENCODING_TIERS))
+            for tier_index in tiers:
+                estimate = self.estimate(pages, tier_index, text_chars)
+                if committed + estimate <= self.limit_tokens:
+                    self._reserved[id(metrics)] = (estimate, self._raw_estimate(pages, tier_index, text_chars))
+                    metrics.degrau_imagem = tier_index
+                    return estimate
+            self.refused += 1
+            raise BudgetExceededError(
+                f"Orçamento de tokens do lote esgotado: {committed} de {self.limit_tokens} usados ou "
+                f"reservados; o arquivo precisaria de ~{estimate}"
+            )
+
+    def settle(self, metrics: RunMetrics):
+        """Troca a reserva pelo consumo real e recalibra as estimativas."""
+        with self._lock:
+            reserved = self._reserved.pop(id(metrics), None)
+            used = metrics.tokens.get("total_tokens", 0)
+            self.used_tokens += used
+            self.cost += metrics.custo
+            if reserved is None:
+                return
+            self.files += 1
+            if used > 0:
+                self._estimated_tokens += reserved[1]
+                self._observed_tokens += used
+
+    def summary(self) -> str:
+        cost = f" - custo {self.cost:.4f}" if self.cost else ""
+        refused = f" - {self.refused} arquivo(s) recusado(s)" if self.refused else ""
+        return f"{self.used_tokens} de {self.limit_tokens} tokens{cost}{refused}"
+
+
+def format_usage(total_tokens: int, cost: float = 0.0, tokens: Optional[Dict] = None) -> str:
+    """Texto curto de consumo: tokens (com entrada/saída, se disponíveis) e custo informado."""
+    text = f"{total_tokens} tokens"
+    if tokens and (tokens.get("prompt_tokens") or tokens.get("completion_tokens")):
+        text += f" ({tokens.get('prompt_tokens', 0)} entrada, {tokens.get('completion_tokens', 0)} saída)"
+    if cost:
+        text += f" - custo {cost:.4f}"
+    return text
+
+
+def new_token_budget(limit_tokens: Optional[int] = None, mode: Optional[str] = None) -> Optional[TokenBudget]:
+    """Orçamento do lote a partir dos argumentos ou de BATCH_TOKEN_BUDGET/BATCH_BUDGET_MODE (0 = sem limite)."""
+    limit_tokens = BATCH_TOKEN_BUDGET if limit_tokens is None else limit_tokens
+    if not limit_tokens or limit_tokens <= 0:
+        return None
+    return TokenBudget(limit_tokens, mode or BATCH_BUDGET_MODE)
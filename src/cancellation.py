@@ -0,0 +1,127 @@
+"""
+Cancelamento cooperativo das análises do Sistema de Análise de Matrículas
+
+Cada arquivo em análise tem um CancelToken: o usuário pode cancelá-lo (botão
+"Cancelar", arquivo removido da lista, janela fechada) e ele expira sozinho ao
+fim do prazo por arquivo (ANALYSIS_FILE_TIMEOUT), contado a partir de quando o
+arquivo começa de fato a ser processado (ver CancelToken.arm). Como as métricas
+(run_metrics), o token da análise em andamento fica num ContextVar aberto com
+``cancel_scope``: a renderização das páginas chama ``check_cancelled()`` a cada
+página e o cliente HTTP deixa de esperar pela resposta, pelo backoff entre
+retentativas ou pelo próximo evento do streaming assim que o token é
+cancelado, sem que ele precise ser passado de função em função.
+
+O contexto acompanha ``asyncio`` e ``asyncio.to_thread``; em ThreadPoolExecutor
+use ``submit_in_context`` (run_metrics), que copia o contexto inteiro.
+"""
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Iterator
+
+# Intervalo com que as esperas bloqueantes conferem o token
+CANCEL_POLL_S = 0.2
+
+_current: contextvars.ContextVar[Optional["CancelToken"]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+class AnalysisCancelledError(RuntimeError):
+    """Levantada quando a análise é interrompida pelo usuário ou pelo prazo do arquivo."""
+
+
+class CancelToken:
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancelToken"] = None,
+                 armed: bool = True):
+        """
+        Sinal de cancelamento de uma análise, com prazo opcional
+
+        Args:
+            timeout: Segundos até o token expirar sozinho (None ou 0 = sem prazo)
+            parent: Token do lote; cancelá-lo cancela também este
+            armed: Se False, o prazo só começa a contar em arm() (arquivos que
+                aguardam vaga no lote assíncrono)
+        """
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.deadline: Optional[float] = None
+        self.parent = parent
+        self.reason = ""
+        self._event = threading.Event()
+        if armed:
+            self.arm()
+
+    def arm(self):
+        """Inicia a contagem do prazo; chamadas seguintes não o alteram."""
+        if self.timeout and self.deadline is None:
+            self.deadline = time.monotonic() + self.timeout
+
+    def cancel(self, reason: str = "análise cancelada pelo usuário"):
+        """Cancela o token (a primeira razão informada é mantida)."""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(f"prazo de {self.timeout:.0f}s por arquivo excedido")
+            return True
+        if self.parent is not None and self.parent.cancelled:
+            self.cancel(self.parent.reason)
+            return True
+        return False
+
+    def remaining(self) -> Optional[float]:
+        """Segundos até o prazo (o menor entre este token e o do lote), ou None sem prazo."""
+        remaining = self.deadline - time.monotonic() if self.deadline is not None else None
+        if self.parent is not None:
+            inherited = self.parent.remaining()
+            if inherited is not None and (remaining is None or inherited < remaining):
+                remaining = inherited
+        return remaining
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise AnalysisCancelledError(self.reason)
+
+    def sleep(self, seconds: float):
+        """Espera `seconds`, levantando AnalysisCancelledError assim que o token for cancelado."""
+        end = time.monotonic() + seconds
+        while True:
+            self.raise_if_cancelled()
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            self._event.wait(min(left, CANCEL_POLL_S))
+
+
+def current_token() -> Optional[CancelToken]:
+    """Token da análise em andamento neste contexto, ou None."""
+    return _current.get()
+
+
+def check_cancelled():
+    """Levanta AnalysisCancelledError se a análise em andamento foi cancelada ou expirou."""
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def arm_deadline():
+    """Inicia o prazo do token corrente, se ainda não estiver contando (ver CancelToken.arm)."""
+    token = _current.get()
+    if token is not None:
+        token.arm()
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Torna `token` o token corrente durante o bloco (None desativa o cancelamento)."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
@@ -0,0 +1,368 @@
+"""Análise em blocos (map-reduce): extração por bloco de páginas, mesclagem e consolidação final."""
+
+import os
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+try:
+    from .settings import env_int
+    from .normalization import matricula_key, extend_unique, record_key, merge_matricula, safe_get_dict, safe_get_list
+    from .json_repair import parse_json_response, repair_json_response
+    from .prompts import SYSTEM_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT
+    from .budgets import new_payload_budgeter
+    from .page_filter import PageFilter, new_page_filter
+    from .rendering import iter_encoded_pages, prepare_slot
+    from .openrouter_api import (call_openrouter_vision, call_openrouter_vision_async,
+                                 call_openrouter_text, call_openrouter_text_async)
+    from .openrouter_client import AsyncOpenRouterClient
+    from .results import parse_vision_content
+    from .log_config import get_logger
+    from .run_metrics import submit_in_context
+    from .cancellation import AnalysisCancelledError, check_cancelled
+except ImportError:
+    from settings import env_int
+    from normalization import matricula_key, extend_unique, record_key, merge_matricula, safe_get_dict, safe_get_list
+    from json_repair import parse_json_response, repair_json_response
+    from prompts import SYSTEM_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT
+    from budgets import new_payload_budgeter
+    from page_filter import PageFilter, new_page_filter
+    from rendering import iter_encoded_pages, prepare_slot
+    from openrouter_api import (call_openrouter_vision, call_openrouter_vision_async,
+                                call_openrouter_text, call_openrouter_text_async)
+    from openrouter_client import AsyncOpenRouterClient
+    from results import parse_vision_content
+    from log_config import get_logger
+    from run_metrics import submit_in_context
+    from cancellation import AnalysisCancelledError, check_cancelled
+
+logger = get_logger("blocos")
+
+# PDFs com mais páginas que o limite são divididos em blocos analisados em paralelo
+# e consolidados por uma chamada final (0 desativa)
+MAP_REDUCE_PAGE_THRESHOLD = env_int("MAP_REDUCE_PAGE_THRESHOLD", 50, minimum=0)
+MAP_REDUCE_CHUNK_PAGES = env_int("MAP_REDUCE_CHUNK_PAGES", 20)
+MAP_REDUCE_WORKERS = env_int("MAP_REDUCE_WORKERS", 3)
+
+# Campos de decisão que a chamada final de consolidação pode sobrescrever
+REDUCE_DECISION_KEYS = [
+    "matricula_principal", "matriculas_confrontantes", "lotes_confrontantes",
+    "matriculas_nao_confrontantes", "lotes_sem_matricula", "confrontacao_completa",
+    "proprietarios_identificados", "resumo_analise", "confidence", "reasoning",
+]
+
+
+def plan_page_chunks(total_pages: int, chunk_pages: int = MAP_REDUCE_CHUNK_PAGES) -> List[Tuple[int, int]]:
+    """Divide [0, total_pages) em blocos de tamanho equilibrado, sem blocos residuais pequenos."""
+    if total_pages <= 0:
+        return []
+    count = -(-total_pages // max(1, chunk_pages))
+    base, extra = divmod(total_pages, count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + base + (1 if i < extra else 0)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def merge_chunk_results(partials: List[Dict]) -> Dict:
+    """
+    Mescla os JSONs dos blocos na ordem das páginas: matrículas pelo número, lotes
+    pelo identificador e tipo; as matrículas principais viram votos em "candidatos_principal".
+    """
+    merged: Dict = {
+        "matriculas_encontradas": [],
+        "matriculas_confrontantes": [],
+        "lotes_confrontantes": [],
+        "matriculas_nao_confrontantes": [],
+        "lotes_sem_matricula": [],
+        "proprietarios_identificados": {},
+        "candidatos_principal": {},
+    }
+    by_numero: Dict[str, Dict] = {}
+    lote_key = record_key("identificador", "tipo")
+    lote_index: Dict[str, Dict] = {}
+    principal_labels: Dict[str, str] = {}
+
+    for parsed in partials:
+        for m_data in safe_get_list(parsed, "matriculas_encontradas"):
+            if not isinstance(m_data, dict):
+                continue
+            key = matricula_key(m_data.get("numero") or "")
+            if not key:
+                # Sem número: não há como unir com segurança, mantém como veio
+                merged["matriculas_encontradas"].append(dict(m_data))
+                continue
+            if key not in by_numero:
+                by_numero[key] = {"numero": str(m_data.get("numero")).strip()}
+                merged["matriculas_encontradas"].append(by_numero[key])
+            merge_matricula(by_numero[key], m_data)
+
+        for field in ("matriculas_confrontantes", "matriculas_nao_confrontantes"):
+            extend_unique(merged[field], safe_get_list(parsed, field), key=matricula_key)
+        extend_unique(merged["lotes_sem_matricula"], safe_get_list(parsed, "lotes_sem_matricula"))
+
+        for lote in safe_get_list(parsed, "lotes_confrontantes"):
+            if not isinstance(lote, dict) or not lote.get("identificador"):
+                continue
+            key = lote_key(lote)
+            existing = lote_index.get(key)
+            if existing is None:
+                lote_index[key] = dict(lote)
+                merged["lotes_confrontantes"].append(lote_index[key])
+            else:
+                for field in ("matricula_anexada", "direcao"):
+                    if not existing.get(field) and lote.get(field):
+                        existing[field] = lote[field]
+
+        for numero, nomes in safe_get_dict(parsed, "proprietarios_identificados").items():
+            target = merged["proprietarios_identificados"].setdefault(str(numero), [])
+            extend_unique(target, nomes if isinstance(nomes, list) else [nomes])
+
+        principal = parsed.get("matricula_principal")
+        if principal and matricula_key(principal):
+            # Votos agrupados pelo número normalizado, exibido na primeira grafia encontrada
+            label = principal_labels.setdefault(matricula_key(principal), str(principal).strip())
+            votes = merged["candidatos_principal"]
+            votes[label] = votes.get(label, 0) + 1
+
+        # Registro do filtro de páginas de cada bloco (ver _analyze_chunk)
+        if parsed.get("paginas_descartadas"):
+            merged.setdefault("paginas_descartadas", []).extend(parsed["paginas_descartadas"])
+
+    return merged
+
+
+def _most_voted_principal(merged: Dict) -> Optional[str]:
+    """Candidato mais votado; empate resolvido pela primeira ocorrência (ordem das páginas)."""
+    votes = merged.get("candidatos_principal") or {}
+    if not votes:
+        return None
+    return max(votes.items(), key=lambda item: item[1])[0]
+
+
+def reduce_user_prompt(merged: Dict, chunks: List[Tuple[int, int]], failures: List[str]) -> str:
+    """Monta o prompt da consolidação com um resumo compacto (sem descrições longas)."""
+    resumo = dict(merged)
+    resumo.pop("paginas_descartadas", None)
+    resumo["matriculas_encontradas"] = [
+        {**m, "descricao": str(m.get("descricao") or "")[:300], "evidence": list(m.get("evidence") or [])[:3]}
+        for m in merged["matriculas_encontradas"]
+    ]
+    nota = f"Documento analisado em {len(chunks)} bloco(s) de páginas."
+    if failures:
+        nota += " Blocos com falha (informação possivelmente incompleta): " + "; ".join(failures)
+    return (
+        REDUCE_PROMPT
+        + "\n\n" + nota
+        + "\n\nRESUMO CONSOLIDADO:\n"
+        + json.dumps(resumo, ensure_ascii=False, separators=(",", ":"))
+    )
+
+
+def finalize_map_reduce(merged: Dict, chunks: List[Tuple[int, int]], failures: List[str],
+                        final_content: Optional[str], final_error: Optional[Exception],
+                        segmentation: Optional[Dict] = None) -> Tuple[Dict, bool]:
+    """Aplica a decisão da consolidação sobre o resultado mesclado. Retorna (parsed, parse_ok)."""
+    parsed = {k: v for k, v in merged.items() if k != "candidatos_principal"}
+    parse_ok = not failures
+    final, cut_keys = None, []
+    if final_content is not None:
+        try:
+            final = parse_json_response(final_content)
+        except json.JSONDecodeError as e:
+            final_error = e
+            repaired = repair_json_response(final_content)
+            if repaired is not None and isinstance(repaired[0], dict) and repaired[0]:
+                final, cut_keys = repaired
+                parse_ok = False
+                logger.warning("✂️ Consolidação final incompleta (%s): aproveitando as decisões completas", e)
+    if isinstance(final, dict):
+        for key in REDUCE_DECISION_KEYS:
+            # Decisão cortada no meio (lista aberta no ponto do corte) fica com o valor mesclado
+            if key in final and key not in cut_keys:
+                parsed[key] = final[key]
+    else:
+        parse_ok = False
+        logger.warning("⚠️ Consolidação final indisponível (%s); usando resultado mesclado dos blocos", final_error)
+        parsed["matricula_principal"] = _most_voted_principal(merged)
+        parsed["confrontacao_completa"] = None
+        parsed["confidence"] = None
+        parsed["reasoning"] = (
+            f"Consolidação final indisponível ({final_error}). "
+            "Resultado obtido pela mesclagem dos blocos; matrícula principal pela maioria dos blocos."
+        )
+
+    if not parse_ok:
+        # Bloco com falha ou truncado, ou consolidação incompleta
+        parsed["parcial"] = True
+    parsed["analise_em_blocos"] = {
+        "blocos": [[start + 1, end] for start, end in chunks],
+        "falhas": failures,
+        "candidatos_principal": merged.get("candidatos_principal", {}),
+    }
+    if segmentation:
+        parsed["analise_em_blocos"]["segmentacao"] = segmentation
+    return parsed, parse_ok
+
+
+# Registrado em "falhas" quando um bloco foi salvo por reparo do JSON
+PARTIAL_CHUNK_NOTE = "resposta truncada; bloco com resultado parcial"
+
+
+def chunk_user_prompt(index: int, chunks: List[Tuple[int, int]], total_pages: int,
+                      label: Optional[str] = None) -> str:
+    start, end = chunks[index]
+    prompt = CHUNK_PROMPT + f"\n\nBLOCO {index + 1}/{len(chunks)}: páginas {start + 1} a {end} de {total_pages}."
+    if label:
+        prompt += f" Pela segmentação automática, estas páginas correspondem à matrícula {label}."
+    return prompt
+
+
+def _prepare_chunk_images(file_path: str, chunk: Tuple[int, int],
+                          page_filter: Optional[PageFilter] = None) -> List[str]:
+    """Codifica as páginas de um bloco com orçamento próprio (qualidade de documento pequeno)."""
+    budgeter = new_payload_budgeter(chunk[1] - chunk[0])
+    images_b64 = list(iter_encoded_pages(file_path, budgeter=budgeter, page_range=chunk,
+                                         page_filter=page_filter))
+    if not images_b64 and page_filter is not None and page_filter.dropped:
+        # Bloco inteiro em branco/duplicado: envia sem filtro para não perder o bloco
+        page_filter.dropped.clear()
+        budgeter = new_payload_budgeter(chunk[1] - chunk[0])
+        images_b64 = list(iter_encoded_pages(file_path, budgeter=budgeter, page_range=chunk))
+    logger.info("📦 Bloco págs. %d-%d: %s", chunk[0] + 1, chunk[1], budgeter.summary())
+    if not images_b64:
+        raise ValueError(f"Nenhuma página convertida no bloco {chunk[0] + 1}-{chunk[1]}")
+    return images_b64
+
+
+def _analyze_chunk(model: str, file_path: str, index: int, chunks: List[Tuple[int, int]],
+                   total_pages: int, api_key: Optional[str], label: Optional[str] = None) -> Dict:
+    """Etapa map: extrai o JSON de um bloco de páginas."""
+    page_filter = new_page_filter()
+    images_b64 = _prepare_chunk_images(file_path, chunks[index], page_filter)
+    data = call_openrouter_vision(
+        model=model,
+        system_prompt=SYSTEM_PROMPT,
+        user_prompt=chunk_user_prompt(index, chunks, total_pages, label),
+        images_base64=images_b64,
+        temperature=0.0,
+        max_tokens=32000,
+        api_key=api_key
+    )
+    parsed, parse_ok = parse_vision_content(data)
+    if not parse_ok and not parsed.get("parcial"):
+        raise RuntimeError("JSON inválido na resposta do bloco")
+    if page_filter is not None and page_filter.dropped:
+        parsed["paginas_descartadas"] = page_filter.dropped
+    return parsed
+
+
+def analyze_in_chunks(model: str, file_path: str, total_pages: int, api_key: str = None,
+                      chunks: Optional[List[Tuple[int, int]]] = None,
+                      labels: Optional[List[Optional[str]]] = None,
+                      segmentation: Optional[Dict] = None) -> Tuple[Dict, bool]:
+    """
+    Analisa um PDF em blocos de páginas extraídos em paralelo e consolidados por
+    uma chamada final. Retorna (parsed, parse_ok); parse_ok é False se algo falhou.
+    """
+    chunks = chunks or plan_page_chunks(total_pages)
+    labels = labels or [None] * len(chunks)
+    logger.info("🧩 %s: %d páginas em %d bloco(s)", os.path.basename(file_path), total_pages, len(chunks))
+
+    partials: List[Optional[Dict]] = [None] * len(chunks)
+    failures: List[str] = []
+    with ThreadPoolExecutor(max_workers=min(MAP_REDUCE_WORKERS, len(chunks)), thread_name_prefix="bloco") as executor:
+        futures = [submit_in_context(executor, _analyze_chunk, model, file_path, i, chunks, total_pages, api_key, labels[i])
+                   for i in range(len(chunks))]
+        for i, future in enumerate(futures):
+            start, end = chunks[i]
+            try:
+                partials[i] = future.result()
+                logger.info("✅ Bloco %d/%d (págs. %d-%d) extraído", i + 1, len(chunks), start + 1, end)
+                if partials[i].get("parcial"):
+                    failures.append(f"págs. {start + 1}-{end}: {PARTIAL_CHUNK_NOTE}")
+            except AnalysisCancelledError:
+                continue
+            except Exception as e:
+                failures.append(f"págs. {start + 1}-{end}: {e}")
+                logger.error("❌ Bloco %d/%d (págs. %d-%d) falhou: %s", i + 1, len(chunks), start + 1, end, e)
+
+    # Blocos interrompidos pelo cancelamento não são falhas: a análise inteira para aqui
+    check_cancelled()
+    if len(failures) == len(chunks):
+        raise RuntimeError(f"Todos os {len(chunks)} blocos falharam: {failures[0]}")
+
+    merged = merge_chunk_results([p for p in partials if p is not None])
+    final_content, final_error = None, None
+    try:
+        final_content = call_openrouter_text(
+            model=model,
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=reduce_user_prompt(merged, chunks, failures),
+            temperature=0.0,
+            max_tokens=16000,
+            api_key=api_key
+        )
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        final_error = e
+    return finalize_map_reduce(merged, chunks, failures, final_content, final_error, segmentation)
+
+
+async def analyze_in_chunks_async(client: AsyncOpenRouterClient, model: str, file_path: str, total_pages: int,
+                                  api_key: str = None,
+                                  prepare_semaphore: Optional[asyncio.Semaphore] = None,
+                                  chunks: Optional[List[Tuple[int, int]]] = None,
+                                  labels: Optional[List[Optional[str]]] = None,
+                                  segmentation: Optional[Dict] = None) -> Tuple[Dict, bool]:
+    """Versão assíncrona de analyze_in_chunks (blocos disparados no event loop)."""
+    chunks = chunks or plan_page_chunks(total_pages)
+    labels = labels or [None] * len(chunks)
+    logger.info("🧩 %s: %d páginas em %d bloco(s)", os.path.basename(file_path), total_pages, len(chunks))
+
+    async def one(index: int) -> Dict:
+        page_filter = new_page_filter()
+        async with prepare_slot(prepare_semaphore):
+            images_b64 = await asyncio.to_thread(_prepare_chunk_images, file_path, chunks[index], page_filter)
+        data = await call_openrouter_vision_async(
+            client, model=model, system_prompt=SYSTEM_PROMPT,
+            user_prompt=chunk_user_prompt(index, chunks, total_pages, labels[index]),
+            images_base64=images_b64, temperature=0.0, max_tokens=32000, api_key=api_key
+        )
+        parsed, parse_ok = parse_vision_content(data)
+        if not parse_ok and not parsed.get("parcial"):
+            raise RuntimeError("JSON inválido na resposta do bloco")
+        if page_filter is not None and page_filter.dropped:
+            parsed["paginas_descartadas"] = page_filter.dropped
+        return parsed
+
+    outcomes = await asyncio.gather(*(one(i) for i in range(len(chunks))), return_exceptions=True)
+    check_cancelled()
+    partials, failures = [], []
+    for (start, end), outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            failures.append(f"págs. {start + 1}-{end}: {outcome}")
+        else:
+            partials.append(outcome)
+            if outcome.get("parcial"):
+                failures.append(f"págs. {start + 1}-{end}: {PARTIAL_CHUNK_NOTE}")
+    if not partials:
+        raise RuntimeError(f"Todos os {len(chunks)} blocos falharam: {failures[0]}")
+
+    merged = merge_chunk_results(partials)
+    final_content, final_error = None, None
+    try:
+        final_content = await call_openrouter_text_async(
+            client, model=model, system_prompt=SYSTEM_PROMPT,
+            user_prompt=reduce_user_prompt(merged, chunks, failures),
+            temperature=0.0, max_tokens=16000, api_key=api_key
+        )
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        final_error = e
+    return finalize_map_reduce(merged, chunks, failures, final_content, final_error, segmentation)
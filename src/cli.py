@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Modo em lote (sem interface gráfica) do Sistema de Análise de Matrículas.
+
+Executa ``analyze_with_vision_llm`` diretamente sobre arquivos ou diretórios,
+gravando um JSON e um CSV por arquivo. Não importa tkinter, podendo rodar em
+servidores Linux sem display.
+
+Uso:
+    python -m src.cli analyze <dir|arquivos...> [--saida DIR] [--workers N] [--retomar] [--assincrono] [--prazo S] [-v]
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+import threading
+from dataclasses import asdict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple
+
+try:
+    from .settings import DEFAULT_MODEL, OPENROUTER_API_KEY
+    from .analysis import MAX_PARALLEL_FILES, analyze_with_vision_llm, analyze_files
+    from .results import AnalysisResult, CSV_HEADER, result_to_csv_row
+    from .rendering import SUPPORTED_EXTENSIONS
+    from .budgets import TokenBudget, new_token_budget, format_usage
+    from .log_config import configure_logging
+    from .run_metrics import append_jsonl, write_prometheus
+    from .cancellation import CancelToken
+except ImportError:
+    from settings import DEFAULT_MODEL, OPENROUTER_API_KEY
+    from analysis import MAX_PARALLEL_FILES, analyze_with_vision_llm, analyze_files
+    from results import AnalysisResult, CSV_HEADER, result_to_csv_row
+    from rendering import SUPPORTED_EXTENSIONS
+    from budgets import TokenBudget, new_token_budget, format_usage
+    from log_config import configure_logging
+    from run_metrics import append_jsonl, write_prometheus
+    from cancellation import CancelToken
+
+
+STATUS_OK = "ok"
+STATUS_PARCIAL = "parcial"  # resposta truncada/reparada: refeito na retomada
+STATUS_ERRO = "erro"
+
+
+def collect_input_files(inputs: List[str], recursive: bool = False) -> List[str]:
+    """Expande diretórios e filtra arquivos suportados, preservando a ordem e sem duplicatas."""
+    files: List[str] = []
+    seen = set()
+
+    def add(path: str):
+        path = os.path.abspath(path)
+        if path in seen:
+            return
+        if os.path.splitext(path.lower())[1] not in SUPPORTED_EXTENSIONS:
+            return
+        seen.add(path)
+        files.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for root, dirs, names in os.walk(item):
+                    dirs.sort()
+                    for name in sorted(names):
+                        add(os.path.join(root, name))
+            else:
+                for name in sorted(os.listdir(item)):
+                    full = os.path.join(item, name)
+                    if os.path.isfile(full):
+                        add(full)
+        elif os.path.isfile(item):
+            add(item)
+        else:
+            print(f"⚠️ Ignorado (não encontrado): {item}", file=sys.stderr)
+    return files
+
+
+def output_basenames(files: List[str]) -> Dict[str, str]:
+    """Define nomes de saída estáveis; nomes repetidos recebem sufixo do hash do caminho."""
+    counts: Dict[str, int] = {}
+    for path in files:
+        name = os.path.basename(path)
+        counts[name] = counts.get(name, 0) + 1
+
+    names = {}
+    for path in files:
+        name = os.path.basename(path)
+        if counts[name] > 1:
+            suffix = hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]
+            name = f"{name}.{suffix}"
+        names[path] = name
+    return names
+
+
+def result_status(res: AnalysisResult) -> str:
+    """Classifica o resultado retornado pela análise visual."""
+    if res.reasoning and res.reasoning.startswith("Erro na análise visual"):
+        return STATUS_ERRO
+    if res.parcial:
+        return STATUS_PARCIAL
+    return STATUS_OK
+
+
+def is_already_processed(json_path: str) -> bool:
+    """Usado na retomada: o arquivo conta como processado se o JSON existe com status ok (parcial é refeito)."""
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("status") == STATUS_OK
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def _write_atomic(path: str, write_fn):
+    """Grava em arquivo temporário e renomeia, evitando saídas parciais na retomada."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+def write_outputs(res: AnalysisResult, source_path: str, out_base: str, model: str,
+                  duration: float, formats: List[str]) -> str:
+    """Grava JSON e/ou CSV do resultado. Retorna o status registrado."""
+    status = result_status(res)
+    if "json" in formats:
+        document = {
+            "arquivo": res.arquivo,
+            "caminho": source_path,
+            "modelo": model,
+            "status": status,
+            "duracao_s": round(duration, 3),
+            "processado_em": datetime.now().isoformat(),
+            "resultado": asdict(res),
+        }
+        _write_atomic(out_base + ".json",
+                      lambda f: json.dump(document, f, ensure_ascii=False, indent=2))
+    if "csv" in formats:
+        def write_csv(f):
+            w = csv.writer(f, delimiter=";")
+            w.writerow(CSV_HEADER)
+            w.writerow(result_to_csv_row(res))
+        _write_atomic(out_base + ".csv", write_csv)
+    return status
+
+
+def run_batch(files: List[str], output_dir: str, model: str, api_key: str,
+              workers: int, formats: List[str], resume: bool = False, use_cache: bool = True,
+              async_mode: bool = False, max_in_flight: Optional[int] = None,
+              metrics_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+              budget: Optional[TokenBudget] = None, file_timeout: Optional[float] = None) -> int:
+    """
+    Processa os arquivos em paralelo e imprime resumo de vazão. Retorna código de saída.
+
+    metrics_path recebe uma linha JSON de métricas por arquivo (tempos por etapa,
+    bytes e tokens); prometheus_path, os totais do lote no formato do Prometheus.
+    Com budget, arquivos que não cabem no orçamento de tokens terminam com erro.
+    file_timeout é o prazo por arquivo em segundos (padrão: ANALYSIS_FILE_TIMEOUT);
+    arquivos que o excedem terminam com erro. Ctrl+C interrompe as análises em
+    andamento em vez de esperar pelas respostas do modelo.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = output_basenames(files)
+
+    pending = []
+    skipped = 0
+    for path in files:
+        out_base = os.path.join(output_dir, names[path])
+        if resume and is_already_processed(out_base + ".json"):
+            skipped += 1
+            continue
+        pending.append((path, out_base))
+
+    if skipped:
+        print(f"⏭️ {skipped} arquivo(s) já processado(s) - ignorados na retomada")
+    if not pending:
+        print("✅ Nada a processar.")
+        return 0
+
+    workers = max(1, min(workers, len(pending)))
+    if async_mode:
+        print(f"⚙️ Processando {len(pending)} arquivo(s) em modo assíncrono "
+              f"({workers} rasterizando, até {max_in_flight or 'OPENROUTER_MAX_INFLIGHT'} requisições) - modelo {model}")
+    else:
+        print(f"⚙️ Processando {len(pending)} arquivo(s) com {workers} worker(s) - modelo {model}")
+    if budget is not None:
+        print(f"🪙 Orçamento do lote: {budget.limit_tokens} tokens (modo {budget.mode})")
+
+    lock = threading.Lock()
+    batch_token = CancelToken()
+    stats = {STATUS_OK: 0, STATUS_PARCIAL: 0, STATUS_ERRO: 0}
+    runs: List[Dict] = []
+    started = time.perf_counter()
+
+    def report(path: str, status: str, metrics: Optional[Dict] = None):
+        with lock:
+            stats[status] += 1
+            done = sum(stats.values())
+            if metrics:
+                runs.append(metrics)
+        print(f"[{done}/{len(pending)}] {status.upper()} {os.path.basename(path)}")
+
+    if async_mode:
+        out_bases = dict(pending)
+
+        def on_result(path: str, res: AnalysisResult):
+            res.arquivo = os.path.basename(path)
+            # No modo assíncrono a duração é o tempo até a conclusão desde o início do lote
+            try:
+                status = write_outputs(res, path, out_bases[path], model, time.perf_counter() - started, formats)
+            except OSError as e:
+                status = STATUS_ERRO
+                print(f"❌ Erro ao gravar {os.path.basename(path)}: {e}", file=sys.stderr)
+            report(path, status, res.metricas)
+
+        analyze_files(model, list(out_bases), api_key, use_cache=use_cache,
+                      max_in_flight=max_in_flight, prepare_workers=workers, on_result=on_result,
+                      budget=budget, cancel_token=batch_token, file_timeout=file_timeout)
+    else:
+        def process(path: str, out_base: str) -> Tuple[str, Dict]:
+            t0 = time.perf_counter()
+            res = analyze_with_vision_llm(model, path, api_key, use_cache=use_cache, budget=budget,
+                                          cancel_token=batch_token, file_timeout=file_timeout)
+            res.arquivo = os.path.basename(path)
+            return write_outputs(res, path, out_base, model, time.perf_counter() - t0, formats), res.metricas
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lote") as executor:
+            futures = {executor.submit(process, path, out_base): path for path, out_base in pending}
+            try:
+                for future in as_completed(futures):
+                    path = futures[future]
+                    metrics = None
+                    try:
+                        status, metrics = future.result()
+                    except Exception as e:
+                        status = STATUS_ERRO
+                        print(f"❌ Erro ao processar {os.path.basename(path)}: {e}", file=sys.stderr)
+                    report(path, status, metrics)
+            except KeyboardInterrupt:
+                # Sem isso, a saída do executor esperaria as requisições em andamento terminarem
+                batch_token.cancel("lote interrompido pelo usuário")
+                print("⏹️ Interrompido - encerrando as análises em andamento...", file=sys.stderr)
+                raise
+
+    elapsed = time.perf_counter() - started
+    per_min = (len(pending) / elapsed * 60) if elapsed > 0 else 0.0
+    print(f"🎉 Concluído: {stats[STATUS_OK]} ok, {stats[STATUS_PARCIAL]} parcial(is), "
+          f"{stats[STATUS_ERRO]} com erro, {skipped} retomado(s)")
+    print(f"⏱️ Tempo total: {elapsed:.1f}s - vazão: {per_min:.2f} arquivo(s)/min")
+    if budget is not None:
+        print(f"🪙 Orçamento: {budget.summary()}")
+    if runs:
+        print_stage_summary(runs)
+        try:
+            if metrics_path:
+                append_jsonl(metrics_path, runs)
+            if prometheus_path:
+                write_prometheus(prometheus_path, runs)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar as métricas: {e}", file=sys.stderr)
+    return 0 if stats[STATUS_ERRO] == 0 and stats[STATUS_PARCIAL] == 0 else 1
+
+
+def print_stage_summary(runs: List[Dict]):
+    """Imprime o tempo somado por etapa (em ordem decrescente), bytes enviados, tokens e custo."""
+    stages: Dict[str, float] = {}
+    for run in runs:
+        for name, stage in run.get("etapas", {}).items():
+            stages[name] = stages.get(name, 0.0) + stage.get("segundos", 0.0)
+    if stages:
+        ordered = sorted(stages.items(), key=lambda item: item[1], reverse=True)
+        print("📊 Etapas (soma): " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in ordered))
+    sent = sum(run.get("bytes_enviados", 0) for run in runs)
+    tokens = {field: sum(run.get("tokens", {}).get(field, 0) for run in runs)
+              for field in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    cost = sum(run.get("custo", 0.0) for run in runs)
+    print(f"📦 Enviados: {sent / (1024 * 1024):.1f}MB - {format_usage(tokens['total_tokens'], cost, tokens)}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="Análise de matrículas em lote, sem interface gráfica."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    analyze = sub.add_parser("analyze", help="Analisa PDFs/imagens e grava JSON/CSV por arquivo")
+    analyze.add_argument("inputs", nargs="+", help="Arquivos e/ou diretórios a processar")
+    analyze.add_argument("-o", "--saida", default="resultados",
+                         help="Diretório de saída (padrão: ./resultados)")
+    analyze.add_argument("-w", "--workers", type=int, default=MAX_PARALLEL_FILES,
+                         help=f"Análises simultâneas (padrão: {MAX_PARALLEL_FILES}, ver ANALYSIS_MAX_WORKERS)")
+    analyze.add_argument("-m", "--modelo", default=DEFAULT_MODEL,
+                         help=f"Modelo OpenRouter (padrão: {DEFAULT_MODEL})")
+    analyze.add_argument("--formato", choices=["json", "csv", "ambos"], default="ambos",
+                         help="Formato(s) de saída por arquivo")
+    analyze.add_argument("--retomar", action="store_true",
+                         help="Pula arquivos cujo JSON de saída já existe com status ok")
+    analyze.add_argument("--sem-cache", action="store_true",
+                         help="Ignora o cache de resultados (ver RESULT_CACHE_DISABLED)")
+    analyze.add_argument("--assincrono", action="store_true",
+                         help="Dispara as requisições de um único event loop; --workers passa a limitar "
+                              "só a rasterização")
+    analyze.add_argument("--em-voo", type=int, default=None,
+                         help="Requisições simultâneas no modo assíncrono (padrão: OPENROUTER_MAX_INFLIGHT)")
+    analyze.add_argument("-r", "--recursivo", action="store_true",
+                         help="Percorre subdiretórios")
+    analyze.add_argument("--api-key", default=None,
+                         help="Chave OpenRouter (padrão: variável OPENROUTER_API_KEY)")
+    analyze.add_argument("--orcamento-tokens", type=int, default=None, metavar="N",
+                         help="Limite de tokens do lote (padrão: BATCH_TOKEN_BUDGET; 0 = sem limite)")
+    analyze.add_argument("--orcamento-modo", choices=["parar", "reduzir"], default=None,
+                         help="Ao faltar orçamento: recusar o arquivo ou antes reduzir a resolução das "
+                              "imagens (padrão: BATCH_BUDGET_MODE ou reduzir)")
+    analyze.add_argument("--prazo", type=float, default=None, metavar="SEGUNDOS",
+                         help="Prazo por arquivo; ao expirar, a análise é interrompida e o arquivo termina "
+                              "com erro (padrão: ANALYSIS_FILE_TIMEOUT; 0 = sem prazo)")
+    analyze.add_argument("--metricas", default=None, metavar="ARQUIVO.jsonl",
+                         help="Acrescenta uma linha JSON de métricas (etapas, bytes, tokens) por arquivo")
+    analyze.add_argument("--prometheus", default=None, metavar="ARQUIVO.prom",
+                         help="Grava os totais do lote no formato texto do Prometheus")
+    analyze.add_argument("-v", "--verbose", action="count", default=0,
+                         help="Mais detalhes no console: -v mostra o progresso (INFO), -vv a depuração (DEBUG)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    verbosity = getattr(args, "verbose", 0)
+    configure_logging(console_level={0: None, 1: "INFO"}.get(verbosity, "DEBUG"))
+
+    if args.command == "analyze":
+        api_key = args.api_key or os.environ.get("OPENROUTER_API_KEY", OPENROUTER_API_KEY)
+        if not api_key:
+            print("❌ API Key não configurada. Defina OPENROUTER_API_KEY ou use --api-key.", file=sys.stderr)
+            return 2
+
+        files = collect_input_files(args.inputs, recursive=args.recursivo)
+        if not files:
+            print("❌ Nenhum arquivo suportado encontrado.", file=sys.stderr)
+            return 2
+
+        formats = ["json", "csv"] if args.formato == "ambos" else [args.formato]
+        return run_batch(files, args.saida, args.modelo, api_key, args.workers, formats,
+                         resume=args.retomar, use_cache=not args.sem_cache,
+                         async_mode=args.assincrono, max_in_flight=args.em_voo,
+                         metrics_path=args.metricas, prometheus_path=args.prometheus,
+                         budget=new_token_budget(args.orcamento_tokens, args.orcamento_modo),
+                         file_timeout=args.prazo)
+
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
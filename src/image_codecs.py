@@ -0,0 +1,179 @@
+"""Redimensionamento e codificação das páginas (JPEG, JPEG cinza, WebP, PNG 1 bit)."""
+
+import os
+import io
+import base64
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Union, Callable, Tuple
+
+from PIL import Image, ImageChops
+
+try:
+    from .log_config import get_logger
+except ImportError:
+    from log_config import get_logger
+
+logger = get_logger("imagens")
+
+def fit_image(img: Image.Image, max_size: int) -> Image.Image:
+    """Converte para RGB se necessário (tons de cinza são mantidos) e reduz ao maior lado max_size."""
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    # Redimensiona se muito grande (mantém proporção)
+    if max(img.size) > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return img
+
+
+def image_to_base64(image_path_or_pil: Union[str, Image.Image], max_size: int = 1024, jpeg_quality: int = 85) -> str:
+    """Converte imagem para base64 otimizada para envio à API de visão."""
+    try:
+        if isinstance(image_path_or_pil, str):
+            img = Image.open(image_path_or_pil)
+        else:
+            img = image_path_or_pil
+        
+        img = fit_image(img, max_size)
+        
+        # Converte para base64
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=jpeg_quality, optimize=True)
+        img_str = base64.b64encode(buffer.getvalue()).decode()
+        
+        return img_str
+    except Exception as e:
+        logger.error("Erro ao converter imagem para base64: %s", e)
+        return ""
+
+
+# Formatos de imagem aceitos pela OpenRouter em data URLs
+ACCEPTED_IMAGE_MIMES = ("image/jpeg", "image/png", "image/webp")
+GRAY_MAX_CHROMA = 24           # diferença entre canais abaixo da qual o pixel é considerado cinza
+GRAY_MAX_COLOR_RATIO = 0.002   # fração de pixels coloridos tolerada numa página "cinza"
+BILEVEL_MAX_MIDTONE = 0.35     # fração de meios-tons (sobre o que não é fundo) tolerada no PNG 1 bit
+_TRAITS_EDGE = 512
+
+
+@dataclass(frozen=True)
+class ImageCodec:
+    """Formato de envio de uma página: nome (ver IMAGE_CODECS), tipo MIME e codificador."""
+    nome: str
+    mime: str
+    encode: Callable[[Image.Image, int], bytes]
+    # Tipo de página em que o codec preserva a legibilidade: "qualquer", "cinza" ou "bilevel"
+    requer: str = "qualquer"
+
+
+def _save_bytes(img: Image.Image, **options) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return _save_bytes(img, format="JPEG", quality=quality, optimize=True)
+
+
+def _encode_jpeg_gray(img: Image.Image, quality: int) -> bytes:
+    return _save_bytes(img.convert("L") if img.mode != "L" else img, format="JPEG", quality=quality, optimize=True)
+
+
+def _encode_webp(img: Image.Image, quality: int) -> bytes:
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    # method=2: quase o tamanho do padrão (4) em metade do tempo; ainda ~7x o custo do JPEG
+    return _save_bytes(img, format="WEBP", quality=quality, method=2)
+
+
+def _encode_png_bilevel(img: Image.Image, quality: int) -> bytes:
+    gray = img.convert("L") if img.mode != "L" else img
+    bilevel = gray.point([255 if v >= 128 else 0 for v in range(256)]).convert("1", dither=Image.Dither.NONE)
+    return _save_bytes(bilevel, format="PNG", optimize=True)
+
+
+IMAGE_CODECS: Dict[str, ImageCodec] = {
+    "jpeg": ImageCodec("jpeg", "image/jpeg", _encode_jpeg),
+    "jpeg_cinza": ImageCodec("jpeg_cinza", "image/jpeg", _encode_jpeg_gray, requer="cinza"),
+    "webp": ImageCodec("webp", "image/webp", _encode_webp),
+    "png_1bit": ImageCodec("png_1bit", "image/png", _encode_png_bilevel, requer="bilevel"),
+}
+
+
+def page_traits(img: Image.Image) -> Tuple[bool, bool]:
+    """Classifica a página como (cinza, bilevel) numa amostra reduzida (NEAREST, sem criar meios-tons)."""
+    scale = min(1.0, _TRAITS_EDGE / max(img.size))
+    size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+    sample = img.resize(size, Image.NEAREST)
+    total = size[0] * size[1]
+
+    if sample.mode == "L":
+        gray = True
+        tones = sample
+    else:
+        rgb = sample.convert("RGB")
+        r, g, b = rgb.split()
+        chroma = ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b))
+        gray = sum(chroma.histogram()[GRAY_MAX_CHROMA:]) <= total * GRAY_MAX_COLOR_RATIO
+        tones = rgb.convert("L")
+
+    hist = tones.histogram()
+    midtones = sum(hist[64:192])
+    content = sum(hist[:192])
+    bilevel = gray and content > 0 and midtones <= content * BILEVEL_MAX_MIDTONE
+    return gray, bilevel
+
+
+def configured_codecs(spec: Optional[str] = None) -> List[ImageCodec]:
+    """Codecs de `spec` (ex.: "jpeg,jpeg_cinza,png_1bit"), sempre com JPEG como último recurso."""
+    if spec is None:
+        spec = os.environ.get("IMAGE_CODECS", "jpeg,jpeg_cinza,png_1bit")
+    codecs = []
+    for name in (part.strip().lower() for part in spec.split(",")):
+        codec = IMAGE_CODECS.get(name)
+        if codec is None:
+            if name:
+                logger.warning("⚠️ Codec de imagem desconhecido ignorado: %s", name)
+            continue
+        if codec.mime in ACCEPTED_IMAGE_MIMES and codec not in codecs:
+            codecs.append(codec)
+    if not any(codec.requer == "qualquer" for codec in codecs):
+        codecs.append(IMAGE_CODECS["jpeg"])
+    return codecs
+
+
+ACTIVE_CODECS = configured_codecs()
+
+
+def encode_image(img: Image.Image, quality: int, codecs: Optional[List[ImageCodec]] = None) -> Tuple[ImageCodec, bytes]:
+    """Codifica a imagem (já no tamanho final) com cada codec aplicável e fica com o menor resultado."""
+    codecs = codecs if codecs is not None else ACTIVE_CODECS
+    gray, bilevel = page_traits(img) if any(c.requer != "qualquer" for c in codecs) else (False, False)
+    allowed = {"qualquer": True, "cinza": gray, "bilevel": bilevel}
+    names = {codec.nome for codec in codecs}
+    best: Optional[Tuple[ImageCodec, bytes]] = None
+    for codec in codecs:
+        if not allowed.get(codec.requer, False):
+            continue
+        if gray and codec.nome == "jpeg" and "jpeg_cinza" in names:
+            continue  # numa página cinza o JPEG colorido nunca é menor
+        data = codec.encode(img, quality)
+        if best is None or len(data) < len(best[1]):
+            best = (codec, data)
+    if best is None:
+        best = (IMAGE_CODECS["jpeg"], _encode_jpeg(img, quality))
+    return best
+
+
+def to_data_url(mime: str, data: bytes) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def thumbnail(img: Image.Image, max_edge: int) -> Image.Image:
+    """Reduz (nunca amplia) com média por área, em tons de cinza."""
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    scale = min(1.0, max_edge / max(img.size))
+    size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+    return img.resize(size, Image.BOX).convert("L")
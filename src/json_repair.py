@@ -0,0 +1,279 @@
+"""Localização, leitura incremental e reparo do JSON das respostas do modelo."""
+
+import re
+import json
+from typing import List, Dict, Optional, Callable, Tuple
+
+try:
+    from .log_config import get_logger
+except ImportError:
+    from log_config import get_logger
+
+logger = get_logger("json")
+
+# String JSON inteira (aspa final opcional: resposta truncada) ou delimitador
+_JSON_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"?|[{}\[\]]')
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _strip_span(content: str, start: int, end: int) -> Tuple[int, int]:
+    """Equivalente a content[start:end].strip() sem copiar o trecho."""
+    while start < end and content[start].isspace():
+        start += 1
+    while end > start and content[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _balanced_end(content: str, start: int) -> int:
+    """Fim (exclusivo) do objeto/array aberto em `start`, ou len(content) se truncado."""
+    depth = 0
+    for match in _JSON_TOKEN.finditer(content, start):
+        char = content[match.start()]
+        if char == '"':
+            continue
+        if char in "{[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return len(content)
+
+
+def _fenced_span(content: str) -> Optional[Tuple[int, int]]:
+    """Trecho do primeiro bloco ```json (ou ``` sem linguagem que comece com { ou [)."""
+    generic = None
+    fence = content.find("```")
+    while fence != -1:
+        line_end = content.find("\n", fence + 3)
+        if line_end == -1:
+            break
+        tag = content[fence + 3:line_end].strip().lower()
+        # A cerca de fechamento começa uma linha (crases dentro de strings não contam)
+        close = content.find("\n```", line_end)
+        body = _strip_span(content, line_end + 1, close if close != -1 else len(content))
+        if tag == "json":
+            return body
+        if generic is None and not tag and body[0] < body[1] and content[body[0]] in "{[":
+            generic = body
+        if close == -1:
+            break
+        fence = content.find("```", close + 4)
+    return generic
+
+
+def _first_json_start(content: str) -> int:
+    """Início do JSON sem cerca: a própria resposta, se começar com { ou [; senão o primeiro {."""
+    first, _ = _strip_span(content, 0, len(content))
+    return first if content.startswith(("{", "["), first) else content.find("{")
+
+
+def find_json_span(content: str) -> Optional[Tuple[int, int]]:
+    """(início, fim) do JSON da resposta: bloco markdown ou primeiro objeto balanceado; None se não houver."""
+    if "```" in content:
+        span = _fenced_span(content)
+        if span is not None:
+            return span
+    start = _first_json_start(content)
+    if start == -1:
+        return None
+    return start, _balanced_end(content, start)
+
+
+def clean_json_response(content: str) -> str:
+    """Extrai JSON de uma resposta que pode conter markdown e texto adicional"""
+    span = find_json_span(content)
+    if span is None:
+        # Se não encontrou nada, retorna o conteúdo original
+        logger.warning("⚠️ Nenhum JSON encontrado, retornando conteúdo original: %d chars", len(content))
+        return content.strip()
+    logger.debug("✅ JSON localizado em [%d:%d] de %d chars", span[0], span[1], len(content))
+    return content[span[0]:span[1]]
+
+
+def parse_json_response(content: str):
+    """
+    Equivalente a json.loads(clean_json_response(content)), sem copiar o trecho.
+    Se o primeiro objeto balanceado não for JSON válido, tenta os seguintes.
+    """
+    fenced = _fenced_span(content) if "```" in content else None
+    start = fenced[0] if fenced is not None else _first_json_start(content)
+    if start == -1:
+        logger.warning("⚠️ Nenhum JSON encontrado na resposta: %d chars", len(content))
+        return json.loads(content)
+    error = None
+    while start != -1:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(content, start)
+            return value
+        except json.JSONDecodeError as e:
+            error = error or e
+        if fenced is not None:
+            break
+        start = content.find("{", _balanced_end(content, start))
+    raise error
+
+# Tokens para o reparo: strings (grupo q = aspa final), pontuação e escalares
+_JSON_REPAIR_TOKEN = re.compile(
+    r'(?P<s>"[^"\\]*(?:\\.[^"\\]*)*(?P<q>")?)|(?P<p>[{}\[\],:])|(?P<v>[^\s{}\[\],:"]+)')
+_JSON_SCALAR = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JSONStreamScanner:
+    """
+    Varredura incremental de um JSON que chega em pedaços (streaming) ou cortado.
+
+    Elementos dos arrays de primeiro nível em `watch` ({chave: tipo}) são
+    entregues a on_item(tipo, valor) assim que se fecham; o último ponto seguro
+    permite fechar o JSON a qualquer momento (ver closed_text).
+    """
+
+    def __init__(self, on_item: Optional[Callable[[str, object], None]] = None,
+                 watch: Optional[Dict[str, str]] = None):
+        self.on_item = on_item
+        self.watch = watch or {}
+        # Pilha de [abertura, chave no pai, estado, última chave lida]
+        self._stack: List[list] = []
+        self._pending = ""
+        self._offset = 0  # posição de _pending[0] no texto recebido
+        self._capture: Optional[List[str]] = None
+        self._capture_kind = ""
+        self._capture_depth = 0
+        self.started = False
+        self.done = False
+        self.failed = False
+        self.start = -1  # posição da raiz no texto recebido
+        self.safe_end = -1
+        self.safe_path: Tuple[Tuple[str, Optional[str]], ...] = ()
+
+    def feed(self, text: str):
+        if self.done or self.failed:
+            return
+        pending = self._pending + text
+        pos = 0
+        if not self.started:
+            starts = [i for i in (pending.find("{"), pending.find("[")) if i != -1]
+            if not starts:
+                self._offset += len(pending)
+                self._pending = ""
+                return
+            pos = min(starts)
+            self.started, self.start = True, self._offset + pos
+        length = len(pending)
+        while not self.done and not self.failed:
+            match = _JSON_REPAIR_TOKEN.search(pending, pos)
+            if match is None:
+                pos = length
+                break
+            if match.lastgroup == "s" and match.group("q") is None or match.lastgroup == "v" and match.end() == length:
+                pos = match.start()
+                break
+            self._consume(match.lastgroup, match.group(), self._offset + match.end())
+            pos = match.end()
+        self._pending = pending[pos:]
+        self._offset += pos
+
+    def _consume(self, kind: str, token: str, end: int):
+        stack = self._stack
+        top = stack[-1] if stack else None
+        state = top[2] if top else "value"
+        expects_value = state == "value" or state == "start" and top is not None and top[0] == "["
+        if self._capture is not None:
+            self._capture.append(token)
+
+        if kind == "p" and token in "{[":
+            if not (expects_value or top is None):
+                return self._fail()
+            key = json.loads(top[3]) if top and top[0] == "{" else None
+            if top is not None and top[0] == "[" and len(stack) == 2 and stack[-1][1] in self.watch:
+                self._capture, self._capture_kind = [token], self.watch[stack[-1][1]]
+                self._capture_depth = len(stack) + 1
+            stack.append([token, key, "start", None])
+        elif kind == "p" and token in "}]":
+            if not top or _CLOSERS[top[0]] != token or state not in ("start", "after"):
+                return self._fail()
+            if self._capture is not None and len(stack) == self._capture_depth:
+                item, self._capture = json.loads("".join(self._capture)), None
+                if self.on_item is not None:
+                    self.on_item(self._capture_kind, item)
+            stack.pop()
+            if not stack:
+                self.done, self.safe_end, self.safe_path = True, end, ()
+                return
+            stack[-1][2] = "after"
+        elif token == ",":
+            if state != "after":
+                return self._fail()
+            top[2] = "key" if top[0] == "{" else "value"
+        elif token == ":":
+            if not top or top[0] != "{" or state != "colon":
+                return self._fail()
+            top[2] = "value"
+        elif kind == "s" and top is not None and top[0] == "{" and state in ("start", "key"):
+            top[2], top[3] = "colon", token
+            return
+        elif top is None or not expects_value or kind == "v" and not _JSON_SCALAR.fullmatch(token):
+            return self._fail()
+        else:
+            top[2] = "after"
+
+        if stack and stack[-1][2] in ("after", "start"):
+            self.safe_end, self.safe_path = end, tuple((frame[0], frame[1]) for frame in stack)
+
+    def _fail(self):
+        self.failed = True
+        self._capture = None
+
+    def closed_text(self, text: str) -> Optional[str]:
+        """`text` (o mesmo recebido por feed) cortado no ponto seguro e com os contêineres fechados."""
+        if self.safe_end == -1:
+            return None
+        closers = "".join(_CLOSERS[opener] for opener, _ in reversed(self.safe_path))
+        return text[self.start:self.safe_end] + closers
+
+
+def repair_json_response(content: str) -> Optional[Tuple[object, List[Optional[str]]]]:
+    """
+    Maior prefixo válido de um JSON truncado, com os contêineres abertos fechados.
+    Retorna (valor, chaves dos contêineres fechados, da raiz para dentro) ou None.
+    """
+    if "```" in content:
+        fenced = _fenced_span(content)
+        start = fenced[0] if fenced is not None else _first_json_start(content)
+    else:
+        start = _first_json_start(content)
+    if start == -1:
+        return None
+    scanner = JSONStreamScanner()
+    scanner.feed(content[start:])
+    repaired = scanner.closed_text(content[start:])
+    if repaired is None:
+        return None
+    try:
+        return json.loads(repaired), [key for _, key in scanner.safe_path]
+    except json.JSONDecodeError:
+        return None
+
+
+def salvage_analysis_response(content: str) -> Optional[Dict]:
+    """Resposta truncada com as matrículas completas e "parcial": True, ou None se nada se aproveita."""
+    repaired = repair_json_response(content)
+    if repaired is None or not isinstance(repaired[0], dict):
+        return None
+    parsed, path = repaired
+    if not parsed:
+        return None
+    found = parsed.get("matriculas_encontradas")
+    if "matriculas_encontradas" in path and isinstance(found, list) and found:
+        depth = path.index("matriculas_encontradas")
+        if len(path) > depth + 1:
+            found.pop()
+    count = len(found) if isinstance(found, list) else 0
+    parsed["parcial"] = True
+    parsed["reasoning"] = (
+        f"Resposta do modelo incompleta (truncada ou inválida); resultado parcial com "
+        f"{count} matrícula(s) completa(s) recuperada(s). " + str(parsed.get("reasoning") or "")
+    ).strip()
+    return parsed
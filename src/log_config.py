@@ -0,0 +1,131 @@
+"""
+Configuração de logging do Sistema de Análise de Matrículas
+
+Os módulos obtêm seus loggers com ``get_logger(nome)`` (hierarquia
+"analisador.*") e registram mensagens com formatação preguiçosa
+(``logger.debug("... %s", valor)``): abaixo do nível ativo, nada é formatado.
+Os pontos de entrada (interface e CLI) chamam ``configure_logging`` uma vez.
+
+Por padrão o console só mostra avisos e erros, e o arquivo rotativo guarda o
+nível INFO, que continua disponível no executável sem console (PyInstaller).
+
+Configuração por variáveis de ambiente:
+- LOG_LEVEL           nível no console (padrão: WARNING)
+- LOG_FILE_LEVEL      nível no arquivo (padrão: INFO)
+- LOG_DIR             diretório do arquivo (padrão: cache do usuário/logs)
+- LOG_FILE_DISABLED=1 desativa o arquivo
+- LOG_MAX_MB          tamanho de cada arquivo antes da rotação (padrão: 5)
+- LOG_BACKUPS         arquivos antigos mantidos (padrão: 3)
+"""
+
+import os
+import sys
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from typing import Optional, Union
+
+LOGGER_NAME = "analisador"
+LOG_FILENAME = "analisador.log"
+_FORMAT = "%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s"
+
+_configured = False
+_config_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger de um módulo dentro da hierarquia do aplicativo."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def _level(value: Union[str, int, None], default: int) -> int:
+    if value is None or value == "":
+        return default
+    if isinstance(value, int):
+        return value
+    value = value.strip().upper()
+    if value.isdigit():
+        return int(value)
+    return logging.getLevelName(value) if isinstance(logging.getLevelName(value), int) else default
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _default_log_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "analisador_matriculas", "logs")
+
+
+def configure_logging(console_level: Union[str, int, None] = None,
+                      file_level: Union[str, int, None] = None,
+                      log_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Instala os handlers de console e de arquivo rotativo (uma única vez).
+
+    Args:
+        console_level: Nível do console (se None, usa LOG_LEVEL ou WARNING)
+        file_level: Nível do arquivo (se None, usa LOG_FILE_LEVEL ou INFO)
+        log_dir: Diretório do arquivo (se None, usa LOG_DIR ou cache do usuário)
+
+    Returns:
+        Caminho do arquivo de log, ou None se desativado/indisponível
+    """
+    global _configured
+    with _config_lock:
+        logger = logging.getLogger(LOGGER_NAME)
+        if _configured:
+            # Reconfiguração (ex.: -v na CLI) só ajusta o nível do console
+            if console_level is not None:
+                for handler in logger.handlers:
+                    if not isinstance(handler, RotatingFileHandler):
+                        handler.setLevel(_level(console_level, logging.WARNING))
+                _update_logger_level(logger)
+            return next((h.baseFilename for h in logger.handlers if isinstance(h, RotatingFileHandler)), None)
+
+        logger.propagate = False
+        formatter = logging.Formatter(_FORMAT)
+        log_path = None
+
+        # No executável sem console (PyInstaller --windowed) sys.stderr é None
+        if sys.stderr is not None:
+            console = logging.StreamHandler()
+            console.setLevel(_level(console_level if console_level is not None else os.environ.get("LOG_LEVEL"),
+                                    logging.WARNING))
+            console.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+            logger.addHandler(console)
+
+        disabled = os.environ.get("LOG_FILE_DISABLED", "").strip().lower() in ("1", "true", "sim", "yes")
+        if not disabled:
+            directory = log_dir or os.environ.get("LOG_DIR") or _default_log_dir()
+            try:
+                os.makedirs(directory, exist_ok=True)
+                log_path = os.path.join(directory, LOG_FILENAME)
+                file_handler = RotatingFileHandler(
+                    log_path,
+                    maxBytes=int(_env_number("LOG_MAX_MB", 5) * 1024 * 1024),
+                    backupCount=int(_env_number("LOG_BACKUPS", 3)),
+                    encoding="utf-8",
+                    delay=True,
+                )
+                file_handler.setLevel(_level(file_level if file_level is not None else os.environ.get("LOG_FILE_LEVEL"),
+                                             logging.INFO))
+                file_handler.setFormatter(formatter)
+                logger.addHandler(file_handler)
+            except OSError as e:
+                log_path = None
+                logger.warning("Log em arquivo indisponível (%s): %s", directory, e)
+
+        _update_logger_level(logger)
+        _configured = True
+        return log_path
+
+
+def _update_logger_level(logger: logging.Logger):
+    """O logger deixa passar só o que algum handler vai gravar (debug desligado não custa nada)."""
+    levels = [handler.level for handler in logger.handlers]
+    logger.setLevel(min(levels) if levels else logging.WARNING)
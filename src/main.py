@@ -1,35 +1,46 @@
 
 import os
 import sys
-import io
 import json
 import queue
 import threading
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
 import base64
 import importlib
 from pathlib import Path
-from dataclasses import dataclass, asdict
+from dataclasses import asdict
 from typing import List, Dict, Optional, Tuple, Union
 import configparser
 
-# --- OCR & PDF ---
-import fitz  # PyMuPDF
-from PIL import Image
-try:
-    from pdf2image import convert_from_path  # Para conversão de PDF em imagens
-    PDF2IMAGE_AVAILABLE = True
-except Exception:
-    PDF2IMAGE_AVAILABLE = False
-
-# --- HTTP & env ---
+# --- HTTP ---
 import requests
-from dotenv import load_dotenv
 from datetime import datetime
 
-# --- Utilidades ---
-import textwrap
+# --- Pipeline de análise (sem dependência de GUI) ---
+try:
+    from .settings import DEFAULT_MODEL, OPENROUTER_API_KEY, FULL_REPORT_MODEL
+    from .analysis import MAX_PARALLEL_FILES, ANALYSIS_FILE_TIMEOUT, analyze_with_vision_llm
+    from .results import AnalysisResult, CSV_HEADER, result_to_csv_row
+    from .rendering import get_pdf_page_count
+    from .openrouter_api import call_openrouter_text
+    from .prompts import SYSTEM_PROMPT, build_full_report_prompt
+    from .budgets import new_token_budget, format_usage
+    from .normalization import normalize_matricula_numero
+    from .cancellation import CancelToken
+    from .log_config import configure_logging
+except ImportError:
+    from settings import DEFAULT_MODEL, OPENROUTER_API_KEY, FULL_REPORT_MODEL
+    from analysis import MAX_PARALLEL_FILES, ANALYSIS_FILE_TIMEOUT, analyze_with_vision_llm
+    from results import AnalysisResult, CSV_HEADER, result_to_csv_row
+    from rendering import get_pdf_page_count
+    from openrouter_api import call_openrouter_text
+    from prompts import SYSTEM_PROMPT, build_full_report_prompt
+    from budgets import new_token_budget, format_usage
+    from normalization import normalize_matricula_numero
+    from cancellation import CancelToken
+    from log_config import configure_logging
 
 # --- Exportação de documentos ---
 try:
@@ -137,10 +148,6 @@ if not callable(initialize_feedback_system) or not callable(get_feedback_system)
 # Configuração
 # =========================
 APP_TITLE = "Analisador de Usucapião com IA Visual – Matrículas e Confrontantes (PGE-MS)"
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-# Carrega .env
-load_dotenv()
 
 
 def _load_app_version(default="1.0.0"):
@@ -155,10 +162,6 @@ def _load_app_version(default="1.0.0"):
 
 APP_VERSION = _load_app_version()
 
-DEFAULT_MODEL = os.environ.get("OPENROUTER_MODEL", "google/gemini-2.5-pro")
-OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "")
-FULL_REPORT_MODEL = "google/gemini-2.5-flash"
-
 # =========================
 # Sistema de Persistência de Configuração
 # =========================
@@ -233,1381 +236,6 @@ GOOGLE_FORM_CONFIG = {
     }
 }
 
-# =========================
-# Estruturas
-# =========================
-@dataclass
-class TransmissaoInfo:
-    """Informações sobre uma transmissão na cadeia dominial"""
-    data: Optional[str] = None
-    tipo_transmissao: Optional[str] = None
-    proprietario_anterior: Optional[str] = None
-    novo_proprietario: Optional[str] = None
-    percentual: Optional[str] = None
-    valor: Optional[str] = None
-    registro: Optional[str] = None
-
-@dataclass
-class RestricaoInfo:
-    """Informações sobre restrições e gravames"""
-    tipo: str
-    data_registro: Optional[str] = None
-    credor: Optional[str] = None
-    valor: Optional[str] = None
-    situacao: str = "vigente"  # "vigente" ou "baixada"
-    data_baixa: Optional[str] = None
-    observacoes: Optional[str] = None
-
-
-@dataclass
-class MatriculaInfo:
-    numero: str
-    proprietarios: List[str]
-    descricao: str
-    confrontantes: List[str]
-    evidence: List[str]
-    lote: Optional[str] = None  # número do lote
-    quadra: Optional[str] = None  # número da quadra
-    cadeia_dominial: List[TransmissaoInfo] = None  # histórico de transmissões
-    restricoes: List[RestricaoInfo] = None  # restrições e gravames
-    
-    def __post_init__(self):
-        if self.cadeia_dominial is None:
-            self.cadeia_dominial = []
-        if self.restricoes is None:
-            self.restricoes = []
-
-@dataclass
-class LoteConfronta:
-    """Informações sobre um lote confrontante"""
-    identificador: str  # "lote 10", "matrícula 1234", etc.
-    tipo: str  # "lote", "matrícula", "pessoa", "via_publica", "estado", "outros"
-    matricula_anexada: Optional[str] = None  # número da matrícula se foi anexada
-    direcao: Optional[str] = None  # norte, sul, leste, oeste, etc.
-    
-@dataclass
-class EstadoMSDireitos:
-    """Informações sobre direitos do Estado de MS"""
-    tem_direitos: bool = False
-    detalhes: List[Dict] = None
-    criticidade: str = "baixa"  # "alta", "media", "baixa"
-    observacao: str = ""
-    
-    def __post_init__(self):
-        if self.detalhes is None:
-            self.detalhes = []
-
-@dataclass
-class ResumoAnalise:
-    """Resumo estruturado da análise para o relatório"""
-    cadeia_dominial_completa: Dict[str, List[Dict]] = None  # matrícula -> lista cronológica
-    restricoes_vigentes: List[Dict] = None  # restrições ainda em vigor
-    restricoes_baixadas: List[Dict] = None  # restrições já canceladas
-    estado_ms_direitos: EstadoMSDireitos = None  # direitos do Estado de MS
-    
-    def __post_init__(self):
-        if self.cadeia_dominial_completa is None:
-            self.cadeia_dominial_completa = {}
-        if self.restricoes_vigentes is None:
-            self.restricoes_vigentes = []
-        if self.restricoes_baixadas is None:
-            self.restricoes_baixadas = []
-        if self.estado_ms_direitos is None:
-            self.estado_ms_direitos = EstadoMSDireitos()
-
-@dataclass
-class AnalysisResult:
-    arquivo: str
-    matriculas_encontradas: List[MatriculaInfo]
-    matricula_principal: Optional[str]  # número da matrícula de usucapião
-    matriculas_confrontantes: List[str]  # números das matrículas confrontantes
-    # NOVOS CAMPOS PARA MELHOR CONTROLE
-    lotes_confrontantes: List[LoteConfronta]  # todos os confrontantes identificados
-    matriculas_nao_confrontantes: List[str]  # matrículas anexadas que NÃO são confrontantes
-    lotes_sem_matricula: List[str]  # lotes confrontantes sem matrícula anexada
-    confrontacao_completa: Optional[bool]  # se todas confrontantes foram apresentadas
-    proprietarios_identificados: Dict[str, List[str]]  # número -> lista proprietários
-    resumo_analise: Optional[ResumoAnalise] = None  # resumo estruturado da análise
-    confidence: Optional[float] = None
-    reasoning: str = ""
-    raw_json: Dict = None
-    
-    def __post_init__(self):
-        if self.resumo_analise is None:
-            self.resumo_analise = ResumoAnalise()
-        if self.raw_json is None:
-            self.raw_json = {}
-    
-    # Campos de compatibilidade (para não quebrar código existente)
-    @property
-    def is_confrontante(self) -> Optional[bool]:
-        """Compatibilidade: retorna se encontrou Estado MS como confrontante"""
-        estado_patterns = ['estado de mato grosso do sul', 'estado de ms', 'estado do ms', 
-                          'fazenda do estado', 'governo do estado', 'fazenda pública estadual']
-        for matricula in self.matriculas_encontradas:
-            for confrontante in matricula.confrontantes:
-                if any(pattern in confrontante.lower() for pattern in estado_patterns):
-                    return True
-        return False
-    
-
-
-def image_to_base64(image_path_or_pil: Union[str, Image.Image], max_size: int = 1024, jpeg_quality: int = 85) -> str:
-    """
-    Converte imagem para base64 otimizada para envio à API de visão.
-    """
-    try:
-        if isinstance(image_path_or_pil, str):
-            img = Image.open(image_path_or_pil)
-        else:
-            img = image_path_or_pil
-        
-        # Converte para RGB se necessário
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Redimensiona se muito grande (mantém proporção)
-        if max(img.size) > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # Converte para base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='JPEG', quality=jpeg_quality, optimize=True)
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        return img_str
-    except Exception as e:
-        print(f"Erro ao converter imagem para base64: {e}")
-        return ""
-
-def get_pdf_page_count(pdf_path: str) -> int:
-    """
-    Retorna o número total de páginas de um PDF.
-    """
-    try:
-        if PDF2IMAGE_AVAILABLE:
-            try:
-                from pdf2image.utils import get_page_count  # type: ignore
-                return get_page_count(pdf_path)
-            except Exception:
-                pass
-        
-        # Fallback com PyMuPDF
-        doc = fitz.open(pdf_path)
-        page_count = len(doc)
-        doc.close()
-        return page_count
-        
-    except Exception as e:
-        print(f"Erro ao contar páginas do PDF: {e}")
-        return 0
-
-def pdf_to_images(pdf_path: str, max_pages: Optional[int] = 10) -> List[Image.Image]:
-    """
-    Converte PDF para lista de imagens PIL para análise visual.
-    Se max_pages for None, processa todas as páginas.
-    """
-    images = []
-    try:
-        # Primeiro tenta com pdf2image (mais rápido)
-        if PDF2IMAGE_AVAILABLE:
-            try:
-                if max_pages is None:
-                    # Sem limite - processa todas as páginas
-                    pdf_images = convert_from_path(pdf_path, dpi=200)
-                else:
-                    pdf_images = convert_from_path(pdf_path, dpi=200, first_page=1, last_page=max_pages)
-                return pdf_images
-            except Exception:
-                pass
-        
-        # Fallback com PyMuPDF
-        doc = fitz.open(pdf_path)
-        total_pages = len(doc)
-        pages_to_process = total_pages if max_pages is None else min(total_pages, max_pages)
-        
-        for page_num in range(pages_to_process):
-            page = doc[page_num]
-            # Converte página para imagem
-            mat = fitz.Matrix(2.0, 2.0)  # escala 2x para melhor qualidade
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("ppm")
-            img = Image.open(io.BytesIO(img_data))
-            images.append(img)
-        doc.close()
-        
-    except Exception as e:
-        print(f"Erro ao converter PDF para imagens: {e}")
-    
-    return images
-
-
-# =========================
-# Cliente OpenRouter
-# =========================
-def call_openrouter_vision(model: str, system_prompt: str, user_prompt: str, images_base64: List[str], temperature: float = 0.0, max_tokens: int = 1500, api_key: str = None) -> Dict:
-    """
-    Chama a API OpenRouter com suporte a visão computacional (análise de imagens).
-    """
-    if not api_key:
-        api_key = os.environ.get("OPENROUTER_API_KEY", OPENROUTER_API_KEY)
-    if not api_key:
-        raise RuntimeError("API Key não configurada. Insira sua chave da OpenRouter na interface.")
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://pge-ms.lab/analise-matriculas",
-        "X-Title": "Analise de Matriculas PGE-MS"
-    }
-
-    # Constrói mensagem com imagens
-    content = [{"type": "text", "text": user_prompt}]
-    
-    # Adiciona cada imagem
-    for i, img_b64 in enumerate(images_base64):
-        if img_b64:  # verifica se base64 não está vazio
-            content.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{img_b64}",
-                    "detail": "high"  # alta qualidade para documentos
-                }
-            })
-
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": content}
-        ],
-        "temperature": 0.1,  # Reduzido para respostas mais focadas
-        "max_tokens": max_tokens,
-        "response_format": {"type": "json_object"}
-    }
-
-    try:
-        # Debug detalhado do payload
-        try:
-            message_content = payload['messages'][1]['content']
-            image_count = sum(1 for item in message_content if item.get('type') == 'image_url')
-            text_count = sum(1 for item in message_content if item.get('type') == 'text')
-            
-            print(f"🌐 Fazendo requisição para: {OPENROUTER_URL}")
-            print(f"📦 Payload contém {len(message_content)} elementos total")
-            print(f"🖼️ Imagens no payload: {image_count}")
-            print(f"📝 Textos no payload: {text_count}")
-            print(f"🔑 Modelo: {payload.get('model', 'N/A')}")
-            
-            # Calcula tamanho total do payload em MB
-            import sys
-            payload_size_mb = sys.getsizeof(str(payload)) / (1024 * 1024)
-            print(f"📐 Tamanho do payload: {payload_size_mb:.2f}MB")
-            
-        except Exception as e:
-            print(f"⚠️ Erro ao analisar payload: {e}")
-            print(f"📊 Estrutura do payload: {list(payload.keys()) if isinstance(payload, dict) else type(payload)}")
-        
-        resp = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=120)
-        
-        print(f"📡 Status da resposta: {resp.status_code}")
-        print(f"📊 Headers da resposta: {dict(list(resp.headers.items())[:5])}...")  # primeiros 5 headers
-        
-        if resp.status_code != 200:
-            print(f"❌ Erro HTTP {resp.status_code}: {resp.text[:500]}")
-            # Tenta extrair mais detalhes do erro
-            try:
-                error_data = json.loads(resp.text)
-                if "error" in error_data:
-                    error_msg = error_data["error"]
-                    if isinstance(error_msg, dict):
-                        error_details = error_msg.get("message", str(error_msg))
-                    else:
-                        error_details = str(error_msg)
-                    raise RuntimeError(f"API Error ({resp.status_code}): {error_details}")
-            except json.JSONDecodeError:
-                pass
-            raise RuntimeError(f"API retornou status {resp.status_code}: {resp.text[:200]}")
-            
-        response_text = resp.text.strip()
-        print(f"📝 Tamanho da resposta: {len(response_text)} chars")
-        
-        if not response_text:
-            raise RuntimeError("Resposta vazia da API")
-        
-        # Debug da resposta bruta
-        if len(response_text) < 200:
-            print(f"📄 Resposta completa: {response_text}")
-        else:
-            print(f"📄 Início da resposta: {response_text[:300]}...")
-            print(f"📄 Final da resposta: ...{response_text[-100:]}")
-            
-        # Parse mais robusto do JSON
-        try:
-            data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"❌ Erro JSON: {e}")
-            print(f"📄 Conteúdo problemático: {response_text[:1000]}")
-            raise RuntimeError(f"Resposta da API não é JSON válido: {e}")
-        
-        # Debug da estrutura da resposta
-        print(f"🔍 Estrutura da resposta: {list(data.keys()) if isinstance(data, dict) else type(data)}")
-        
-        if not isinstance(data, dict):
-            raise RuntimeError(f"Resposta da API não é um objeto JSON: {type(data)}")
-        
-        if "choices" not in data:
-            print(f"❌ Campo 'choices' não encontrado. Campos disponíveis: {list(data.keys())}")
-            # Verifica se há uma mensagem de erro
-            if "error" in data:
-                error_msg = data["error"]
-                raise RuntimeError(f"API retornou erro: {error_msg}")
-            raise RuntimeError(f"Campo 'choices' ausente na resposta. Estrutura: {data}")
-        
-        if not data["choices"]:
-            print(f"❌ Lista 'choices' está vazia")
-            raise RuntimeError("Lista 'choices' vazia na resposta da API")
-        
-        if not isinstance(data["choices"], list):
-            print(f"❌ 'choices' não é uma lista: {type(data['choices'])}")
-            raise RuntimeError(f"Campo 'choices' deve ser uma lista, mas é: {type(data['choices'])}")
-        
-        print(f"✅ Resposta válida com {len(data['choices'])} choice(s)")
-        return data
-        
-    except requests.exceptions.RequestException as e:
-        raise RuntimeError(f"Erro na requisição para OpenRouter: {e}")
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Erro ao decodificar JSON da resposta: {e}. Resposta: {response_text[:500]}")
-    except Exception as e:
-        raise RuntimeError(f"Erro inesperado na chamada da API: {e}")
-
-
-def call_openrouter_text(model: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 2000, api_key: str = None) -> str:
-    """Chama a API OpenRouter para gerar texto com base em prompt estruturado."""
-    if not api_key:
-        api_key = os.environ.get("OPENROUTER_API_KEY", OPENROUTER_API_KEY)
-    if not api_key:
-        raise RuntimeError("API Key não configurada. Insira sua chave da OpenRouter na interface.")
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://pge-ms.lab/analise-matriculas",
-        "X-Title": "Analise de Matriculas PGE-MS"
-    }
-
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
-
-    try:
-        print(f"🌐 [Texto] Requisição para {OPENROUTER_URL} com modelo {model}")
-        resp = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=120)
-        print(f"📡 [Texto] Status: {resp.status_code}")
-
-        if resp.status_code != 200:
-            preview = resp.text[:500]
-            raise RuntimeError(f"API retornou status {resp.status_code}: {preview}")
-
-        data = resp.json()
-        if not isinstance(data, dict) or "choices" not in data or not data["choices"]:
-            raise RuntimeError(f"Resposta inesperada da API: {data}")
-
-        message = data["choices"][0]["message"].get("content", "")
-        if not message:
-            raise RuntimeError("Resposta da API não contém conteúdo textual.")
-
-        print(f"✅ [Texto] Conteúdo recebido com {len(message)} caracteres")
-        return message
-
-    except requests.exceptions.RequestException as exc:
-        raise RuntimeError(f"Erro na requisição para OpenRouter: {exc}") from exc
-
-
-def clean_json_response(content: str) -> str:
-    """Extrai JSON de uma resposta que pode conter markdown e texto adicional"""
-    content = content.strip()
-    
-    # Procura por blocos JSON em markdown
-    import re
-    
-    # Padrão 1: ```json ... ```
-    json_pattern = r'```json\s*\n(.*?)\n```'
-    match = re.search(json_pattern, content, re.DOTALL)
-    if match:
-        json_content = match.group(1).strip()
-        print(f"✅ JSON extraído do markdown (```json): {len(json_content)} chars")
-        return json_content
-    
-    # Padrão 2: ``` ... ``` (sem especificar json)
-    json_pattern = r'```\s*\n(.*?)\n```'
-    match = re.search(json_pattern, content, re.DOTALL)
-    if match:
-        candidate = match.group(1).strip()
-        # Verifica se parece com JSON (começa com { ou [)
-        if candidate.startswith('{') or candidate.startswith('['):
-            print(f"✅ JSON extraído do markdown (```): {len(candidate)} chars")
-            return candidate
-    
-    # Padrão 3: Procura por { ... } que parece ser JSON
-    json_pattern = r'\{.*\}'
-    match = re.search(json_pattern, content, re.DOTALL)
-    if match:
-        candidate = match.group(0).strip()
-        print(f"✅ JSON extraído por regex {{...}}: {len(candidate)} chars")
-        return candidate
-    
-    # Se não encontrou nada, retorna o conteúdo original
-    print(f"⚠️ Nenhum JSON encontrado, retornando conteúdo original: {len(content)} chars")
-    return content
-
-# =========================
-# Prompting
-# =========================
-
-# Sistema unificado de prompts para análise de matrículas imobiliárias
-UNIFIED_SYSTEM_PROMPT = (
-    "Você é um perito ESPECIALISTA em análise de processos de usucapião e matrículas imobiliárias brasileiras. "
-    "Sua responsabilidade é CRÍTICA: a identificação COMPLETA de confrontantes pode determinar o sucesso ou fracasso de um usucapião.\n\n"
-
-    "🎯 MISSÃO VITAL:\n"
-    "• IDENTIFIQUE TODOS os confrontantes da matrícula principal SEM EXCEÇÃO\n"
-    "• TODO LOTE DEVE TER NO MÍNIMO 4 CONFRONTANTES (uma para cada direção)\n"
-    "• EXTRAIA LITERALMENTE cada nome, matrícula, rua mencionada como confrontante\n"
-    "• ANALISE palavra por palavra a descrição do imóvel principal\n"
-    "• PROCURE confrontantes em TODAS as direções (norte, sul, leste, oeste, nascente, poente, frente, fundos)\n"
-    "• SE MENOS DE 4 CONFRONTANTES: releia o texto procurando informações perdidas\n\n"
-
-    "⚠️ CONSEQUÊNCIAS:\n"
-    "❌ UM confrontante perdido = usucapião pode ser NEGADO\n"
-    "✅ TODOS confrontantes identificados = processo bem fundamentado\n\n"
-
-    "📋 ANÁLISE COMPLETA OBRIGATÓRIA:\n\n"
-
-    "1️⃣ IDENTIFICAÇÃO DE MATRÍCULAS:\n"
-    "• Encontre todas as matrículas presentes (números, mesmo com variações de formatação)\n"
-    "• Para cada matrícula: extraia número, LOTE, QUADRA, proprietários ATUAIS, descrição, confrontantes\n"
-    "• Ignore vendedores/doadores antigos - considere apenas últimos proprietários\n"
-    "• Determine qual é a matrícula principal (objeto do usucapião)\n\n"
-
-    "2️⃣ ANÁLISE EXTREMAMENTE RIGOROSA DE CONFRONTANTES:\n"
-    "📍 ONDE PROCURAR CONFRONTANTES:\n"
-    "• EXCLUSIVAMENTE na DESCRIÇÃO DA MATRÍCULA PRINCIPAL\n"
-    "• Seções 'CONFRONTAÇÕES', 'LIMITES', 'DIVISAS' da matrícula principal\n"
-    "• NÃO buscar confrontantes em outros documentos ou matrículas anexadas\n"
-    "• FOCO TOTAL: apenas a descrição do imóvel da matrícula objeto do usucapião\n\n"
-
-    "🔍 PALAVRAS-CHAVE OBRIGATÓRIAS:\n"
-    "• 'confronta', 'limita', 'divisa', 'ao norte/sul/leste/oeste'\n"
-    "• 'frente', 'fundos', 'laterais', 'adjacente', 'vizinho'\n\n"
-
-    "🎯 TIPOS DE CONFRONTANTES:\n"
-    "• LOTES: 'lote 11', 'lote nº 09' • MATRÍCULAS: 'matrícula 1.234'\n"
-    "• PESSOAS: nomes completos • EMPRESAS: razões sociais\n"
-    "• VIAS PÚBLICAS: ruas, avenidas (PROPRIEDADE DO MUNICÍPIO)\n"
-    "• RODOVIAS ESTADUAIS: apenas estas são de PROPRIEDADE DO ESTADO\n"
-    "• ENTES PÚBLICOS: Estado, Município\n"
-    "• ACIDENTES GEOGRÁFICOS: rios, córregos, lagos\n\n"
-
-    "🌊 REGRA CRÍTICA SOBRE RIOS E CORPOS D'ÁGUA:\n"
-    "• Confrontação com rios, córregos, ribeirões, lagos NÃO representa interesse do Estado de MS\n"
-    "• MESMO que seja rio estadual, isso NÃO configura interesse do Estado no processo\n"
-    "• Rios como confrontantes são IRRELEVANTES para determinar interesse estadual\n"
-    "• APENAS identifique o rio como confrontante (acidente geográfico)\n"
-    "• NUNCA considere rio/córrego/lago como indicativo de interesse do Estado de MS\n\n"
-
-    "⚡ REGRAS CRÍTICAS:\n"
-    "• LEIA PALAVRA POR PALAVRA da descrição do imóvel principal\n"
-    "• CONFRONTANTES: buscar SOMENTE na matrícula principal, NÃO em outras matrículas\n"
-    "• TODO lote tem 4 lados = mínimo 4 confrontantes\n"
-    "• QUANDO MATRÍCULA NÃO ANEXADA: indique 'Matrícula não anexada' no campo matrícula\n"
-    "• EXPRESSE CLARAMENTE quando confrontantes não têm matrícula anexada\n"
-    "• Se menos de 4: RELEIA procurando mais\n"
-    "• NÃO suponha, EXTRAIA exatamente como escrito\n\n"
-
-    "3️⃣ CADEIA DOMINIAL COMPLETA:\n"
-    "• Analise histórico completo de proprietários desde titulação original\n"
-    "• Procure seções: 'REGISTRO', 'TRANSMISSÕES', 'AVERBAÇÕES'\n"
-    "• Para cada transmissão: data, tipo, proprietário anterior, novo proprietário, percentual, valor\n"
-    "• Co-propriedade: trate cada percentual como cadeia autônoma\n\n"
-
-    "4️⃣ RESTRIÇÕES E GRAVAMES:\n"
-    "• Identifique restrições não baixadas: PENHORA, HIPOTECA, INDISPONIBILIDADE\n"
-    "• Verifique status: procure 'BAIXA', 'CANCELAMENTO', 'EXTINÇÃO'\n"
-    "• ATENÇÃO ESPECIAL: direitos do Estado de Mato Grosso do Sul\n\n"
-
-
-    "🚨 VERIFICAÇÕES OBRIGATÓRIAS:\n"
-    "• Estado de MS como PROPRIETÁRIO ou com RESTRIÇÕES registradas?\n"
-    "• Mínimo 4 confrontantes identificados?\n"
-    "• Proprietários atuais confirmados?\n"
-    "• Todas as matrículas mapeadas?\n\n"
-
-    "⚠️ ATENÇÃO: Estado de MS como mero confrontante (vizinho) NÃO configura interesse!\n"
-    "Interesse do Estado existe APENAS quando ele é:\n"
-    "• PROPRIETÁRIO da matrícula OU\n"
-    "• Titular de RESTRIÇÃO/GRAVAME (penhora, hipoteca, etc.)\n\n"
-
-    "🔥 ZERO TOLERÂNCIA para confrontantes perdidos. Cada um é VITAL.\n\n"
-
-    "Considere linguagem arcaica, abreviações, variações tipográficas e OCR imperfeito. "
-    "Para análise visual: leia todo texto visível incluindo tabelas, carimbos e anotações manuscritas."
-)
-
-# Instruções específicas por tipo de análise
-ANALYSIS_INSTRUCTIONS = {
-    'aggregate': (
-        "Você receberá texto extraído de documentos de um processo de usucapião contendo múltiplas matrículas. "
-        "Aplique todas as instruções do sistema para análise completa.\n\n"
-    ),
-    'vision': (
-        "Analise visualmente as imagens de matrículas imobiliárias. "
-        "Leia todo o texto visível (tabelas, carimbos, anotações) considerando ruídos de OCR. "
-        "Aplique todas as instruções do sistema com o mesmo rigor da análise textual.\n\n"
-    ),
-    'partial': (
-        "Você receberá UM TRECHO de uma matrícula. Retorne APENAS JSON com:\n"
-        '{ "confrontantes": ["..."], "evidence": ["trecho literal..."] }\n'
-        "Liste confrontantes exatamente como aparecem no trecho e evidências curtas.\n\n"
-    )
-}
-
-# Esquema JSON padronizado
-JSON_SCHEMA = '''
-Responda em JSON com este esquema:
-{
-  "matriculas_encontradas": [
-    {
-      "numero": "12345",
-      "lote": "10",
-      "quadra": "21",
-      "proprietarios": ["Nome 1", "Nome 2"],
-      "descricao": "descrição do imóvel",
-      "confrontantes": ["lote 11", "confrontante 2"],
-      "evidence": ["trecho literal 1", "trecho literal 2"],
-      "cadeia_dominial": [
-        {
-          "data": "01/01/2020",
-          "tipo_transmissao": "compra e venda",
-          "proprietario_anterior": "João Silva",
-          "novo_proprietario": "Maria Santos",
-          "percentual": "100%",
-          "valor": "R$ 100.000,00",
-          "registro": "R.1"
-        }
-      ],
-      "restricoes": [
-        {
-          "tipo": "hipoteca",
-          "data_registro": "15/06/2019",
-          "credor": "Banco XYZ",
-          "valor": "R$ 80.000,00",
-          "situacao": "vigente",
-          "data_baixa": null,
-          "observacoes": "hipoteca para financiamento imobiliário"
-        }
-      ],
-    }
-  ],
-  "matricula_principal": "12345",
-  "matriculas_confrontantes": ["12346", "12347"],
-  "lotes_confrontantes": [
-    {
-      "identificador": "lote 11",
-      "tipo": "lote",
-      "matricula_anexada": "12346",
-      "direcao": "norte"
-    },
-    {
-      "identificador": "lote 09",
-      "tipo": "lote",
-      "matricula_anexada": null,
-      "direcao": "sul"
-    },
-    {
-      "identificador": "Rua das Flores",
-      "tipo": "via_publica",
-      "matricula_anexada": null,
-      "direcao": "leste"
-    },
-    {
-      "identificador": "BR-163",
-      "tipo": "rodovia_estadual",
-      "matricula_anexada": null,
-      "direcao": "oeste"
-    }
-  ],
-  "matriculas_nao_confrontantes": ["12348"],
-  "lotes_sem_matricula": ["lote 09"],
-  "confrontacao_completa": true|false|null,
-  "proprietarios_identificados": {"12345": ["Nome"], "12346": ["Nome2"]},
-  "resumo_analise": {
-    "cadeia_dominial_completa": {
-      "12345": [
-        {"proprietario": "Origem/Titulação", "periodo": "até 2015", "percentual": "100%"},
-        {"proprietario": "João Silva", "periodo": "2015-2020", "percentual": "100%"},
-        {"proprietario": "Maria Santos", "periodo": "2020-atual", "percentual": "100%"}
-      ]
-    },
-    "restricoes_vigentes": [
-      {"tipo": "hipoteca", "credor": "Banco XYZ", "valor": "R$ 80.000,00", "status": "vigente"}
-    ],
-    "restricoes_baixadas": [
-      {"tipo": "penhora", "data_baixa": "10/12/2021", "motivo": "quitação judicial"}
-    ],
-    "estado_ms_direitos": {
-      "tem_direitos": true|false,
-      "detalhes": [
-        {"matricula": "12345", "tipo_direito": "credor_hipoteca", "status": "vigente", "valor": "R$ 50.000,00"}
-      ],
-      "criticidade": "alta|media|baixa",
-      "observacao": "Estado de MS possui hipoteca vigente na matrícula principal"
-    }
-  },
-  "confidence": 0.0-1.0,
-  "reasoning": "explicação detalhada da análise"
-}
-
-TIPOS DE CONFRONTANTES:
-- 'lote': lotes numerados (ex: lote 11, lote 15)
-- 'matricula': matrículas identificadas por número
-- 'pessoa': nomes de pessoas proprietárias
-- 'via_publica': ruas, avenidas, praças
-- 'estado': Estado, Município, União
-- 'outros': córregos, rios, outros elementos
-'''
-
-def build_prompt(prompt_type: str) -> str:
-    """Retorna o prompt unificado para o tipo informado.
-
-    prompt_type: 'system', 'aggregate', 'vision' ou 'partial'
-    """
-    prompt = prompt_type.lower().strip()
-
-    if prompt == 'system':
-        return UNIFIED_SYSTEM_PROMPT
-
-    if prompt in ANALYSIS_INSTRUCTIONS:
-        if prompt == 'partial':
-            return UNIFIED_SYSTEM_PROMPT + "\n\n" + ANALYSIS_INSTRUCTIONS[prompt]
-        else:
-            return UNIFIED_SYSTEM_PROMPT + "\n\n" + ANALYSIS_INSTRUCTIONS[prompt] + JSON_SCHEMA
-
-    raise ValueError("prompt_type must be 'system', 'aggregate', 'vision', or 'partial'")
-
-def build_analysis_prompt(mode: str) -> str:
-    """Conveniência para obter prompt de análise textual ou visual."""
-    prompt = mode.lower().strip()
-    if prompt == 'text':
-        return build_prompt('aggregate')
-    elif prompt == 'vision':
-        return build_prompt('vision')
-    else:
-        raise ValueError("mode must be 'text' or 'vision'")
-
-
-def build_full_report_prompt(data_json: str) -> str:
-    """Monta prompt para solicitar um relatório textual completo à LLM."""
-    template = textwrap.dedent(
-        f"""
-<context_gathering>
-        Você é um assessor jurídico especializado em usucapião, auxiliando o Procurador do Estado de Mato Grosso do Sul em processo judicial no qual o Estado foi citado. 
-        Sua tarefa é redigir um **relatório técnico completo, objetivo e fundamentado**, analisando exclusivamente o quadro de informações estruturadas fornecido.
-
-        O relatório deve avaliar se o Estado de Mato Grosso do Sul possui interesse jurídico no feito, considerando cadeia dominial, confrontações, restrições e direitos incidentes.
-        </context_gathering>
-
-        <structured_output>
-        Título inicial: **RELATÓRIO COMPLETO DO IMÓVEL**
-
-        Ordem obrigatória das seções:
-        1. **CONTEXTO** – síntese da matrícula principal, localização (quadra, lote), proprietários atuais e anteriores, cadeia dominial e informações gerais.  
-        2. **CONFRONTAÇÕES** – análise detalhada dos confrontantes, indicando quais possuem matrícula identificada, quais não possuem e as implicações jurídicas.  
-        3. **DIREITOS E RESTRIÇÕES** – descrição minuciosa de ônus, hipotecas, penhoras, direitos do Estado ou de terceiros e respectivos status (vigente, baixado etc.).  
-        4. **ANÁLISE CRÍTICA** – avaliação fundamentada sobre consistência, suficiência e eventuais conflitos de informação.  
-        5. **LACUNAS IDENTIFICADAS** – listar dados ausentes ou insuficientes (ex.: confrontantes sem matrícula, cadeias dominiais incompletas, restrições não detalhadas).  
-        6. **RECOMENDAÇÕES** – indicar medidas necessárias (ex.: diligências cartorárias, notificações a terceiros, pesquisa complementar).  
-        7. **PARECER FINAL** – concluir de forma direta se, diante dos elementos apresentados, há ou não interesse jurídico do Estado de Mato Grosso do Sul no processo de usucapião, mencionando explicitamente as matrículas, lotes e restrições relevantes.
-
-        </structured_output>
-
-        <rules>
-        - Responder **sempre em português do Brasil**.  
-        - Não utilizar saudações, frases introdutórias genéricas nem termos técnicos de informática (como "JSON").  
-        - Quando houver ausência de informação, escrever: “Não informado no quadro” e explicar a relevância jurídica da lacuna.  
-        - Converter expressões booleanas ou técnicas (true/false/null) para linguagem jurídica: “Sim”, “Não” ou “Não informado”.  
-        - Citar números de matrículas, lotes, proprietários e confrontantes sempre que presentes.  
-        - Nunca inventar ou presumir dados não constantes no quadro.  
-        </rules>
-
-        <dados>
-        QUADRO DE INFORMAÇÕES ESTRUTURADAS:  
-        <<INÍCIO DOS DADOS>>  
-        {data_json}  
-        <<FIM DOS DADOS>>
-        </dados>
-    """
-    )
-    return template.strip()
-
-
-
-
-# Compatibilidade com código existente
-SYSTEM_PROMPT = build_prompt('system')
-AGGREGATE_PROMPT = build_analysis_prompt('text')
-PARTIAL_PROMPT = build_prompt('partial')
-
-
-def _safe_get_dict(data, key, default=None):
-    """Retorna valor do dicionário garantindo que seja do tipo correto."""
-    if default is None:
-        default = {}
-    
-    value = data.get(key, default)
-    if not isinstance(value, dict):
-        return default
-    return value
-
-def _safe_get_list(data, key, default=None):
-    """Retorna valor do dicionário garantindo que seja uma lista."""
-    if default is None:
-        default = []
-    
-    value = data.get(key, default)
-    if not isinstance(value, list):
-        return default
-    return value
-
-def _safe_process_matricula_data(m_data):
-    """Processa dados de matrícula de forma robusta, evitando erros com campos vazios."""
-    if not isinstance(m_data, dict):
-        return None
-    
-    try:
-        # Processa cadeia dominial
-        cadeia_dominial_obj = []
-        cadeia_data = _safe_get_list(m_data, "cadeia_dominial")
-        for transmissao_data in cadeia_data:
-            if isinstance(transmissao_data, dict):
-                transmissao = TransmissaoInfo(
-                    data=transmissao_data.get("data"),
-                    tipo_transmissao=transmissao_data.get("tipo_transmissao"),
-                    proprietario_anterior=transmissao_data.get("proprietario_anterior"),
-                    novo_proprietario=transmissao_data.get("novo_proprietario"),
-                    percentual=transmissao_data.get("percentual"),
-                    valor=transmissao_data.get("valor"),
-                    registro=transmissao_data.get("registro")
-                )
-                cadeia_dominial_obj.append(transmissao)
-        
-        # Processa restrições
-        restricoes_obj = []
-        restricoes_data = _safe_get_list(m_data, "restricoes")
-        for restricao_data in restricoes_data:
-            if isinstance(restricao_data, dict):
-                restricao = RestricaoInfo(
-                    tipo=restricao_data.get("tipo", ""),
-                    data_registro=restricao_data.get("data_registro"),
-                    credor=restricao_data.get("credor"),
-                    valor=restricao_data.get("valor"),
-                    situacao=restricao_data.get("situacao", "vigente"),
-                    data_baixa=restricao_data.get("data_baixa"),
-                    observacoes=restricao_data.get("observacoes")
-                )
-                restricoes_obj.append(restricao)
-        
-        
-        # Processa listas principais com validação
-        proprietarios = _safe_get_list(m_data, "proprietarios")
-        confrontantes_list = _safe_get_list(m_data, "confrontantes")
-        evidence = _safe_get_list(m_data, "evidence")
-        
-        matricula = MatriculaInfo(
-            numero=str(m_data.get("numero", "")),
-            proprietarios=proprietarios,
-            descricao=str(m_data.get("descricao", "")),
-            confrontantes=confrontantes_list,
-            evidence=evidence,
-            lote=m_data.get("lote"),
-            quadra=m_data.get("quadra"),
-            cadeia_dominial=cadeia_dominial_obj,
-            restricoes=restricoes_obj,
-        )
-        return matricula
-        
-    except Exception as e:
-        print(f"⚠️ Erro ao processar dados da matrícula: {e}")
-        return None
-
-def analyze_with_vision_llm(model: str, file_path: str, api_key: str = None) -> AnalysisResult:
-    """
-    Analisa documento usando visão computacional da LLM (análise direta de imagens).
-    """
-    fname_placeholder = os.path.basename(file_path)
-    
-    try:
-        print(f"🔍 Convertendo {fname_placeholder} para análise visual...")
-        
-        # Converte arquivo para imagens
-        ext = os.path.splitext(file_path.lower())[1]
-        if ext == ".pdf":
-            # Verifica o número de páginas ANTES de processar
-            try:
-                total_pages = get_pdf_page_count(file_path)
-                print(f"📊 PDF contém {total_pages} página(s)")
-            except Exception as e:
-                print(f"⚠️ Erro ao contar páginas: {e}")
-                total_pages = 0
-            
-            # Removido limite de páginas - processará qualquer quantidade
-            if total_pages > 100:
-                print(f"⚠️ PDF com {total_pages} páginas - processamento pode demorar")
-            
-            try:
-                images = pdf_to_images(file_path, max_pages=None)  # sem limite de páginas
-                print(f"📄 PDF convertido em {len(images) if images else 0} página(s)")
-            except Exception as e:
-                print(f"❌ Erro ao converter PDF: {e}")
-                print(f"🔍 Tipo do erro: {type(e).__name__}")
-                raise ValueError(f"Erro ao converter PDF para imagens: {e}")
-                
-        elif ext in [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"]:
-            try:
-                images = [Image.open(file_path)]
-                print(f"🖼️ Imagem carregada para análise")
-            except Exception as e:
-                print(f"❌ Erro ao abrir imagem: {e}")
-                raise ValueError(f"Erro ao abrir imagem: {e}")
-        else:
-            raise ValueError(f"Formato de arquivo não suportado para análise visual: {ext}")
-        
-        if not images:
-            raise ValueError("Não foi possível extrair imagens do arquivo")
-        
-        # Validação das imagens
-        print(f"🔍 Validando {len(images)} imagem(ns)...")
-        images_validas = []
-        for i, img in enumerate(images):
-            try:
-                if img and hasattr(img, 'size') and img.size[0] > 0 and img.size[1] > 0:
-                    images_validas.append(img)
-                else:
-                    print(f"⚠️ Imagem {i+1} inválida ou vazia")
-            except Exception as e:
-                print(f"⚠️ Erro ao validar imagem {i+1}: {e}")
-        
-        if not images_validas:
-            raise ValueError("Nenhuma imagem válida foi extraída do arquivo")
-            
-        images = images_validas
-        print(f"✅ {len(images)} imagem(ns) válida(s) para processar")
-        
-        print(f"🔄 Preparando {len(images)} imagem(ns) para envio à IA...")
-        
-        # Converte imagens para base64
-        images_b64 = []
-        total_size_kb = 0
-        
-        for i, img in enumerate(images):
-            try:
-                if not img or not hasattr(img, 'size'):
-                    print(f"⚠️ Imagem {i+1} inválida - pulando")
-                    continue
-                    
-                print(f"📐 Processando imagem {i+1}: {img.size[0]}x{img.size[1]} pixels")
-                b64 = image_to_base64(img, max_size=1536)  # tamanho maior para documentos
-                if b64:
-                    size_kb = len(b64) // 1024
-                    total_size_kb += size_kb
-                    images_b64.append(b64)
-                    print(f"✅ Imagem {i+1} preparada ({size_kb:.1f}KB)")
-                    print(f"📊 Total acumulado: {total_size_kb:.1f}KB")
-                else:
-                    print(f"⚠️ Falha ao processar imagem {i+1}")
-            except Exception as e:
-                print(f"❌ Erro ao processar imagem {i+1}: {e}")
-                print(f"🔍 Tipo do erro: {type(e).__name__}")
-                continue
-        
-        print(f"📈 TOTAL: {len(images_b64)} imagens preparadas, {total_size_kb:.1f}KB")
-        
-        # Processamento inteligente baseado no tamanho real
-        # Ajuste dinâmico da qualidade baseado no número de páginas
-        if len(images_b64) > 50:
-            print(f"⚠️ Muitas páginas ({len(images_b64)}) - otimizando qualidade automaticamente")
-            # Reconverte com qualidade menor para muitas páginas
-            print(f"🔍 DEBUG: Tentando otimizar {len(images)} imagens originais...")
-            images_b64_temp = []
-            try:
-                for i, img in enumerate(images):
-                    print(f"🔄 Reprocessando imagem {i+1}/{len(images)} com qualidade reduzida...")
-                    # Qualidade menor para documentos grandes
-                    b64 = image_to_base64(img, max_size=800, jpeg_quality=50)
-                    if b64:
-                        images_b64_temp.append(b64)
-                        print(f"✅ Imagem {i+1} otimizada com sucesso")
-                    else:
-                        print(f"⚠️ Falha ao otimizar imagem {i+1}")
-                images_b64 = images_b64_temp
-                total_size_kb = sum(len(img) // 1024 for img in images_b64) if images_b64 else 0
-                print(f"📈 APÓS OTIMIZAÇÃO: {len(images_b64)} imagens, {total_size_kb:.1f}KB")
-            except Exception as e:
-                print(f"❌ ERRO na otimização de muitas páginas: {e}")
-                print(f"🔍 Tipo do erro: {type(e).__name__}")
-                raise
-        elif total_size_kb / 1024 > 20:  # Se maior que 20MB, otimiza
-            print(f"⚠️ Payload grande ({total_size_kb/1024:.1f}MB) - otimizando qualidade")
-            print(f"🔍 DEBUG: Tentando otimizar {len(images)} imagens originais...")
-            images_b64_temp = []
-            try:
-                for i, img in enumerate(images):
-                    print(f"🔄 Reprocessando imagem {i+1}/{len(images)} para reduzir tamanho...")
-                    b64 = image_to_base64(img, max_size=1024, jpeg_quality=60)
-                    if b64:
-                        images_b64_temp.append(b64)
-                        print(f"✅ Imagem {i+1} comprimida com sucesso")
-                    else:
-                        print(f"⚠️ Falha ao comprimir imagem {i+1}")
-                images_b64 = images_b64_temp
-                total_size_kb = sum(len(img) // 1024 for img in images_b64) if images_b64 else 0
-                print(f"📈 APÓS OTIMIZAÇÃO: {len(images_b64)} imagens, {total_size_kb:.1f}KB")
-            except Exception as e:
-                print(f"❌ ERRO na otimização de payload grande: {e}")
-                print(f"🔍 Tipo do erro: {type(e).__name__}")
-                raise
-        
-        if not images_b64:
-            raise ValueError("Não foi possível converter nenhuma imagem para envio")
-        
-        # Prompt unificado para analise visual
-        vision_prompt = build_analysis_prompt('vision')
-
-        print(f"[Vision] Enviando {len(images_b64)} imagem(ns) para {model}...")
-        print(f"[Vision] Tamanho do prompt: {len(vision_prompt)} chars")
-
-        print("[Vision] DEBUG: Iniciando chamada da API...")
-
-        data = call_openrouter_vision(
-            model=model,
-            system_prompt=SYSTEM_PROMPT,
-            user_prompt=vision_prompt,
-            images_base64=images_b64,
-            temperature=0.0,
-            max_tokens=100000,  # Tokens otimizados para análise eficiente
-            api_key=api_key
-        )
-        
-        print(f"✅ Resposta da API recebida com sucesso")
-        print(f"🔍 DEBUG: Iniciando processamento da resposta...")
-        
-        # Debug da estrutura da resposta
-        print(f"🔍 Estrutura da resposta:")
-        print(f"  - choices: {len(data.get('choices', []))} elementos")
-        if data.get('choices'):
-            choice = data['choices'][0]
-            print(f"  - finish_reason: {choice.get('finish_reason')}")
-            print(f"  - message keys: {list(choice.get('message', {}).keys())}")
-            content = choice.get('message', {}).get('content', '')
-            print(f"  - content length: {len(content) if content else 0}")
-            if content:
-                print(f"  - content preview: {content[:200]}...")
-            else:
-                print(f"  - content is: {repr(content)}")
-        
-        # Acesso seguro ao conteúdo da resposta
-        try:
-            if not data.get("choices") or len(data["choices"]) == 0:
-                raise IndexError("Lista 'choices' vazia na resposta da API")
-            
-            choice = data["choices"][0]
-            if not choice.get("message"):
-                raise KeyError("Campo 'message' não encontrado na resposta")
-                
-            content = choice["message"].get("content", "")
-            
-            print(f"🔍 Content final: {len(content) if content else 0} chars")
-            if content:
-                print(f"📝 Primeiros 500 chars: {content[:500]}")
-            else:
-                print(f"⚠️ Content está vazio ou None!")
-                
-        except (IndexError, KeyError, TypeError) as e:
-            print(f"❌ Erro ao acessar conteúdo da resposta: {e}")
-            print(f"📊 Estrutura da resposta: {list(data.keys()) if isinstance(data, dict) else type(data)}")
-            raise RuntimeError(f"Estrutura de resposta inválida da API: {e}")
-        
-        try:
-            print(f"🔍 DEBUG: Iniciando limpeza do JSON...")
-            # Limpa marcadores de código markdown se presentes
-            clean_content = clean_json_response(content)
-            print(f"🔧 JSON limpo para parse: {clean_content[:100]}...")
-            print(f"🔍 DEBUG: JSON limpo tem {len(clean_content)} caracteres")
-            
-            print(f"🔍 DEBUG: Tentando fazer json.loads()...")
-            parsed = json.loads(clean_content)
-            print(f"✅ JSON parsed com sucesso! Tipo: {type(parsed)}")
-            print(f"🔍 Keys no parsed: {list(parsed.keys()) if isinstance(parsed, dict) else 'não é dict'}")
-        except json.JSONDecodeError as e:
-            print(f"❌ Erro ao fazer parse do JSON da visão: {e}")
-            print(f"📄 Conteúdo completo da resposta:")
-            print(content)
-            parsed = {
-                "matriculas_encontradas": [],
-                "matricula_principal": None,
-                "matriculas_confrontantes": [],
-                "lotes_confrontantes": [],
-                "matriculas_nao_confrontantes": [],
-                "lotes_sem_matricula": [],
-                "confrontacao_completa": None,
-                "proprietarios_identificados": {},
-                "confidence": None,
-                "reasoning": f"Erro de parsing JSON da análise visual: {content[:500]}..."
-            }
-
-        # Converte dados das matrículas para objetos MatriculaInfo usando processamento seguro
-        matriculas_obj = []
-        for m_data in parsed.get("matriculas_encontradas", []):
-            matricula = _safe_process_matricula_data(m_data)
-            if matricula is not None:
-                matriculas_obj.append(matricula)
-
-        # Processa lotes confrontantes
-        print(f"🔍 DEBUG: Processando lotes confrontantes...")
-        lotes_confrontantes_obj = []
-        lotes_confrontantes_raw = parsed.get("lotes_confrontantes", [])
-        print(f"🔍 lotes_confrontantes encontrados: {len(lotes_confrontantes_raw)} itens")
-        
-        try:
-            for i, lote_data in enumerate(lotes_confrontantes_raw):
-                print(f"🔍 Processando lote {i+1}: {type(lote_data)}")
-                if isinstance(lote_data, dict):
-                    lote_confronta = LoteConfronta(
-                        identificador=lote_data.get("identificador", ""),
-                        tipo=lote_data.get("tipo", "outros"),
-                        matricula_anexada=lote_data.get("matricula_anexada"),
-                        direcao=lote_data.get("direcao")
-                    )
-                    lotes_confrontantes_obj.append(lote_confronta)
-                    print(f"✅ Lote {i+1} processado com sucesso")
-                else:
-                    print(f"⚠️ Lote {i+1} não é dict: {lote_data}")
-        except Exception as e:
-            print(f"❌ ERRO ao processar lotes confrontantes: {e}")
-            print(f"🔍 Tipo do erro: {type(e).__name__}")
-            raise
-
-        # Processa resumo da análise com tratamento seguro
-        resumo_data = _safe_get_dict(parsed, "resumo_analise")
-        
-        # Processa direitos do Estado de MS
-        estado_ms_data = _safe_get_dict(resumo_data, "estado_ms_direitos")
-        estado_ms_direitos = EstadoMSDireitos(
-            tem_direitos=bool(estado_ms_data.get("tem_direitos", False)),
-            detalhes=_safe_get_list(estado_ms_data, "detalhes"),
-            criticidade=str(estado_ms_data.get("criticidade", "baixa")),
-            observacao=str(estado_ms_data.get("observacao", ""))
-        )
-        
-        resumo_analise = ResumoAnalise(
-            cadeia_dominial_completa=_safe_get_list(resumo_data, "cadeia_dominial_completa"),
-            restricoes_vigentes=_safe_get_list(resumo_data, "restricoes_vigentes"),
-            restricoes_baixadas=_safe_get_list(resumo_data, "restricoes_baixadas"),
-            estado_ms_direitos=estado_ms_direitos
-        )
-
-        return AnalysisResult(
-            arquivo=fname_placeholder,
-            matriculas_encontradas=matriculas_obj,
-            matricula_principal=parsed.get("matricula_principal"),
-            matriculas_confrontantes=parsed.get("matriculas_confrontantes", []),
-            lotes_confrontantes=lotes_confrontantes_obj,
-            matriculas_nao_confrontantes=parsed.get("matriculas_nao_confrontantes", []),
-            lotes_sem_matricula=parsed.get("lotes_sem_matricula", []),
-            confrontacao_completa=parsed.get("confrontacao_completa"),
-            proprietarios_identificados=parsed.get("proprietarios_identificados", {}),
-            resumo_analise=resumo_analise,
-            confidence=parsed.get("confidence"),
-            reasoning=parsed.get("reasoning", ""),
-            raw_json=parsed
-        )
-        
-    except Exception as e:
-        # CAPTURE O ERRO E MOSTRE LOGS DETALHADOS ANTES DE RETORNAR
-        print(f"🚨 CAPTURADO ERRO GERAL na análise visual!")
-        print(f"❌ Tipo do erro: {type(e).__name__}")
-        print(f"❌ Mensagem do erro: {str(e)}")
-        print(f"❌ Arquivo sendo processado: {fname_placeholder}")
-        
-        # Traceback detalhado
-        import traceback
-        print(f"📍 Traceback completo:")
-        traceback.print_exc()
-        
-        # Se análise visual falhar, retorna erro estruturado
-        return AnalysisResult(
-            arquivo=fname_placeholder,
-            matriculas_encontradas=[],
-            matricula_principal=None,
-            matriculas_confrontantes=[],
-            lotes_confrontantes=[],
-            matriculas_nao_confrontantes=[],
-            lotes_sem_matricula=[],
-            confrontacao_completa=None,
-            proprietarios_identificados={},
-            confidence=None,
-            reasoning=f"Erro na análise visual: {str(e)}",
-            raw_json={}
-        )
-
-# Função analyze_text_with_llm removida - pipeline textual obsoleto
-    """
-    Estratégia:
-    - Se texto for curto: chamada única com prompt agregado.
-    - Se texto for longo: faz passadas parciais para extrair confrontantes/evidências, deduplica,
-      e faz uma chamada final curta passando o resumo + um trecho representativo do original.
-    """
-    fname_placeholder = "<arquivo>"
-    text = full_text.strip()
-    if not text:
-        return AnalysisResult(
-            arquivo=fname_placeholder,
-            matriculas_encontradas=[],
-            matricula_principal=None,
-            matriculas_confrontantes=[],
-            lotes_confrontantes=[],
-            matriculas_nao_confrontantes=[],
-            lotes_sem_matricula=[],
-            confrontacao_completa=None,
-            proprietarios_identificados={},
-            confidence=None,
-            reasoning="Texto vazio após OCR.",
-            raw_json={}
-        )
-
-    chunks = chunk_text(text, max_chars=18000)
-
-    # Caso simples: uma chamada direta
-    if len(chunks) == 1:
-        data = call_openrouter(
-            model=model,
-            system_prompt=SYSTEM_PROMPT,
-            user_prompt=AGGREGATE_PROMPT + "\n\nTEXTO:\n" + chunks[0],
-            temperature=0.0,
-            max_tokens=1500
-        )
-        # Acesso seguro ao conteúdo
-        try:
-            if not data.get("choices") or len(data["choices"]) == 0:
-                raise IndexError("Lista 'choices' vazia na resposta da API")
-            content = data["choices"][0]["message"]["content"]
-        except (IndexError, KeyError, TypeError) as e:
-            print(f"Erro ao acessar conteúdo da resposta: {e}")
-            parsed = {
-                "matriculas_encontradas": [],
-                "matricula_principal": None,
-                "matriculas_confrontantes": [],
-                "lotes_confrontantes": [],
-                "matriculas_nao_confrontantes": [],
-                "lotes_sem_matricula": [],
-                "confrontacao_completa": None,
-                "proprietarios_identificados": {},
-                "confidence": None,
-                "reasoning": f"Erro de estrutura da resposta da API: {e}"
-            }
-        else:
-            try:
-                clean_content = clean_json_response(content)
-                parsed = json.loads(clean_content)
-            except json.JSONDecodeError as e:
-                print(f"Erro ao fazer parse do JSON: {e}")
-                print(f"Conteúdo da resposta: {content[:500]}")
-                parsed = {
-                    "matriculas_encontradas": [],
-                    "matricula_principal": None,
-                    "matriculas_confrontantes": [],
-                    "lotes_confrontantes": [],
-                    "matriculas_nao_confrontantes": [],
-                    "lotes_sem_matricula": [],
-                    "confrontacao_completa": None,
-                    "proprietarios_identificados": {},
-                    "confidence": None,
-                    "reasoning": f"Erro de parsing JSON: {content}"
-                }
-
-        # Converte dados das matrículas para objetos MatriculaInfo usando processamento seguro
-        matriculas_obj = []
-        for m_data in parsed.get("matriculas_encontradas", []):
-            matricula = _safe_process_matricula_data(m_data)
-            if matricula is not None:
-                matriculas_obj.append(matricula)
-
-        return AnalysisResult(
-            arquivo=fname_placeholder,
-            matriculas_encontradas=matriculas_obj,
-            matricula_principal=parsed.get("matricula_principal"),
-            matriculas_confrontantes=parsed.get("matriculas_confrontantes", []),
-            lotes_confrontantes=[],  # TODO: implementar processamento de lotes para texto
-            matriculas_nao_confrontantes=parsed.get("matriculas_nao_confrontantes", []),
-            lotes_sem_matricula=parsed.get("lotes_sem_matricula", []),
-            confrontacao_completa=parsed.get("confrontacao_completa"),
-            proprietarios_identificados=parsed.get("proprietarios_identificados", {}),
-            confidence=parsed.get("confidence"),
-            reasoning=parsed.get("reasoning", ""),
-            raw_json=parsed
-        )
-
-    # Texto longo: pipeline parcial
-    all_confrontantes = []
-    all_evidence = []
-
-    for i, ch in enumerate(chunks, 1):
-        data = call_openrouter(
-            model=model,
-            system_prompt=SYSTEM_PROMPT,
-            user_prompt=PARTIAL_PROMPT + "\n\nTRECHO:\n" + ch,
-            temperature=0.0,
-            max_tokens=800
-        )
-        # Acesso seguro ao conteúdo do chunk
-        try:
-            if not data.get("choices") or len(data["choices"]) == 0:
-                print(f"Chunk {i}: Lista 'choices' vazia")
-                continue
-            content = data["choices"][0]["message"]["content"]
-        except (IndexError, KeyError, TypeError) as e:
-            print(f"Erro no chunk {i} ao acessar resposta: {e}")
-            continue
-            
-        try:
-            clean_content = clean_json_response(content)
-            parsed = json.loads(clean_content)
-            if "confrontantes" in parsed and isinstance(parsed["confrontantes"], list):
-                all_confrontantes.extend([c for c in parsed["confrontantes"] if isinstance(c, str)])
-            if "evidence" in parsed and isinstance(parsed["evidence"], list):
-                all_evidence.extend([e for e in parsed["evidence"] if isinstance(e, str)])
-        except json.JSONDecodeError as e:
-            print(f"Erro JSON no chunk {i}: {e}")
-            print(f"Conteúdo: {content[:200] if 'content' in locals() else 'N/A'}")
-        except Exception as e:
-            print(f"Erro no chunk {i}: {e}")
-            # ignora erro parcial
-
-    # Deduplicação leve mantendo ordem
-    seen = set()
-    dedup_confrontantes = []
-    for c in all_confrontantes:
-        key = c.strip().lower()
-        if key and key not in seen:
-            seen.add(key)
-            dedup_confrontantes.append(c.strip())
-
-    # Chamada final curta com resumo
-    resumo = {
-        "confrontantes_coletados": dedup_confrontantes[:200],
-        "amostras_evidencia": all_evidence[:20]
-    }
-    final_user = (
-        AGGREGATE_PROMPT
-        + "\n\nRESUMO PREPARADO (use para decidir):\n"
-        + json.dumps(resumo, ensure_ascii=False, indent=2)
-        + "\n\nNota: Decida com base no resumo; se faltar certeza, indique is_confrontante=null com reasoning."
-    )
-
-    data = call_openrouter(
-        model=model,
-        system_prompt=SYSTEM_PROMPT,
-        user_prompt=final_user,
-        temperature=0.0,
-        max_tokens=900
-    )
-    # Acesso seguro ao conteúdo da chamada final
-    try:
-        if not data.get("choices") or len(data["choices"]) == 0:
-            raise IndexError("Lista 'choices' vazia na resposta final da API")
-        content = data["choices"][0]["message"]["content"]
-    except (IndexError, KeyError, TypeError) as e:
-        print(f"Erro ao acessar resposta final: {e}")
-        parsed = {
-            "matriculas_encontradas": [],
-            "matricula_principal": None,
-            "matriculas_confrontantes": [],
-            "lotes_confrontantes": [],
-            "matriculas_nao_confrontantes": [],
-            "lotes_sem_matricula": [],
-            "confrontacao_completa": None,
-            "proprietarios_identificados": {},
-            "confidence": None,
-            "reasoning": f"Erro de estrutura na resposta final da API: {e}"
-        }
-    else:
-        try:
-            clean_content = clean_json_response(content)
-            parsed = json.loads(clean_content)
-        except json.JSONDecodeError as e:
-            print(f"Erro JSON na chamada final: {e}")
-            print(f"Conteúdo: {content[:500]}")
-            parsed = {
-                "matriculas_encontradas": [],
-                "matricula_principal": None,
-                "matriculas_confrontantes": [],
-                "lotes_confrontantes": [],
-                "matriculas_nao_confrontantes": [],
-                "lotes_sem_matricula": [],
-                "confrontacao_completa": None,
-                "proprietarios_identificados": {},
-                "confidence": None,
-                "reasoning": f"Erro JSON: {content}"
-            }
-
-    # Converte dados das matrículas para objetos MatriculaInfo
-    matriculas_obj = []
-    for m_data in parsed.get("matriculas_encontradas", []):
-        if isinstance(m_data, dict):
-            matricula = MatriculaInfo(
-                numero=m_data.get("numero", ""),
-                proprietarios=m_data.get("proprietarios", []),
-                descricao=m_data.get("descricao", ""),
-                confrontantes=m_data.get("confrontantes", []),
-                evidence=m_data.get("evidence", [])
-            )
-            matriculas_obj.append(matricula)
-
-    # Se não encontrou matrículas estruturadas, cria uma genérica com dados coletados
-    if not matriculas_obj and (dedup_confrontantes or all_evidence):
-        matricula_generica = MatriculaInfo(
-            numero="não identificado",
-            proprietarios=[],
-            descricao="",
-            confrontantes=dedup_confrontantes,
-            evidence=all_evidence[:20],
-            lote=None,
-            quadra=None
-        )
-        matriculas_obj.append(matricula_generica)
-
-    return AnalysisResult(
-        arquivo=fname_placeholder,
-        matriculas_encontradas=matriculas_obj,
-        matricula_principal=parsed.get("matricula_principal"),
-        matriculas_confrontantes=parsed.get("matriculas_confrontantes", []),
-        lotes_confrontantes=[],
-        matriculas_nao_confrontantes=parsed.get("matriculas_nao_confrontantes", []),
-        lotes_sem_matricula=parsed.get("lotes_sem_matricula", []),
-        confrontacao_completa=parsed.get("confrontacao_completa"),
-        proprietarios_identificados=parsed.get("proprietarios_identificados", {}),
-        confidence=parsed.get("confidence"),
-        reasoning=parsed.get("reasoning", ""),
-        raw_json=parsed
-    )
-
 # =========================
 # Sistema de Feedback
 # =========================
@@ -1826,6 +454,14 @@ class App(tk.Tk):
         self.results: Dict[str, AnalysisResult] = {}
         self.queue = queue.Queue()
 
+        # Tokens de cancelamento: um do lote (botão "Cancelar", fechamento da janela)
+        # e um por arquivo, filho do lote (remoção da lista)
+        self._batch_token: Optional[CancelToken] = None
+        self._cancel_tokens: Dict[str, CancelToken] = {}
+        self._cancel_lock = threading.Lock()
+        # Itens já exibidos durante o streaming, por arquivo (blocos repetem matrículas)
+        self._stream_seen: Dict[str, set] = {}
+
         # Sistema de Feedback Inteligente
         self.feedback_system = initialize_feedback_system(
             app_version=APP_VERSION,
@@ -1908,7 +544,10 @@ class App(tk.Tk):
         add_placeholder()
         
         self.btn_process = ttk.Button(top, text="Processar", command=self.process_all)
-        self.btn_process.pack(side="left", padx=12)
+        self.btn_process.pack(side="left", padx=(12, 4))
+
+        self.btn_cancel = ttk.Button(top, text="Cancelar", command=self.cancel_processing, state="disabled")
+        self.btn_cancel.pack(side="left", padx=(0, 12))
 
         self.btn_export = ttk.Button(top, text="Exportar CSV", command=self.export_csv)
         self.btn_export.pack(side="left")
@@ -2125,6 +764,12 @@ class App(tk.Tk):
             path = self.tree_files.item(item, "values")[0]
             if path in self.files:
                 self.files.remove(path)
+            # Se o arquivo estiver na fila de processamento, interrompe a análise
+            with self._cancel_lock:
+                token = self._cancel_tokens.get(path)
+            if token is not None and not token.cancelled:
+                token.cancel("arquivo removido da lista")
+                self.log(f"⏹️ Cancelamento solicitado para {os.path.basename(path)}")
             self.tree_files.delete(item)
             removed += 1
         if removed:
@@ -2138,6 +783,7 @@ class App(tk.Tk):
 
         # Atualiza interface para mostrar que está processando
         self.btn_process.config(state="disabled", text="⏳ Processando...")
+        self.btn_cancel.config(state="normal")
         self.progress_label.config(text="Iniciando processamento...", foreground="blue")
         self.progress["value"] = 0
         self.progress["maximum"] = len(self.files)
@@ -2147,9 +793,35 @@ class App(tk.Tk):
         self.cached_full_report_text = None
         self.cached_full_report_payload = None
 
-        t = threading.Thread(target=self._worker_process, args=(model,), daemon=True)
+        # Variáveis Tk só são lidas na thread principal
+        files = list(self.files)
+        api_key = self.api_key_var.get().strip()
+        matricula_informada = self.matricula_var.get().strip()
+        batch_token = CancelToken()
+        with self._cancel_lock:
+            self._batch_token = batch_token
+            self._cancel_tokens = {path: CancelToken(parent=batch_token) for path in files}
+        self._stream_seen = {}
+
+        t = threading.Thread(
+            target=self._worker_process,
+            args=(model, files, api_key, matricula_informada, batch_token),
+            daemon=True
+        )
         t.start()
 
+    def cancel_processing(self):
+        """Interrompe o lote: análises em andamento param e os arquivos restantes não são iniciados."""
+        with self._cancel_lock:
+            token = self._batch_token
+        if token is None or token.cancelled:
+            return
+        token.cancel("processamento cancelado pelo usuário")
+        self.btn_cancel.config(state="disabled")
+        self.progress_label.config(text="Cancelando...", foreground="orange")
+        self._update_processing_indicator("⏹️ Cancelando análises em andamento...")
+        self.log("⏹️ Cancelamento solicitado - interrompendo as análises em andamento")
+
     def _show_processing_indicator(self, message: str = "Processando matrículas..."):
         """Exibe barra indeterminada informando que há processamento em andamento."""
         self.processing_status_label.config(text=message)
@@ -2167,110 +839,193 @@ class App(tk.Tk):
         if self.processing_indicator.winfo_ismapped():
             self.processing_indicator.pack_forget()
 
-    def _worker_process(self, model: str):
-        for idx, path in enumerate(self.files, 1):
-            filename = os.path.basename(path)
-            try:
-                # Atualiza status visual
-                self.queue.put(("status", f"📄 Arquivo {idx}/{len(self.files)}: {filename}"))
-                self.queue.put(("log", f"📄 Processando {filename} ({idx}/{len(self.files)})"))
+    def _worker_process(self, model: str, files: List[str], api_key: str, matricula_informada: str = "",
+                        batch_token: Optional[CancelToken] = None):
+        """Processa os arquivos em paralelo, entregando os resultados na ordem da lista."""
+        total = len(files)
+        max_workers = max(1, min(MAX_PARALLEL_FILES, total))
+        self.queue.put(("log", f"⚙️ Processando {total} arquivo(s) com até {max_workers} análise(s) simultânea(s)"))
+        if ANALYSIS_FILE_TIMEOUT:
+            self.queue.put(("log", f"⏱️ Prazo por arquivo: {ANALYSIS_FILE_TIMEOUT}s (ANALYSIS_FILE_TIMEOUT)"))
+
+        if matricula_informada and matricula_informada != "ex: 12345":
+            matricula_normalizada = matricula_informada.replace(".", "").replace(" ", "")
+            self.queue.put(("log", f"📝 Matrícula de referência informada: {matricula_normalizada}"))
+
+        budget = new_token_budget()
+        if budget is not None:
+            self.queue.put(("log", f"🪙 Orçamento do lote: {budget.limit_tokens} tokens (modo {budget.mode})"))
+        uso_lote = {"total_tokens": 0, "custo": 0.0}
+
+        concluidos: Dict[int, Tuple[str, Optional[AnalysisResult]]] = {}
+        proximo = 0
+        processados = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analise") as executor:
+            futures = {
+                executor.submit(self._analyze_file, model, path, idx, total, api_key, budget): (idx, path)
+                for idx, path in enumerate(files)
+            }
+            for future in as_completed(futures):
+                idx, path = futures[future]
+                try:
+                    res = future.result()
+                except Exception as e:
+                    res = None
+                    self.queue.put(("log", f"❌ Erro ao processar {os.path.basename(path)}: {e}"))
+                self.queue.put(("progress", 1))
 
-                # Verifica se o arquivo existe e diagnostica problemas
-                if not os.path.exists(path):
-                    self.queue.put(("log", f"❌ Arquivo não encontrado: {filename}"))
-                    continue
-                
-                # Diagnóstico do arquivo
-                diagnostico = self.diagnose_file_issues(path)
-                if "❌" in diagnostico or "⚠️" in diagnostico:
-                    self.queue.put(("log", f"🔍 Diagnóstico: {diagnostico}"))
-                
-                # Análise visual direta com IA
-                self.queue.put(("log", f"👁️ Analisando documento visualmente com IA..."))
-                
-                # Adiciona número da matrícula informado pelo usuário (se houver)
-                matricula_informada = self.matricula_var.get().strip()
-                if matricula_informada and matricula_informada != "ex: 12345":
-                    matricula_normalizada = matricula_informada.replace(".", "").replace(" ", "")
-                    self.queue.put(("log", f"📝 Matrícula de referência informada: {matricula_normalizada}"))
-                
-                api_key = self.api_key_var.get().strip()
-                res = analyze_with_vision_llm(model, path, api_key)
-                res.arquivo = filename
-                self.results[path] = res
+                # Entrega ordenada: só libera o resultado quando os anteriores já foram entregues
+                concluidos[idx] = (path, res)
+                while proximo in concluidos:
+                    path_ok, res_ok = concluidos.pop(proximo)
+                    proximo += 1
+                    if res_ok is not None:
+                        self._deliver_result(path_ok, res_ok)
+                        processados += 1
+                        uso_lote["total_tokens"] += res_ok.metricas.get("tokens", {}).get("total_tokens", 0)
+                        uso_lote["custo"] += res_ok.metricas.get("custo", 0.0)
+
+        with self._cancel_lock:
+            self._cancel_tokens.clear()
+            if self._batch_token is batch_token:
+                self._batch_token = None
 
-                # Log dos resultados principais
-                if res.reasoning and "Erro na análise visual" in res.reasoning:
-                    # Extrai mais detalhes do erro com proteção
-                    try:
-                        partes = res.reasoning.split("Erro na análise visual: ")
-                        if len(partes) > 1:
-                            erro_detalhes = partes[-1][:100]
-                        else:
-                            erro_detalhes = res.reasoning[:100]
-                    except Exception:
-                        erro_detalhes = "Erro desconhecido"
-                    
-                    self.queue.put(("log", f"⚠️ Problema na análise visual: {erro_detalhes}"))
-                    self.queue.put(("log", f"💡 Possíveis causas: arquivo muito grande, ilegível ou formato não suportado"))
-                elif res.matriculas_encontradas:
-                    self.queue.put(("log", f"📋 {len(res.matriculas_encontradas)} matrícula(s) identificada(s) visualmente"))
-                    if res.matricula_principal:
-                        self.queue.put(("log", f"🏠 Matrícula principal: {res.matricula_principal}"))
-                    if res.matriculas_confrontantes:
-                        self.queue.put(("log", f"🔗 {len(res.matriculas_confrontantes)} matrícula(s) confrontante(s)"))
-                    if res.is_confrontante:
-                        self.queue.put(("log", f"🏛️ Estado de MS identificado como confrontante"))
-                else:
-                    self.queue.put(("log", f"⚠️ Nenhuma matrícula foi identificada no documento"))
-                
-                # Prepara dados para exibição na tabela
-                mat_principal = res.matricula_principal or "Não identificada"
-                mat_confrontantes = ", ".join(res.matriculas_confrontantes[:3]) + ("..." if len(res.matriculas_confrontantes) > 3 else "")
-                if not mat_confrontantes:
-                    mat_confrontantes = "Nenhuma"
-                
-                estado_ms = "SIM" if res.is_confrontante else "NÃO"
-                
-                
-                # Formata confiança (já vem como percentual da API)
-                if res.confidence is not None:
-                    confianca_pct = f"{int(res.confidence)}%"
-                else:
-                    confianca_pct = "N/A"
-                
-                # Resumo dos proprietários
-                proprietarios_resumo = []
-                for numero, props in list(res.proprietarios_identificados.items())[:2]:
-                    if props:
-                        proprietarios_resumo.append(f"{numero}: {props[0]}" + ("..." if len(props) > 1 else ""))
-                proprietarios_texto = " | ".join(proprietarios_resumo)
-                if not proprietarios_texto:
-                    proprietarios_texto = "Não identificados"
-
-                # Mensagem de conclusão baseada no status
-                if res.reasoning and "Erro na análise visual" in res.reasoning:
-                    self.queue.put(("log", f"⚠️ Análise de {filename} concluída com problemas (confiança: {confianca_pct})"))
-                elif res.matriculas_encontradas:
-                    self.queue.put(("log", f"✅ Análise de {filename} concluída com sucesso (confiança: {confianca_pct})"))
-                else:
-                    self.queue.put(("log", f"ℹ️ Análise de {filename} concluída - nenhuma matrícula identificada (confiança: {confianca_pct})"))
-                
-                self.queue.put(("result", (path, res)))
-                
-            except Exception as e:
-                error_msg = str(e)
-                if "páginas excede o limite máximo" in error_msg:
-                    self.queue.put(("log", f"🚫 {filename}: {error_msg}"))
+        # Processamento concluído
+        cancelado = batch_token is not None and batch_token.cancelled
+        self.queue.put(("status", "⏹️ Processamento cancelado" if cancelado else "✅ Processamento concluído!"))
+        self.queue.put(("log", f"🎉 Processamento finalizado! {processados}/{total} arquivo(s) processado(s)."))
+        if uso_lote["total_tokens"]:
+            self.queue.put(("log", f"🪙 Consumo do lote: {format_usage(uso_lote['total_tokens'], uso_lote['custo'])}"))
+        if budget is not None and budget.refused:
+            self.queue.put(("log", f"🪙 {budget.refused} arquivo(s) não analisado(s) por falta de orçamento"))
+        self.queue.put(("finish", cancelado))
+
+    def _cancel_token_for(self, path: str) -> Optional[CancelToken]:
+        with self._cancel_lock:
+            return self._cancel_tokens.get(path)
+
+    def _analyze_file(self, model: str, path: str, idx: int, total: int, api_key: str,
+                      budget=None) -> Optional[AnalysisResult]:
+        """Executa a análise de um arquivo em uma thread do pool. Retorna None se cancelado/ausente."""
+        filename = os.path.basename(path)
+        token = self._cancel_token_for(path)
+        if token is not None and token.cancelled:
+            self.queue.put(("log", f"⏭️ {filename} não iniciado: {token.reason}"))
+            return None
+
+        # Atualiza status visual
+        self.queue.put(("status", f"📄 Arquivo {idx + 1}/{total}: {filename}"))
+        self.queue.put(("log", f"📄 Processando {filename} ({idx + 1}/{total})"))
+
+        # Verifica se o arquivo existe e diagnostica problemas
+        if not os.path.exists(path):
+            self.queue.put(("log", f"❌ Arquivo não encontrado: {filename}"))
+            return None
+
+        # Diagnóstico do arquivo
+        diagnostico = self.diagnose_file_issues(path)
+        if "❌" in diagnostico or "⚠️" in diagnostico:
+            self.queue.put(("log", f"🔍 Diagnóstico: {diagnostico}"))
+
+        # Análise visual direta com IA
+        self.queue.put(("log", f"👁️ Analisando {filename} visualmente com IA..."))
+
+        try:
+            res = analyze_with_vision_llm(
+                model, path, api_key, budget=budget,
+                # Com OPENROUTER_STREAM, matrículas/confrontantes chegam à interface durante a resposta
+                on_item=lambda item_kind, item: self.queue.put(("stream", (path, item_kind, item))),
+                cancel_token=token,
+            )
+        except Exception as e:
+            error_msg = str(e)
+            if "páginas excede o limite máximo" in error_msg:
+                self.queue.put(("log", f"🚫 {filename}: {error_msg}"))
+            else:
+                self.queue.put(("log", f"❌ Erro ao processar {filename}: {error_msg}"))
+            return None
+
+        if token is not None and token.cancelled:
+            self.queue.put(("log", f"⏭️ {filename} interrompido ({token.reason}) - resultado descartado"))
+            return None
+
+        res.arquivo = filename
+        return res
+
+    def _deliver_result(self, path: str, res: AnalysisResult):
+        """Registra o resultado e publica logs/resultados na fila da interface."""
+        filename = os.path.basename(path)
+        self.results[path] = res
+
+        # Log dos resultados principais
+        if res.reasoning and "Erro na análise visual" in res.reasoning:
+            # Extrai mais detalhes do erro com proteção
+            try:
+                partes = res.reasoning.split("Erro na análise visual: ")
+                if len(partes) > 1:
+                    erro_detalhes = partes[-1][:100]
                 else:
-                    self.queue.put(("log", f"❌ Erro ao processar {filename}: {error_msg}"))
-            finally:
-                self.queue.put(("progress", 1))
+                    erro_detalhes = res.reasoning[:100]
+            except Exception:
+                erro_detalhes = "Erro desconhecido"
+
+            self.queue.put(("log", f"⚠️ Problema na análise visual de {filename}: {erro_detalhes}"))
+            self.queue.put(("log", f"💡 Possíveis causas: arquivo muito grande, ilegível ou formato não suportado"))
+        elif res.matriculas_encontradas:
+            self.queue.put(("log", f"📋 {filename}: {len(res.matriculas_encontradas)} matrícula(s) identificada(s) visualmente"))
+            if res.matricula_principal:
+                self.queue.put(("log", f"🏠 Matrícula principal: {res.matricula_principal}"))
+            if res.matriculas_confrontantes:
+                self.queue.put(("log", f"🔗 {len(res.matriculas_confrontantes)} matrícula(s) confrontante(s)"))
+            if res.is_confrontante:
+                self.queue.put(("log", f"🏛️ Estado de MS identificado como confrontante"))
+        else:
+            self.queue.put(("log", f"⚠️ Nenhuma matrícula foi identificada em {filename}"))
+        if res.parcial:
+            self.queue.put(("log", f"✂️ {filename}: resposta do modelo incompleta - resultado parcial (não vai para o cache)"))
 
-        # Processamento concluído
-        self.queue.put(("status", "✅ Processamento concluído!"))
-        self.queue.put(("log", f"🎉 Processamento finalizado! {len(self.files)} arquivo(s) processado(s)."))
-        self.queue.put(("finish", None))
+        tokens = res.metricas.get("tokens", {}) if res.metricas else {}
+        if tokens.get("total_tokens"):
+            self.queue.put(("log", f"🪙 {filename}: {format_usage(tokens['total_tokens'], res.metricas.get('custo', 0.0), tokens)}"))
+
+        # Formata confiança (já vem como percentual da API)
+        if res.confidence is not None:
+            confianca_pct = f"{int(res.confidence)}%"
+        else:
+            confianca_pct = "N/A"
+
+        # Mensagem de conclusão baseada no status
+        if res.reasoning and "Erro na análise visual" in res.reasoning:
+            self.queue.put(("log", f"⚠️ Análise de {filename} concluída com problemas (confiança: {confianca_pct})"))
+        elif res.matriculas_encontradas:
+            self.queue.put(("log", f"✅ Análise de {filename} concluída com sucesso (confiança: {confianca_pct})"))
+        else:
+            self.queue.put(("log", f"ℹ️ Análise de {filename} concluída - nenhuma matrícula identificada (confiança: {confianca_pct})"))
+
+        self.queue.put(("result", (path, res)))
+
+    def _show_stream_item(self, path: str, item_kind: str, item: Dict):
+        """Exibe um item recebido durante o streaming (thread principal, via poll_queue)."""
+        if not isinstance(item, dict):
+            return
+        filename = os.path.basename(path)
+        if item_kind == "matricula":
+            # Mesma normalização do resultado final: "12.345" e "12345" contam como um item
+            label = normalize_matricula_numero(item.get("numero")) or str(item.get("numero") or "sem número")
+            proprietarios = [p for p in item.get("proprietarios") or [] if isinstance(p, str) and p]
+            details = f" - {'; '.join(proprietarios[:2])}" if proprietarios else ""
+            message = f"📡 {filename}: matrícula {label} recebida{details}"
+        else:
+            label = str(item.get("identificador") or "?")
+            direcao = item.get("direcao")
+            message = f"📡 {filename}: confrontante {label}" + (f" ({direcao})" if direcao else "")
+        seen = self._stream_seen.setdefault(path, set())
+        if (item_kind, label) in seen:
+            return
+        seen.add((item_kind, label))
+        self.log(message)
+        self._update_processing_indicator(f"📡 {filename}: {len(seen)} item(ns) recebido(s) do modelo...")
 
     def export_csv(self):
         if not self.results:
@@ -2287,27 +1042,9 @@ class App(tk.Tk):
             import csv
             with open(out, "w", newline="", encoding="utf-8") as f:
                 w = csv.writer(f, delimiter=";")
-                w.writerow(["arquivo", "matricula_principal", "matriculas_confrontantes", "estado_ms_confrontante", 
-                           "confianca_percentual", "proprietarios", "reasoning"])
+                w.writerow(CSV_HEADER)
                 for path, res in self.results.items():
-                    # Formata confiança (já vem como percentual da API)
-                    confianca_pct = f"{int(res.confidence)}%" if res.confidence is not None else "N/A"
-                    
-                    # Prepara proprietários para CSV
-                    proprietarios_csv = []
-                    for numero, props in res.proprietarios_identificados.items():
-                        if props:
-                            proprietarios_csv.append(f"{numero}: {'; '.join(props)}")
-                    
-                    w.writerow([
-                        res.arquivo,
-                        res.matricula_principal or "Não identificada",
-                        " | ".join(res.matriculas_confrontantes),
-                        "SIM" if res.is_confrontante else "NÃO",
-                        confianca_pct,
-                        " | ".join(proprietarios_csv),
-                        res.reasoning.replace("\n", " ").strip()
-                    ])
+                    w.writerow(result_to_csv_row(res))
             self.log(f"CSV salvo em: {out}")
         except Exception as e:
             messagebox.showerror("Erro ao salvar", str(e))
@@ -2325,7 +1062,11 @@ class App(tk.Tk):
                 elif kind == "finish":
                     # Restaura botão e status ao concluir
                     self.btn_process.config(state="normal", text="Processar")
-                    self.progress_label.config(text="Concluído!", foreground="green")
+                    self.btn_cancel.config(state="disabled")
+                    if payload:
+                        self.progress_label.config(text="Cancelado", foreground="orange")
+                    else:
+                        self.progress_label.config(text="Concluído!", foreground="green")
                     self._hide_processing_indicator()
                 elif kind == "result":
                     # payload agora contém: path, result_object (AnalysisResult)
@@ -2338,6 +1079,8 @@ class App(tk.Tk):
                     # Notifica sistema de feedback sobre sucesso
                     numero_processo = result.numero_processo if hasattr(result, 'numero_processo') and result.numero_processo else os.path.basename(path)
                     self.feedback_system.on_relatorio_sucesso(numero_processo)
+                elif kind == "stream":
+                    self._show_stream_item(*payload)
                 elif kind == "progress":
                     val = self.progress["value"] + payload
                     self.progress["value"] = val
@@ -2549,6 +1292,11 @@ class App(tk.Tk):
 
     def _on_closing(self):
         """Método chamado ao fechar a aplicação - envia feedback automático se necessário"""
+        # Interrompe análises em andamento (conexões de streaming, esperas de retentativa)
+        with self._cancel_lock:
+            token = self._batch_token
+        if token is not None:
+            token.cancel("aplicação encerrada")
         self.feedback_system.on_fechamento_aplicacao()
         self.destroy()
 
@@ -2612,18 +1360,9 @@ class App(tk.Tk):
             self._insert_placeholder_row(self.tree_nao_confrontantes, "Sem matrículas anexadas.")
             return
 
-        matriculas_map = {mat.numero: mat for mat in result.matriculas_encontradas}
-
+        # Números já normalizados na análise; result.matricula/proprietarios_de são consultas O(1)
         def owners_for(matricula_num: Optional[str]) -> List[str]:
-            if not matricula_num:
-                return []
-            proprietarios = result.proprietarios_identificados.get(matricula_num)
-            if proprietarios:
-                return [p for p in proprietarios if p and p.upper() != "N/A"]
-            mat_obj = matriculas_map.get(matricula_num)
-            if mat_obj and mat_obj.proprietarios:
-                return [p for p in mat_obj.proprietarios if p and p.upper() != "N/A"]
-            return []
+            return [p for p in result.proprietarios_de(matricula_num) if p and p.upper() != "N/A"]
 
         def format_direction(direction: Optional[str]) -> str:
             if not direction:
@@ -2643,7 +1382,7 @@ class App(tk.Tk):
                 return "; ".join(items)
             return "; ".join(items[:limit]) + f" (+{len(items) - limit})"
 
-        matricula_principal_obj = matriculas_map.get(result.matricula_principal) if result.matricula_principal else None
+        matricula_principal_obj = result.matricula(result.matricula_principal)
         numero_principal = result.matricula_principal or "Não identificada"
 
         if result.confidence is None:
@@ -2768,7 +1507,7 @@ class App(tk.Tk):
 
         if lotes_inseridos == 0 and matriculas_confrontantes_lista:
             for mat_num in matriculas_confrontantes_lista:
-                mat_obj = matriculas_map.get(mat_num)
+                mat_obj = result.matricula(mat_num)
                 if mat_obj and mat_obj.lote:
                     identificador = f"Lote {mat_obj.lote}"
                     if mat_obj.quadra:
@@ -2832,7 +1571,7 @@ class App(tk.Tk):
 
         nao_conf_inseridos = 0
         for mat_num in matriculas_nao_confrontantes_lista:
-            mat_obj = matriculas_map.get(mat_num)
+            mat_obj = result.matricula(mat_num)
             if mat_obj and mat_obj.lote:
                 identificador = f"Lote {mat_obj.lote}"
                 if mat_obj.quadra:
@@ -2885,11 +1624,7 @@ class App(tk.Tk):
             return
 
         # Encontra dados da matrícula principal
-        matricula_principal_obj = None
-        for mat in result.matriculas_encontradas:
-            if mat.numero == result.matricula_principal:
-                matricula_principal_obj = mat
-                break
+        matricula_principal_obj = result.matricula(result.matricula_principal)
 
         if not matricula_principal_obj:
             self.set_summary_text("Dados da matrícula principal não encontrados.")
@@ -2979,11 +1714,7 @@ class App(tk.Tk):
             for conf in result.lotes_confrontantes:
                 if conf.tipo in ['lote', 'matricula'] and conf.matricula_anexada:
                     # Encontra dados da matrícula confrontante
-                    confrontante_obj = None
-                    for mat in result.matriculas_encontradas:
-                        if mat.numero == conf.matricula_anexada:
-                            confrontante_obj = mat
-                            break
+                    confrontante_obj = result.matricula(conf.matricula_anexada)
 
                     if confrontante_obj and confrontante_obj.proprietarios and confrontante_obj.proprietarios[0] != "N/A":
                         proprietarios_texto = ", ".join(confrontante_obj.proprietarios) if len(confrontante_obj.proprietarios) <= 2 else f"{confrontante_obj.proprietarios[0]} e mais {len(confrontante_obj.proprietarios)-1}"
@@ -3017,11 +1748,7 @@ class App(tk.Tk):
             lotes_nao_confrontantes_info = []
             for mat_num in result.matriculas_nao_confrontantes:
                 # Encontra dados da matrícula não confrontante
-                nao_confrontante_obj = None
-                for mat in result.matriculas_encontradas:
-                    if mat.numero == mat_num:
-                        nao_confrontante_obj = mat
-                        break
+                nao_confrontante_obj = result.matricula(mat_num)
 
                 if nao_confrontante_obj and nao_confrontante_obj.proprietarios and nao_confrontante_obj.proprietarios[0] != "N/A":
                     identificador = f"Lote {nao_confrontante_obj.lote}" if nao_confrontante_obj.lote else f"Matrícula {mat_num}"
@@ -4062,6 +2789,7 @@ class App(tk.Tk):
 # Main
 # =========================
 def main():
+    configure_logging()
     app = App()
     app.mainloop()
 
@@ -0,0 +1,226 @@
+"""Normalização determinística do JSON do modelo e mesclagem de matrículas repetidas."""
+
+import re
+import unicodedata
+from typing import List, Dict, Optional, Callable
+
+_MAX_MERGED_EVIDENCE = 20
+
+# Número de matrícula com separador de milhar ("12.345", "12 345") ou corrido, com
+# letra de desdobramento opcional ("12345-A"); de preferência o que segue o rótulo
+_MATRICULA_NUM = r"(\d{1,3}(?:[.\s]\d{3})+|\d+)(?:-?([a-z]))?\b"
+_MATRICULA_LABELED_RE = re.compile(r"\bmat(?:r|ricula)?\b\.?\s*(?:n\s*[o.]*\s*|numero\s*)?[:\-]?\s*" + _MATRICULA_NUM)
+_MATRICULA_NUM_RE = re.compile(_MATRICULA_NUM)
+# Número do ato dentro da matrícula ("R-3/12.345", "Av.2-12.345"): não é a matrícula
+_ACT_PREFIX_RE = re.compile(r"\b(?:r|av)\s*[.\-]?\s*$")
+
+# Direções dos confrontantes; abreviações só valem quando são o texto inteiro
+# ("no" e "se" também são palavras comuns em descrições)
+_DIRECTIONS = {
+    "norte": "norte", "sul": "sul", "leste": "leste", "este": "leste", "oeste": "oeste",
+    "nordeste": "nordeste", "noroeste": "noroeste", "sudeste": "sudeste", "sudoeste": "sudoeste",
+    "frente": "frente", "fundo": "fundos", "fundos": "fundos",
+    "direita": "direita", "direito": "direita", "esquerda": "esquerda", "esquerdo": "esquerda",
+}
+_DIRECTION_ABBREVIATIONS = {
+    "n": "norte", "s": "sul", "l": "leste", "e": "leste", "o": "oeste", "w": "oeste",
+    "ne": "nordeste", "no": "noroeste", "nw": "noroeste", "se": "sudeste", "so": "sudoeste", "sw": "sudoeste",
+}
+
+
+def fold_text(value) -> str:
+    """Minúsculas, sem acentos e com espaços normalizados ("JOSÉ  da Silva" -> "jose da silva")."""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def name_key(value) -> str:
+    """Chave de comparação de nomes: fold_text sem pontuação."""
+    return " ".join(re.sub(r"[^\w\s]", " ", fold_text(value)).split())
+
+
+def normalize_matricula_numero(value) -> Optional[str]:
+    """Número de matrícula canônico ("Mat. nº 12.345" -> "12345", "12.345-a" -> "12345A"), ou None."""
+    if value is None:
+        return None
+    text = fold_text(value)
+    match = _MATRICULA_LABELED_RE.search(text)
+    if match is None:
+        match = next((m for m in _MATRICULA_NUM_RE.finditer(text)
+                      if not _ACT_PREFIX_RE.search(text, 0, m.start())), None)
+    if match is None:
+        return None
+    digits = re.sub(r"\D", "", match.group(1)).lstrip("0") or "0"
+    return digits + (match.group(2) or "").upper()
+
+
+def normalize_direcao(value) -> Optional[str]:
+    """Direção canônica ("N", "ao Norte", "lado NORTE" -> "norte"); textos desconhecidos ficam como vieram."""
+    if value is None:
+        return None
+    original = " ".join(str(value).split())
+    words = re.findall(r"[a-z]+", fold_text(original))
+    if not words:
+        return None
+    whole = " ".join(words)
+    if whole in _DIRECTIONS or whole in _DIRECTION_ABBREVIATIONS:
+        return _DIRECTIONS.get(whole) or _DIRECTION_ABBREVIATIONS[whole]
+    for word in words:
+        if word in _DIRECTIONS:
+            return _DIRECTIONS[word]
+    return original
+
+
+def normalize_tipo(value, default: str = "outros") -> str:
+    """Tipo de confrontante sem acentos, minúsculo e com "_" ("Via Pública" -> "via_publica")."""
+    tipo = re.sub(r"[\s\-]+", "_", fold_text(value or "")).strip("_")
+    return tipo or default
+
+
+def normalize_names(values) -> List[str]:
+    """Nomes sem espaços extras e sem repetição por name_key, na ordem original."""
+    names: List[str] = []
+    seen = set()
+    for value in values if isinstance(values, list) else [values]:
+        if not isinstance(value, str):
+            continue
+        name = " ".join(value.split()).strip(" ,;")
+        key = name_key(name)
+        if key and key not in seen:
+            seen.add(key)
+            names.append(name)
+    return names
+
+
+def _normalize_numeros(values) -> List[str]:
+    numeros: List[str] = []
+    for value in values if isinstance(values, list) else []:
+        numero = normalize_matricula_numero(value)
+        if numero and numero not in numeros:
+            numeros.append(numero)
+    return numeros
+
+
+def normalize_analysis(parsed: Dict) -> Dict:
+    """
+    Canoniza números de matrícula, nomes, direções e tipos, mesclando matrículas
+    repetidas. Retorna um novo dict; parsed (raw_json e cache) não é alterado.
+    """
+    data = dict(parsed)
+
+    matriculas: List[Dict] = []
+    by_numero: Dict[str, Dict] = {}
+    for m_data in safe_get_list(parsed, "matriculas_encontradas"):
+        if not isinstance(m_data, dict):
+            continue
+        entry = dict(m_data)
+        numero = normalize_matricula_numero(entry.get("numero"))
+        if numero:
+            entry["numero"] = numero
+        entry["proprietarios"] = normalize_names(safe_get_list(m_data, "proprietarios"))
+        if numero in by_numero:
+            merge_matricula(by_numero[numero], entry)
+            continue
+        if numero:
+            by_numero[numero] = entry
+        matriculas.append(entry)
+    data["matriculas_encontradas"] = matriculas
+
+    data["matricula_principal"] = normalize_matricula_numero(parsed.get("matricula_principal"))
+    for field in ("matriculas_confrontantes", "matriculas_nao_confrontantes"):
+        data[field] = _normalize_numeros(parsed.get(field))
+
+    proprietarios: Dict[str, List[str]] = {}
+    for numero, nomes in safe_get_dict(parsed, "proprietarios_identificados").items():
+        key = normalize_matricula_numero(numero) or " ".join(str(numero).split())
+        proprietarios[key] = normalize_names(proprietarios.get(key, []) + normalize_names(nomes))
+    data["proprietarios_identificados"] = proprietarios
+
+    lotes: List[Dict] = []
+    for lote in safe_get_list(parsed, "lotes_confrontantes"):
+        if not isinstance(lote, dict):
+            lotes.append(lote)
+            continue
+        lote = dict(lote)
+        lote["identificador"] = " ".join(str(lote.get("identificador") or "").split())
+        lote["tipo"] = normalize_tipo(lote.get("tipo"))
+        lote["matricula_anexada"] = normalize_matricula_numero(lote.get("matricula_anexada"))
+        lote["direcao"] = normalize_direcao(lote.get("direcao"))
+        lotes.append(lote)
+    data["lotes_confrontantes"] = lotes
+    data["lotes_sem_matricula"] = normalize_names(safe_get_list(parsed, "lotes_sem_matricula"))
+    return data
+
+
+def safe_get_dict(data, key, default=None):
+    """Retorna valor do dicionário garantindo que seja do tipo correto."""
+    if default is None:
+        default = {}
+    
+    value = data.get(key, default)
+    if not isinstance(value, dict):
+        return default
+    return value
+
+def safe_get_list(data, key, default=None):
+    """Retorna valor do dicionário garantindo que seja uma lista."""
+    if default is None:
+        default = []
+    
+    value = data.get(key, default)
+    if not isinstance(value, list):
+        return default
+    return value
+
+
+def merge_key(value) -> str:
+    """Chave de comparação: minúsculas, sem acentos e com espaços normalizados."""
+    return fold_text(value)
+
+
+def matricula_key(value) -> str:
+    """Chave de número de matrícula ("12.345" == "Mat. 12345"); vazia se não houver número."""
+    return normalize_matricula_numero(value) or ""
+
+
+def extend_unique(target: List, items, key: Callable = merge_key, limit: Optional[int] = None):
+    """Acrescenta itens ainda não presentes (pela chave), preservando a ordem de chegada."""
+    seen = {key(item) for item in target}
+    for item in items or []:
+        if limit is not None and len(target) >= limit:
+            break
+        k = key(item)
+        if item is None or not k or k in seen:
+            continue
+        seen.add(k)
+        target.append(item)
+
+
+def record_key(*fields) -> Callable[[Dict], str]:
+    """Chave de deduplicação de registros (transmissões, restrições) pelos campos indicados."""
+    def key(record) -> str:
+        if not isinstance(record, dict):
+            return merge_key(record)
+        return "|".join(merge_key(record.get(f) or "") for f in fields)
+    return key
+
+
+def merge_matricula(target: Dict, source: Dict):
+    """Mescla os dados de uma mesma matrícula vindos de blocos diferentes."""
+    for field in ("lote", "quadra"):
+        if not target.get(field) and source.get(field):
+            target[field] = source[field]
+    if len(str(source.get("descricao") or "")) > len(str(target.get("descricao") or "")):
+        target["descricao"] = source["descricao"]
+    for field in ("proprietarios", "confrontantes"):
+        target.setdefault(field, [])
+        extend_unique(target[field], safe_get_list(source, field))
+    target.setdefault("evidence", [])
+    extend_unique(target["evidence"], safe_get_list(source, "evidence"), limit=_MAX_MERGED_EVIDENCE)
+    target.setdefault("cadeia_dominial", [])
+    extend_unique(target["cadeia_dominial"], safe_get_list(source, "cadeia_dominial"),
+                  key=record_key("registro", "data", "novo_proprietario"))
+    target.setdefault("restricoes", [])
+    extend_unique(target["restricoes"], safe_get_list(source, "restricoes"),
+                  key=record_key("tipo", "data_registro", "credor"))
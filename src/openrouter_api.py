@@ -0,0 +1,341 @@
+"""Chamadas de visão e de texto à OpenRouter: payloads, validação das respostas e streaming."""
+
+import os
+import asyncio
+import json
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterator, Callable
+
+import requests
+
+try:
+    from .settings import env_flag, OPENROUTER_API_KEY
+    from .json_repair import JSONStreamScanner
+    from .openrouter_client import get_openrouter_client, AsyncOpenRouterClient, StreamingJSONBody, iter_sse_data
+    from .log_config import get_logger
+    from .run_metrics import span, record_usage
+    from .cancellation import AnalysisCancelledError
+except ImportError:
+    from settings import env_flag, OPENROUTER_API_KEY
+    from json_repair import JSONStreamScanner
+    from openrouter_client import get_openrouter_client, AsyncOpenRouterClient, StreamingJSONBody, iter_sse_data
+    from log_config import get_logger
+    from run_metrics import span, record_usage
+    from cancellation import AnalysisCancelledError
+
+logger = get_logger("api")
+
+# Pode ser sobrescrita (ex.: servidor local de testes)
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Respostas em streaming (SSE), só no cliente síncrono (ver stream_items)
+STREAM_RESPONSES = env_flag("OPENROUTER_STREAM", False)
+# Arrays de primeiro nível cujos elementos são entregues durante o streaming
+STREAM_WATCH = {"matriculas_encontradas": "matricula", "lotes_confrontantes": "confrontante"}
+
+def _openrouter_headers(api_key: Optional[str]) -> Dict[str, str]:
+    """Resolve a API key (argumento ou ambiente) e monta os cabeçalhos da requisição."""
+    if not api_key:
+        api_key = os.environ.get("OPENROUTER_API_KEY", OPENROUTER_API_KEY)
+    if not api_key:
+        raise RuntimeError("API Key não configurada. Insira sua chave da OpenRouter na interface.")
+
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://pge-ms.lab/analise-matriculas",
+        "X-Title": "Analise de Matriculas PGE-MS"
+    }
+
+
+def build_vision_payload(model: str, system_prompt: str, user_prompt: str, images_base64: List[str],
+                         temperature: float = 0.0, max_tokens: int = 1500, stream: bool = False) -> Dict:
+    """Monta o corpo da requisição de visão (imagens em data URL ou base64 puro, tratado como JPEG)."""
+    # Constrói mensagem com imagens
+    content = [{"type": "text", "text": user_prompt}]
+    
+    # Adiciona cada imagem
+    for i, img_b64 in enumerate(images_base64):
+        if img_b64:  # verifica se base64 não está vazio
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": img_b64 if img_b64.startswith("data:") else f"data:image/jpeg;base64,{img_b64}",
+                    "detail": "high"  # alta qualidade para documentos
+                }
+            })
+
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "response_format": {"type": "json_object"},
+        # Pede à OpenRouter o custo da chamada no campo usage (ver TokenBudget)
+        "usage": {"include": True}
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _log_vision_payload(body: StreamingJSONBody):
+    """Debug detalhado do payload de visão (o tamanho vem do corpo em streaming, sem serializar)."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    payload = body.payload
+    try:
+        message_content = payload['messages'][1]['content']
+        image_count = sum(1 for item in message_content if item.get('type') == 'image_url')
+        text_count = sum(1 for item in message_content if item.get('type') == 'text')
+        
+        logger.debug("🌐 Requisição para %s - modelo %s: %d elemento(s), %d imagem(ns), %d texto(s), %.2fMB",
+                     OPENROUTER_URL, payload.get('model', 'N/A'), len(message_content),
+                     image_count, text_count, len(body) / (1024 * 1024))
+        
+    except Exception as e:
+        logger.debug("⚠️ Erro ao analisar payload: %s (estrutura: %s)", e,
+                     list(payload.keys()) if isinstance(payload, dict) else type(payload))
+
+
+@span("interpretacao")
+def parse_vision_response(status_code: int, text: str) -> Dict:
+    """Valida a resposta HTTP da chamada de visão e retorna o JSON com 'choices'."""
+    if status_code != 200:
+        logger.error("❌ Erro HTTP %s: %.500s", status_code, text)
+        # Tenta extrair mais detalhes do erro
+        try:
+            error_data = json.loads(text)
+            if "error" in error_data:
+                error_msg = error_data["error"]
+                if isinstance(error_msg, dict):
+                    error_details = error_msg.get("message", str(error_msg))
+                else:
+                    error_details = str(error_msg)
+                raise RuntimeError(f"API Error ({status_code}): {error_details}")
+        except json.JSONDecodeError:
+            pass
+        raise RuntimeError(f"API retornou status {status_code}: {text[:200]}")
+        
+    response_text = text.strip()
+    
+    if not response_text:
+        raise RuntimeError("Resposta vazia da API")
+    
+    # Debug da resposta bruta (recortes só são feitos com DEBUG ativo)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📝 Tamanho da resposta: %d chars", len(response_text))
+        if len(response_text) < 200:
+            logger.debug("📄 Resposta completa: %s", response_text)
+        else:
+            logger.debug("📄 Início da resposta: %s... Final: ...%s", response_text[:300], response_text[-100:])
+        
+    # Parse mais robusto do JSON
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        logger.error("❌ Erro JSON: %s", e)
+        logger.debug("📄 Conteúdo problemático: %.1000s", response_text)
+        raise RuntimeError(f"Resposta da API não é JSON válido: {e}")
+    
+    if not isinstance(data, dict):
+        raise RuntimeError(f"Resposta da API não é um objeto JSON: {type(data)}")
+    
+    if "choices" not in data:
+        logger.error("❌ Campo 'choices' não encontrado. Campos disponíveis: %s", list(data.keys()))
+        # Verifica se há uma mensagem de erro
+        if "error" in data:
+            error_msg = data["error"]
+            raise RuntimeError(f"API retornou erro: {error_msg}")
+        raise RuntimeError(f"Campo 'choices' ausente na resposta. Estrutura: {data}")
+    
+    if not data["choices"]:
+        raise RuntimeError("Lista 'choices' vazia na resposta da API")
+    
+    if not isinstance(data["choices"], list):
+        raise RuntimeError(f"Campo 'choices' deve ser uma lista, mas é: {type(data['choices'])}")
+    
+    logger.debug("✅ Resposta válida com %d choice(s)", len(data['choices']))
+    record_usage(data.get("usage"))
+    return data
+
+
+# on_item da análise em andamento (as threads dos blocos o recebem por submit_in_context)
+_stream_on_item: contextvars.ContextVar[Optional[Callable[[str, Dict], None]]] = \
+    contextvars.ContextVar("stream_on_item", default=None)
+
+
+@contextmanager
+def stream_items(on_item: Optional[Callable[[str, Dict], None]]) -> Iterator[None]:
+    """Entrega a on_item(tipo, item) cada elemento de STREAM_WATCH concluído nas respostas em streaming."""
+    token = _stream_on_item.set(on_item)
+    try:
+        yield
+    finally:
+        _stream_on_item.reset(token)
+
+
+@span("streaming")
+def read_completion_stream(resp: requests.Response) -> Dict:
+    """Consome a resposta em SSE e remonta o JSON que a API devolveria sem streaming."""
+    on_item = _stream_on_item.get()
+    scanner = JSONStreamScanner(on_item, STREAM_WATCH) if on_item is not None else None
+    parts: List[str] = []
+    finish_reason, usage, model = None, None, None
+    events = iter_sse_data(resp)
+    try:
+        for data in events:
+            try:
+                event = json.loads(data)
+            except json.JSONDecodeError:
+                logger.debug("⚠️ Evento SSE ignorado: %.200s", data)
+                continue
+            if event.get("error"):
+                error = event["error"]
+                raise RuntimeError(f"API Error (streaming): {error.get('message', error) if isinstance(error, dict) else error}")
+            model = event.get("model") or model
+            usage = event.get("usage") or usage
+            for choice in event.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    parts.append(text)
+                    if scanner is not None:
+                        scanner.feed(text)
+                finish_reason = choice.get("finish_reason") or finish_reason
+    finally:
+        events.close()
+
+    record_usage(usage)
+    logger.debug("📡 Streaming concluído: %d fragmento(s), finish_reason=%s", len(parts), finish_reason)
+    return {
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": finish_reason,
+                     "message": {"role": "assistant", "content": "".join(parts)}}],
+        "usage": usage,
+    }
+
+
+def call_openrouter_vision(model: str, system_prompt: str, user_prompt: str, images_base64: List[str], temperature: float = 0.0, max_tokens: int = 1500, api_key: str = None) -> Dict:
+    """Chama a API OpenRouter com suporte a visão computacional (análise de imagens)."""
+    headers = _openrouter_headers(api_key)
+    body = StreamingJSONBody(build_vision_payload(model, system_prompt, user_prompt, images_base64,
+                                                  temperature=0.1,  # Reduzido para respostas mais focadas
+                                                  max_tokens=max_tokens, stream=STREAM_RESPONSES))
+
+    try:
+        _log_vision_payload(body)
+        
+        resp = get_openrouter_client().post(OPENROUTER_URL, headers=headers, payload=body, stream=STREAM_RESPONSES)
+        
+        logger.debug("📡 Status da resposta: %s", resp.status_code)
+        
+        if STREAM_RESPONSES and resp.status_code == 200:
+            return read_completion_stream(resp)
+        return parse_vision_response(resp.status_code, resp.text)
+        
+    except AnalysisCancelledError:
+        raise
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Erro na requisição para OpenRouter: {e}")
+    except Exception as e:
+        raise RuntimeError(f"Erro inesperado na chamada da API: {e}")
+
+
+async def call_openrouter_vision_async(client: AsyncOpenRouterClient, model: str, system_prompt: str, user_prompt: str,
+                                       images_base64: List[str], temperature: float = 0.0, max_tokens: int = 1500,
+                                       api_key: str = None) -> Dict:
+    """Versão assíncrona de call_openrouter_vision (mesmo payload e mesma validação)."""
+    headers = _openrouter_headers(api_key)
+    body = StreamingJSONBody(build_vision_payload(model, system_prompt, user_prompt, images_base64,
+                                                  temperature=0.1, max_tokens=max_tokens))
+
+    try:
+        _log_vision_payload(body)
+        status_code, text = await client.post(OPENROUTER_URL, headers=headers, payload=body, model=model)
+        logger.debug("📡 Status da resposta: %s", status_code)
+        return parse_vision_response(status_code, text)
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Erro inesperado na chamada da API: {e}")
+
+
+def build_text_payload(model: str, system_prompt: str, user_prompt: str,
+                       temperature: float = 0.2, max_tokens: int = 2000, stream: bool = False) -> Dict:
+    """Monta o corpo da requisição de texto."""
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "usage": {"include": True}
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+@span("interpretacao")
+def parse_text_response(status_code: int, text: str) -> str:
+    """Valida a resposta HTTP da chamada de texto e retorna o conteúdo gerado."""
+    if status_code != 200:
+        preview = text[:500]
+        raise RuntimeError(f"API retornou status {status_code}: {preview}")
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(f"Resposta da API não é JSON válido: {exc}") from exc
+    if not isinstance(data, dict) or "choices" not in data or not data["choices"]:
+        raise RuntimeError(f"Resposta inesperada da API: {data}")
+
+    record_usage(data.get("usage"))
+    message = data["choices"][0]["message"].get("content", "")
+    if not message:
+        raise RuntimeError("Resposta da API não contém conteúdo textual.")
+
+    logger.debug("✅ [Texto] Conteúdo recebido com %d caracteres", len(message))
+    return message
+
+
+def call_openrouter_text(model: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 2000, api_key: str = None) -> str:
+    """Chama a API OpenRouter para gerar texto com base em prompt estruturado."""
+    headers = _openrouter_headers(api_key)
+    payload = build_text_payload(model, system_prompt, user_prompt, temperature, max_tokens, stream=STREAM_RESPONSES)
+
+    try:
+        logger.debug("🌐 [Texto] Requisição para %s com modelo %s", OPENROUTER_URL, model)
+        resp = get_openrouter_client().post(OPENROUTER_URL, headers=headers, payload=payload, stream=STREAM_RESPONSES)
+        logger.debug("📡 [Texto] Status: %s", resp.status_code)
+        if STREAM_RESPONSES and resp.status_code == 200:
+            message = read_completion_stream(resp)["choices"][0]["message"]["content"]
+            if not message:
+                raise RuntimeError("Resposta da API não contém conteúdo textual.")
+            return message
+        return parse_text_response(resp.status_code, resp.text)
+
+    except requests.exceptions.RequestException as exc:
+        raise RuntimeError(f"Erro na requisição para OpenRouter: {exc}") from exc
+
+
+async def call_openrouter_text_async(client: AsyncOpenRouterClient, model: str, system_prompt: str, user_prompt: str,
+                                     temperature: float = 0.2, max_tokens: int = 2000, api_key: str = None) -> str:
+    """Versão assíncrona de call_openrouter_text."""
+    headers = _openrouter_headers(api_key)
+    payload = build_text_payload(model, system_prompt, user_prompt, temperature, max_tokens)
+
+    logger.debug("🌐 [Texto] Requisição para %s com modelo %s", OPENROUTER_URL, model)
+    try:
+        status_code, text = await client.post(OPENROUTER_URL, headers=headers, payload=payload, model=model)
+    except (OSError, asyncio.TimeoutError) as exc:
+        raise RuntimeError(f"Erro na requisição para OpenRouter: {exc}") from exc
+    logger.debug("📡 [Texto] Status: %s", status_code)
+    return parse_text_response(status_code, text)
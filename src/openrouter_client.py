@@ -0,0 +1,705 @@
+"""
+Cliente HTTP compartilhado para a API OpenRouter
+
+Mantém uma ``requests.Session`` com pool de conexões (keep-alive), de modo que
+chamadas consecutivas reutilizam a conexão TCP/TLS. Falhas transitórias
+(429, 5xx e erros de conexão) são repetidas com backoff exponencial e jitter,
+respeitando o cabeçalho ``Retry-After``. Um circuit breaker interrompe novas
+chamadas por um período após falhas consecutivas, evitando martelar a API
+durante uma indisponibilidade.
+
+``AsyncOpenRouterClient`` aplica a mesma política em um event loop (httpx, se
+instalado), com semáforo global de requisições simultâneas e limite de
+requisições por minuto por modelo.
+
+Os corpos JSON são enviados por ``StreamingJSONBody``: fragmentos gerados sob
+demanda, com as strings grandes (imagens em base64) copiadas em blocos, de modo
+que o pico de memória fica próximo de um payload e não de três ou quatro.
+
+Com ``post(..., stream=True)`` a resposta volta sem o corpo lido, para ser
+consumida evento a evento com ``iter_sse_data`` (server-sent events da
+OpenRouter quando o payload pede ``"stream": true``).
+
+Dentro de um ``cancel_scope`` (ver cancellation), as esperas obedecem ao token
+da análise: a requisição síncrona roda numa thread auxiliar e é abandonada
+assim que o token é cancelado ou expira (a resposta que ainda chegar é
+descartada), o backoff entre retentativas é interrompido e o streaming é
+fechado no evento seguinte. No cliente assíncrono a tarefa da requisição é
+cancelada, o que fecha a conexão do httpx na hora.
+
+Configuração por variáveis de ambiente:
+- OPENROUTER_CONNECT_TIMEOUT   segundos para conectar (padrão: 10)
+- OPENROUTER_READ_TIMEOUT      segundos aguardando resposta (padrão: 120)
+- OPENROUTER_MAX_RETRIES       novas tentativas em falhas transitórias (padrão: 3)
+- OPENROUTER_CIRCUIT_THRESHOLD falhas consecutivas que abrem o circuito (padrão: 5)
+- OPENROUTER_CIRCUIT_RESET     segundos com o circuito aberto (padrão: 60)
+- OPENROUTER_MAX_INFLIGHT      requisições assíncronas simultâneas (padrão: 16)
+- OPENROUTER_RATE_LIMITS       limites por modelo, ex.: "google/gemini-2.5-pro=30,openai/gpt-4o=60"
+- OPENROUTER_DEFAULT_RPM       limite por minuto dos demais modelos (padrão: 0 = sem limite)
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import random
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional, Dict, Callable, Tuple, Iterator, Union, List
+
+import requests
+from requests.adapters import HTTPAdapter
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+try:
+    from .log_config import get_logger
+    from .run_metrics import current_metrics, span
+    from .cancellation import current_token, arm_deadline, check_cancelled, CancelToken, AnalysisCancelledError, CANCEL_POLL_S
+except ImportError:
+    from log_config import get_logger
+    from run_metrics import current_metrics, span
+    from cancellation import current_token, arm_deadline, check_cancelled, CancelToken, AnalysisCancelledError, CANCEL_POLL_S
+
+logger = get_logger("openrouter")
+
+# Status que indicam falha transitória e podem ser repetidos
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Levantada quando o circuito está aberto e a chamada não é tentada."""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos de espera."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+# Caracteres que exigem escape numa string JSON
+_JSON_ESCAPE_RE = re.compile(r'[\x00-\x1f"\\]')
+
+
+class StreamingJSONBody:
+    """
+    Corpo JSON gerado em fragmentos de bytes, sem montar a string inteira.
+
+    Valores pequenos passam por json.dumps; strings grandes sem caracteres a
+    escapar (base64 e data URLs) saem em blocos de `chunk_size` direto da string
+    original. O tamanho é calculado sem copiar nada (Content-Length, em vez de
+    envio chunked) e cada iteração recomeça do início, de modo que o mesmo
+    corpo serve para as retentativas. sent_at guarda o instante (perf_counter)
+    em que o último fragmento foi entregue, separando envio de espera do modelo.
+    """
+
+    def __init__(self, payload: Dict, chunk_size: int = 64 * 1024, min_stream_len: int = 16 * 1024):
+        self.payload = payload
+        self.chunk_size = chunk_size
+        self.min_stream_len = min_stream_len
+        self._length: Optional[int] = None
+        self.sent_at: Optional[float] = None
+
+    def _parts(self, value) -> Iterator[Union[bytes, str]]:
+        """Fragmentos já serializados (bytes) ou strings grandes a enviar como estão (str)."""
+        if isinstance(value, str):
+            if len(value) >= self.min_stream_len and value.isascii() and not _JSON_ESCAPE_RE.search(value):
+                yield b'"'
+                yield value
+                yield b'"'
+            else:
+                yield json.dumps(value, ensure_ascii=False).encode("utf-8")
+        elif isinstance(value, dict):
+            yield b"{"
+            for index, (key, item) in enumerate(value.items()):
+                if index:
+                    yield b","
+                yield json.dumps(str(key), ensure_ascii=False).encode("utf-8") + b":"
+                yield from self._parts(item)
+            yield b"}"
+        elif isinstance(value, (list, tuple)):
+            yield b"["
+            for index, item in enumerate(value):
+                if index:
+                    yield b","
+                yield from self._parts(item)
+            yield b"]"
+        else:
+            yield json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+    def __iter__(self) -> Iterator[bytes]:
+        step = self.chunk_size
+        for part in self._parts(self.payload):
+            if isinstance(part, str):
+                for start in range(0, len(part), step):
+                    yield part[start:start + step].encode("ascii")
+            else:
+                yield part
+        self.sent_at = time.perf_counter()
+
+    def __len__(self) -> int:
+        if self._length is None:
+            self._length = sum(len(part) for part in self._parts(self.payload))
+        return self._length
+
+    async def aiter(self):
+        """Mesmos fragmentos, como iterador assíncrono (corpo de requisição do httpx)."""
+        for chunk in self:
+            yield chunk
+
+    def headers(self, headers: Dict[str, str]) -> Dict[str, str]:
+        """Cabeçalhos da requisição com tipo e tamanho do corpo."""
+        return {**headers, "Content-Type": "application/json", "Content-Length": str(len(self))}
+
+    def getvalue(self) -> bytes:
+        """Corpo completo (uso em testes e depuração; faz a cópia que o streaming evita)."""
+        return b"".join(self)
+
+
+def as_json_body(payload: Union[Dict, StreamingJSONBody, None]) -> Optional[StreamingJSONBody]:
+    if payload is None or isinstance(payload, StreamingJSONBody):
+        return payload
+    return StreamingJSONBody(payload)
+
+
+def _record_exchange(body: Optional[StreamingJSONBody], attempt_started: float, received: int, attempts: int):
+    """Registra bytes e tempos da última tentativa nas métricas da execução (ver run_metrics)."""
+    metrics = current_metrics()
+    if metrics is None:
+        return
+    finished = time.perf_counter()
+    sent_at = body.sent_at if body is not None else None
+    if sent_at is not None and sent_at >= attempt_started:
+        metrics.add_stage("envio", sent_at - attempt_started)
+        metrics.add_stage("espera_modelo", finished - sent_at)
+    else:
+        metrics.add_stage("espera_modelo", finished - attempt_started)
+    metrics.add_request(len(body) if body is not None else 0, received, attempts)
+
+
+def iter_sse_data(resp: requests.Response) -> Iterator[str]:
+    """
+    Campos data: de uma resposta text/event-stream, um por evento, até "[DONE]".
+    Comentários (": OPENROUTER PROCESSING", enviados como keep-alive) são
+    ignorados. Fecha a resposta ao terminar ou ser interrompido e soma os bytes
+    recebidos às métricas da execução. O token da análise é conferido a cada
+    linha, inclusive nos comentários de keep-alive.
+    """
+    received = 0
+    data_lines: List[bytes] = []
+    try:
+        for line in resp.iter_lines():
+            check_cancelled()
+            received += len(line) + 1
+            if not line:
+                # Linha em branco encerra o evento
+                if data_lines:
+                    data = b"\n".join(data_lines).decode("utf-8")
+                    data_lines = []
+                    if data == "[DONE]":
+                        return
+                    yield data
+                continue
+            if line.startswith(b":"):
+                continue
+            field, _, value = line.partition(b":")
+            if field == b"data":
+                data_lines.append(value[1:] if value.startswith(b" ") else value)
+        if data_lines:
+            data = b"\n".join(data_lines).decode("utf-8")
+            if data != "[DONE]":
+                yield data
+    finally:
+        resp.close()
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.add_received(received)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Circuit breaker simples (fechado → aberto → meio-aberto)
+
+        No meio-aberto só uma chamada de teste passa; as demais continuam
+        recusadas até ela terminar.
+
+        Args:
+            failure_threshold: Falhas consecutivas para abrir o circuito
+            reset_timeout: Segundos até permitir uma chamada de teste
+            clock: Fonte de tempo (injetável para testes)
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and self._clock() - self._opened_at < self.reset_timeout
+
+    def before_call(self) -> bool:
+        """
+        Levanta CircuitOpenError se o circuito estiver aberto ou se a chamada de
+        teste do meio-aberto ainda estiver em andamento. Retorna True quando esta
+        chamada é a de teste (ver release_probe).
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_timeout - (self._clock() - self._opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(
+                    f"OpenRouter indisponível após {self._failures} falhas consecutivas; "
+                    f"nova tentativa em {remaining:.0f}s"
+                )
+            if self._probing:
+                raise CircuitOpenError("OpenRouter indisponível; aguardando a chamada de teste em andamento")
+            # Meio-aberto: esta é a chamada de teste; nova falha reabre o circuito
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        """Libera a vaga de teste sem veredito (chamada cancelada ou com erro inesperado)."""
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """before_call no início e, se era a chamada de teste, release_probe ao final, qualquer que seja o desfecho."""
+        probe = self.before_call()
+        try:
+            yield
+        finally:
+            if probe:
+                self.release_probe()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+
+class _RetryPolicy:
+    """Parâmetros de timeout/retentativa comuns aos clientes síncrono e assíncrono."""
+
+    def __init__(self,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 30.0,
+                 max_retry_after: float = 120.0,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        self.connect_timeout = connect_timeout if connect_timeout is not None else _env_float("OPENROUTER_CONNECT_TIMEOUT", 10.0)
+        self.read_timeout = read_timeout if read_timeout is not None else _env_float("OPENROUTER_READ_TIMEOUT", 120.0)
+        if max_retries is None:
+            max_retries = int(_env_float("OPENROUTER_MAX_RETRIES", 3))
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker()
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Espera antes da tentativa `attempt` (0 = primeira repetição)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # "Full jitter": espalha as repetições de várias threads no tempo
+        return random.uniform(cap / 2, cap)
+
+    def attempt_timeout(self, token: Optional[CancelToken], timeout: Optional[tuple] = None) -> tuple:
+        """(connect, read) da próxima tentativa; a leitura não passa do prazo restante do token."""
+        connect, read = timeout or (self.connect_timeout, self.read_timeout)
+        remaining = token.remaining() if token is not None else None
+        if remaining is not None:
+            read = max(1.0, min(read, remaining))
+        return connect, read
+
+
+class OpenRouterClient(_RetryPolicy):
+    def __init__(self, pool_size: int = 10, sleep: Callable[[float], None] = time.sleep, **policy):
+        """
+        Cliente HTTP com pool de conexões, retentativas e circuit breaker
+
+        Args:
+            pool_size: Conexões mantidas por host
+            sleep: Função de espera (injetável para testes)
+            **policy: connect_timeout, read_timeout, max_retries, backoff_base,
+                backoff_max, max_retry_after e circuit_breaker (padrões vindos
+                do ambiente e circuit breaker global)
+        """
+        super().__init__(**policy)
+        self._sleep = sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @span("http")
+    def post(self, url: str, headers: Dict[str, str], payload: Union[Dict, StreamingJSONBody, None] = None,
+             data=None, timeout: Optional[tuple] = None, stream: bool = False) -> requests.Response:
+        """
+        Envia POST com retentativas. Retorna a última resposta recebida (inclusive
+        de erro, para o chamador interpretar) ou levanta a última exceção de rede.
+        Timeouts de leitura não são repetidos: o modelo pode ainda estar processando.
+        payload (dict ou StreamingJSONBody) é enviado em streaming.
+        Com stream=True, uma resposta 200 volta com o corpo ainda não lido (ver
+        iter_sse_data) e o tempo registrado em "espera_modelo" vai até os cabeçalhos.
+        Com um token de cancelamento no contexto, levanta AnalysisCancelledError
+        assim que ele for cancelado (ver _send).
+        """
+        with self.circuit_breaker.guard():
+            return self._post(url, headers, payload, data, timeout, stream)
+
+    def _post(self, url: str, headers: Dict[str, str], payload: Union[Dict, StreamingJSONBody, None],
+              data, timeout: Optional[tuple], stream: bool) -> requests.Response:
+        token = current_token()
+        body = as_json_body(payload)
+        if body is not None:
+            headers, data = body.headers(headers), body
+
+        attempt = 0
+        while True:
+            if token is not None:
+                token.raise_if_cancelled()
+            attempt_started = time.perf_counter()
+            try:
+                resp = self._send(token, url, headers=headers, data=data,
+                                  timeout=self.attempt_timeout(token, timeout), stream=stream)
+            except requests.exceptions.ConnectionError as exc:
+                # Inclui ConnectTimeout e conexões keep-alive encerradas pelo servidor
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning("🔁 Falha de conexão (%s) - nova tentativa em %.1fs", exc.__class__.__name__, delay)
+            except requests.exceptions.ReadTimeout:
+                self.circuit_breaker.record_failure()
+                raise
+            else:
+                if resp.status_code not in RETRY_STATUS:
+                    if resp.status_code < 500:
+                        self.circuit_breaker.record_success()
+                    unread = stream and resp.status_code == 200
+                    _record_exchange(body, attempt_started, 0 if unread else len(resp.content), attempt + 1)
+                    return resp
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    _record_exchange(body, attempt_started, len(resp.content), attempt + 1)
+                    return resp
+                delay = self.backoff_delay(attempt, parse_retry_after(resp.headers.get("Retry-After")))
+                logger.warning("🔁 HTTP %s - nova tentativa %d/%d em %.1fs", resp.status_code, attempt + 1, self.max_retries, delay)
+                resp.close()
+
+            if token is not None:
+                token.sleep(delay)
+            else:
+                self._sleep(delay)
+            attempt += 1
+
+    def _send(self, token: Optional[CancelToken], url: str, **kwargs) -> requests.Response:
+        """
+        Uma tentativa. Sem token, é o session.post direto. Com token, a
+        requisição roda numa thread auxiliar e a espera é interrompida assim que
+        o token for cancelado: o requests não permite abortar uma leitura em
+        andamento, então a chamada abandonada termina sozinha (no máximo até o
+        timeout de leitura) e a resposta é fechada e descartada.
+        """
+        if token is None:
+            return self.session.post(url, **kwargs)
+
+        outcome: Dict[str, object] = {}
+        done = threading.Event()
+        abandoned = threading.Event()
+
+        def run():
+            try:
+                outcome["resp"] = self.session.post(url, **kwargs)
+            except BaseException as exc:
+                outcome["error"] = exc
+            finally:
+                done.set()
+                if abandoned.is_set() and "resp" in outcome:
+                    outcome["resp"].close()
+
+        threading.Thread(target=run, name="openrouter-http", daemon=True).start()
+        try:
+            while not done.wait(CANCEL_POLL_S):
+                token.raise_if_cancelled()
+        except AnalysisCancelledError:
+            abandoned.set()
+            if done.is_set() and "resp" in outcome:
+                outcome["resp"].close()
+            logger.info("⏹️ Requisição em andamento abandonada: %s", token.reason)
+            raise
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["resp"]
+
+
+def parse_rate_limits(spec: Optional[str]) -> Dict[str, float]:
+    """Interpreta "modelo=rpm,modelo2=rpm" em {modelo: requisições por minuto}."""
+    limits: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        model, sep, value = item.strip().rpartition("=")
+        if not sep or not model:
+            continue
+        try:
+            limits[model.strip()] = float(value)
+        except ValueError:
+            logger.warning("⚠️ Limite de taxa inválido ignorado: %s", item.strip())
+    return limits
+
+
+class AsyncRateLimiter:
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Espaça as requisições de um modelo para no máximo `per_minute` por minuto
+
+        Args:
+            per_minute: Requisições por minuto (0 = sem limite)
+            clock: Fonte de tempo (injetável para testes)
+        """
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._clock = clock
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        # Sem await entre leitura e escrita: seguro sem lock dentro do event loop
+        now = self._clock()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncOpenRouterClient(_RetryPolicy):
+    def __init__(self,
+                 max_in_flight: Optional[int] = None,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 default_rate: Optional[float] = None,
+                 sleep: Callable[[float], "asyncio.Future"] = asyncio.sleep,
+                 **policy):
+        """
+        Cliente assíncrono para disparar muitas análises a partir de um único event loop
+
+        Deve ser usado com ``async with`` dentro do loop que fará as chamadas.
+
+        Args:
+            max_in_flight: Requisições simultâneas (se None, usa OPENROUTER_MAX_INFLIGHT)
+            rate_limits: Requisições por minuto por modelo (se None, usa OPENROUTER_RATE_LIMITS)
+            default_rate: Limite por minuto dos modelos sem entrada própria (0 = sem limite)
+            sleep: Corrotina de espera (injetável para testes)
+            **policy: Mesmos parâmetros de retentativa do OpenRouterClient
+        """
+        super().__init__(**policy)
+        if max_in_flight is None:
+            max_in_flight = int(_env_float("OPENROUTER_MAX_INFLIGHT", 16))
+        self.max_in_flight = max(1, max_in_flight)
+        if rate_limits is None:
+            rate_limits = parse_rate_limits(os.environ.get("OPENROUTER_RATE_LIMITS"))
+        self.rate_limits = rate_limits
+        self.default_rate = default_rate if default_rate is not None else _env_float("OPENROUTER_DEFAULT_RPM", 0.0)
+        self._sleep = sleep
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._limiters: Dict[str, AsyncRateLimiter] = {}
+        self._http = None
+
+    async def __aenter__(self) -> "AsyncOpenRouterClient":
+        if HTTPX_AVAILABLE:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_in_flight,
+                                    max_keepalive_connections=self.max_in_flight),
+            )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _limiter_for(self, model: Optional[str]) -> AsyncRateLimiter:
+        key = model or ""
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AsyncRateLimiter(self.rate_limits.get(key, self.default_rate))
+            self._limiters[key] = limiter
+        return limiter
+
+    async def _send(self, url: str, headers: Dict[str, str],
+                    body: Optional[StreamingJSONBody]) -> Tuple[int, str, Optional[str]]:
+        """Uma tentativa. Erros de conexão viram ConnectionError; de leitura, TimeoutError."""
+        if body is not None:
+            headers = body.headers(headers)
+        if self._http is not None:
+            try:
+                resp = await self._http.post(url, headers=headers,
+                                             content=body.aiter() if body is not None else None)
+            except httpx.ReadTimeout as exc:
+                raise TimeoutError(f"Timeout de leitura: {exc}") from exc
+            except httpx.TransportError as exc:
+                # Conexão, escrita/leitura interrompida, protocolo e timeouts de conexão/pool
+                raise ConnectionError(str(exc) or exc.__class__.__name__) from exc
+            return resp.status_code, resp.text, resp.headers.get("Retry-After")
+
+        # Sem httpx: a requisição bloqueante roda em thread, sob o mesmo semáforo
+        def blocking():
+            try:
+                resp = get_openrouter_client().session.post(
+                    url, headers=headers, data=body, timeout=(self.connect_timeout, self.read_timeout))
+            except requests.exceptions.ReadTimeout as exc:
+                raise TimeoutError(f"Timeout de leitura: {exc}") from exc
+            except requests.exceptions.ConnectionError as exc:
+                raise ConnectionError(str(exc)) from exc
+            return resp.status_code, resp.text, resp.headers.get("Retry-After")
+        return await asyncio.to_thread(blocking)
+
+    async def _attempt(self, url: str, headers: Dict[str, str], body: Optional[StreamingJSONBody],
+                       limiter: AsyncRateLimiter) -> Tuple[float, Tuple[int, str, Optional[str]]]:
+        """Uma tentativa com limite de taxa e semáforo: (início, (status, corpo, Retry-After))."""
+        await limiter.acquire()
+        async with self._semaphore:
+            # Fila de espera do lote não conta no prazo do arquivo
+            arm_deadline()
+            attempt_started = time.perf_counter()
+            return attempt_started, await self._send(url, headers, body)
+
+    async def post(self, url: str, headers: Dict[str, str], payload: Union[Dict, StreamingJSONBody, None] = None,
+                   model: Optional[str] = None) -> Tuple[int, str]:
+        """
+        Envia POST com a mesma política de retentativas do cliente síncrono.
+        Retorna (status, corpo) da última resposta ou levanta ConnectionError/TimeoutError
+        (AnalysisCancelledError se o token de cancelamento do contexto for cancelado).
+        """
+        with span("http"), self.circuit_breaker.guard():
+            return await self._post(url, headers, payload, model)
+
+    async def _post(self, url: str, headers: Dict[str, str], payload: Union[Dict, StreamingJSONBody, None],
+                    model: Optional[str]) -> Tuple[int, str]:
+        body = as_json_body(payload)
+        limiter = self._limiter_for(model or (body.payload.get("model") if body is not None else None))
+        token = current_token()
+
+        attempt = 0
+        while True:
+            try:
+                attempt_started, (status, text, retry_after) = await until_cancelled(
+                    self._attempt(url, headers, body, limiter), token)
+            except ConnectionError as exc:
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning("🔁 Falha de conexão (%s) - nova tentativa em %.1fs", exc, delay)
+            except TimeoutError:
+                self.circuit_breaker.record_failure()
+                raise
+            else:
+                if status not in RETRY_STATUS:
+                    if status < 500:
+                        self.circuit_breaker.record_success()
+                    _record_exchange(body, attempt_started, len(text.encode("utf-8")), attempt + 1)
+                    return status, text
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    _record_exchange(body, attempt_started, len(text.encode("utf-8")), attempt + 1)
+                    return status, text
+                delay = self.backoff_delay(attempt, parse_retry_after(retry_after))
+                logger.warning("🔁 HTTP %s - nova tentativa %d/%d em %.1fs", status, attempt + 1, self.max_retries, delay)
+
+            # A espera acontece fora do semáforo, liberando a vaga para outras requisições
+            await until_cancelled(self._sleep(delay), token)
+            attempt += 1
+
+
+async def until_cancelled(awaitable, token: Optional[CancelToken]):
+    """
+    Aguarda `awaitable`; se o token for cancelado antes, cancela a tarefa (o
+    httpx fecha a conexão) e levanta AnalysisCancelledError.
+    """
+    if token is None:
+        return await awaitable
+    token.raise_if_cancelled()
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_S)
+            if done:
+                return task.result()
+            token.raise_if_cancelled()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+# Instâncias globais
+_breaker_instance: Optional[CircuitBreaker] = None
+_client_instance: Optional[OpenRouterClient] = None
+_client_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Circuit breaker global, compartilhado pelos clientes síncrono e assíncrono"""
+    global _breaker_instance
+    with _client_lock:
+        if _breaker_instance is None:
+            _breaker_instance = CircuitBreaker(
+                failure_threshold=int(_env_float("OPENROUTER_CIRCUIT_THRESHOLD", 5)),
+                reset_timeout=_env_float("OPENROUTER_CIRCUIT_RESET", 60.0),
+            )
+        return _breaker_instance
+
+
+def get_openrouter_client() -> OpenRouterClient:
+    """Retorna o cliente global (sessão compartilhada entre todas as threads)"""
+    global _client_instance
+    breaker = get_circuit_breaker()
+    with _client_lock:
+        if _client_instance is None:
+            _client_instance = OpenRouterClient(circuit_breaker=breaker)
+        return _client_instance
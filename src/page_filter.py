@@ -0,0 +1,115 @@
+"""Filtro de páginas em branco e duplicadas, aplicado antes da codificação."""
+
+import zlib
+from typing import List, Dict, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+try:
+    from .settings import env_flag
+    from .image_codecs import thumbnail
+    from .log_config import get_logger
+except ImportError:
+    from settings import env_flag
+    from image_codecs import thumbnail
+    from log_config import get_logger
+
+logger = get_logger("filtro")
+
+# Filtro de páginas: descarta páginas em branco e quase duplicadas antes da codificação
+PAGE_FILTER = env_flag("PAGE_FILTER", True)
+
+_FILTER_THUMB_EDGE = 1024      # miniatura das duplicatas: um dígito diferente ainda é visível
+_FILTER_BLANK_EDGE = 512       # miniatura das páginas em branco: a redução apaga sujeira do scanner
+_FILTER_HASH_SIZE = 32         # dHash de 32x32 bits, usado só como pré-filtro de duplicatas
+BLANK_INK_DELTA = 48           # quanto mais escuro que o fundo um pixel precisa ser para contar como tinta
+BLANK_MAX_INK_RATIO = 0.0005   # abaixo dessa fração de tinta a página é considerada em branco
+DUPLICATE_MAX_DISTANCE = 0.04  # fração máxima de bits diferentes no dHash para comparar os pixels
+DUPLICATE_PIXEL_DELTA = 64     # diferença de tom acima da qual as páginas não são duplicatas
+DUPLICATE_MAX_CANDIDATES = 3   # páginas (mais próximas pelo dHash) comparadas pixel a pixel
+
+
+def _ink_ratio(thumb: Image.Image) -> float:
+    """Fração de pixels bem mais escuros que o fundo (mediana do histograma)."""
+    hist = thumb.histogram()
+    total = sum(hist)
+    if total <= 0:
+        return 0.0
+    acc = 0
+    background = 255
+    for level, count in enumerate(hist):
+        acc += count
+        if acc * 2 >= total:
+            background = level
+            break
+    limit = max(0, background - BLANK_INK_DELTA)
+    return sum(hist[:limit]) / total
+
+
+def _difference_hash(thumb: Image.Image) -> int:
+    """dHash: compara cada pixel com o vizinho à direita numa grade reduzida."""
+    size = _FILTER_HASH_SIZE
+    grid = thumb.resize((size + 1, size), Image.BOX)
+    pixels = list(grid.getdata())
+    value = 0
+    for row in range(size):
+        base = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[base + col] > pixels[base + col + 1])
+    return value
+
+
+def _same_pixels(thumb: Image.Image, other: Image.Image) -> bool:
+    """Confirma a duplicata pixel a pixel (um dígito diferente já passa de DUPLICATE_PIXEL_DELTA)."""
+    if thumb.size != other.size:
+        return False
+    return not any(ImageChops.difference(thumb, other).histogram()[DUPLICATE_PIXEL_DELTA:])
+
+
+class PageFilter:
+    """
+    Descarta páginas em branco e duplicadas (dHash como pré-filtro, depois os
+    pixels). A primeira ocorrência é mantida; as descartadas ficam em `dropped`.
+    """
+
+    def __init__(self, max_ink_ratio: float = BLANK_MAX_INK_RATIO,
+                 max_distance: float = DUPLICATE_MAX_DISTANCE):
+        self.max_ink_ratio = max_ink_ratio
+        self.max_distance_bits = int(max_distance * _FILTER_HASH_SIZE * _FILTER_HASH_SIZE)
+        self.dropped: List[Dict] = []
+        # (página, dHash, tamanho, miniatura comprimida): uma miniatura de texto ocupa ~60KB
+        self._kept: List[Tuple[int, int, Tuple[int, int], bytes]] = []
+
+    def check(self, img: Image.Image, page_number: int) -> bool:
+        """Retorna True se a página deve ser enviada; caso contrário registra o motivo."""
+        if not img.size or img.size[0] <= 0 or img.size[1] <= 0:
+            return True  # páginas inválidas são tratadas por _encode_page
+        thumb = thumbnail(img, _FILTER_THUMB_EDGE)
+
+        if _ink_ratio(thumbnail(thumb, _FILTER_BLANK_EDGE)) < self.max_ink_ratio:
+            self.dropped.append({"pagina": page_number, "motivo": "em_branco"})
+            logger.info("🗑️ Página %d em branco - descartada", page_number)
+            return False
+
+        page_hash = _difference_hash(thumb)
+        # Só as mais próximas pelo dHash (empate: a mais recente) são comparadas pixel a pixel
+        candidates = []
+        for position, (kept_page, kept_hash, kept_size, kept_data) in enumerate(self._kept):
+            distance = bin(page_hash ^ kept_hash).count("1")
+            if distance <= self.max_distance_bits and kept_size == thumb.size:
+                candidates.append((distance, -position))
+        for _, position in sorted(candidates)[:DUPLICATE_MAX_CANDIDATES]:
+            kept_page, _, kept_size, kept_data = self._kept[-position]
+            kept_thumb = Image.frombytes("L", kept_size, zlib.decompress(kept_data))
+            if _same_pixels(thumb, kept_thumb):
+                self.dropped.append({"pagina": page_number, "motivo": "duplicada", "duplicada_de": kept_page})
+                logger.info("🗑️ Página %d duplicada da página %d - descartada", page_number, kept_page)
+                return False
+
+        self._kept.append((page_number, page_hash, thumb.size, zlib.compress(thumb.tobytes(), 1)))
+        return True
+
+
+def new_page_filter() -> Optional[PageFilter]:
+    """Cria um filtro por documento (ou None se PAGE_FILTER estiver desativado)."""
+    return PageFilter() if PAGE_FILTER else None
@@ -0,0 +1,393 @@
+"""Renderização das páginas (PDF e imagens avulsas) e pipeline de codificação para envio."""
+
+import os
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional, Iterator, Callable, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+try:
+    from pdf2image.utils import get_page_count as pdf2image_page_count
+    PDF2IMAGE_AVAILABLE = True
+except Exception:
+    PDF2IMAGE_AVAILABLE = False
+
+try:
+    from .settings import env_int, env_flag
+    from .image_codecs import fit_image, encode_image, to_data_url, thumbnail
+    from .budgets import PayloadBudgeter, new_payload_budgeter, MANY_PAGES_THRESHOLD
+    from .page_filter import PageFilter
+    from .log_config import get_logger
+    from .run_metrics import span, submit_in_context
+    from .cancellation import AnalysisCancelledError, check_cancelled, arm_deadline
+except ImportError:
+    from settings import env_int, env_flag
+    from image_codecs import fit_image, encode_image, to_data_url, thumbnail
+    from budgets import PayloadBudgeter, new_payload_budgeter, MANY_PAGES_THRESHOLD
+    from page_filter import PageFilter
+    from log_config import get_logger
+    from run_metrics import span, submit_in_context
+    from cancellation import AnalysisCancelledError, check_cancelled, arm_deadline
+
+logger = get_logger("renderizacao")
+
+# Threads de codificação por arquivo (ver iter_encoded_pages)
+ENCODE_WORKERS = env_int("ENCODE_WORKERS", min(4, os.cpu_count() or 1))
+
+# Renderização das páginas: resolução máxima e modo de cor
+MAX_RENDER_DPI = 200  # nunca renderiza acima disso, mesmo em páginas pequenas
+RENDER_GRAYSCALE = env_flag("RENDER_GRAYSCALE", False)
+
+# Recorte automático das margens vazias antes do redimensionamento
+AUTO_CROP = env_flag("AUTO_CROP", True)
+
+SUPPORTED_IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"]
+SUPPORTED_EXTENSIONS = [".pdf"] + SUPPORTED_IMAGE_EXTENSIONS
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    """Retorna o número total de páginas de um PDF."""
+    try:
+        if PDF2IMAGE_AVAILABLE:
+            try:
+                return pdf2image_page_count(pdf_path)
+            except Exception:
+                pass
+        
+        # Fallback com PyMuPDF
+        doc = fitz.open(pdf_path)
+        page_count = len(doc)
+        doc.close()
+        return page_count
+        
+    except Exception as e:
+        logger.error("Erro ao contar páginas do PDF: %s", e)
+        return 0
+
+
+def render_zoom_for_page(page: "fitz.Page", max_edge: Optional[int] = None,
+                         clip: Optional["fitz.Rect"] = None) -> float:
+    """
+    Zoom do PyMuPDF para que o maior lado da página saia com max_edge pixels, até
+    MAX_RENDER_DPI. Com clip, o conteúdo é ampliado em até CROP_MAX_MAGNIFICATION.
+    """
+    max_zoom = MAX_RENDER_DPI / 72.0
+    if not max_edge:
+        return max_zoom
+    longest = max(page.rect.width, page.rect.height)
+    if longest <= 0:
+        return max_zoom
+    zoom = min(max_zoom, max_edge / longest)
+    if clip is None or clip.is_empty:
+        return zoom
+    area_ratio = (clip.width * clip.height) / (page.rect.width * page.rect.height)
+    # O recorte não começa na origem: o arredondamento da borda pode somar um pixel
+    fit = (max_edge - 1) / (max(clip.width, clip.height) * zoom)
+    magnification = min(CROP_MAX_MAGNIFICATION, area_ratio ** -0.5, fit)
+    return min(max_zoom, zoom * max(1.0, magnification))
+
+
+def render_pdf_page(page: "fitz.Page", max_edge: Optional[int] = None, grayscale: bool = False,
+                    crop: bool = False) -> Image.Image:
+    """Renderiza uma página do PDF já no tamanho final, opcionalmente em cinza e sem as margens vazias."""
+    clip = _content_clip(page) if crop else None
+    zoom = render_zoom_for_page(page, max_edge, clip)
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False, clip=clip)
+    return Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+
+
+# Recorte automático de margens
+_CROP_DETECT_EDGE = 512  # maior lado da cópia reduzida usada na detecção
+CROP_INK_DELTA = 48      # quanto mais escuro que o fundo um pixel precisa ser para contar como conteúdo
+CROP_MIN_RUN = 3         # linhas/colunas seguidas com tinta; sujeira isolada na margem é ignorada
+CROP_PADDING = 0.02      # folga mantida em volta do conteúdo (fração da página)
+CROP_MIN_GAIN = 0.10     # só recorta se remover ao menos essa fração da área
+CROP_MAX_MAGNIFICATION = 1.25  # ampliação máxima do conteúdo recortado
+
+
+def _content_span(profile: List[int], length: int) -> Optional[Tuple[int, int]]:
+    """Primeiro e último índice de sequências de CROP_MIN_RUN posições com tinta."""
+    run = 0
+    first = last = None
+    for i, value in enumerate(profile):
+        run = run + 1 if value >= 1 else 0
+        if run >= CROP_MIN_RUN:
+            if first is None:
+                first = i - run + 1
+            last = i + 1
+    if first is None:
+        return None
+    return first, last
+
+
+def content_bbox(img: Image.Image) -> Optional[Tuple[float, float, float, float]]:
+    """Caixa do conteúdo em frações (x0, y0, x1, y1), ou None se o recorte não compensar."""
+    thumb = thumbnail(img, _CROP_DETECT_EDGE)
+    width, height = thumb.size
+    hist = thumb.histogram()
+    total, acc, background = sum(hist), 0, 255
+    for level, count in enumerate(hist):
+        acc += count
+        if acc * 2 >= total:
+            background = level
+            break
+    limit = background - CROP_INK_DELTA
+    if limit <= 0:
+        return None
+    mask = thumb.point([255 if v < limit else 0 for v in range(256)])
+    cols = _content_span(list(mask.resize((width, 1), Image.BOX).getdata()), width)
+    rows = _content_span(list(mask.resize((1, height), Image.BOX).getdata()), height)
+    if cols is None or rows is None:
+        return None
+
+    x0 = max(0.0, cols[0] / width - CROP_PADDING)
+    x1 = min(1.0, cols[1] / width + CROP_PADDING)
+    y0 = max(0.0, rows[0] / height - CROP_PADDING)
+    y1 = min(1.0, rows[1] / height + CROP_PADDING)
+    if (x1 - x0) * (y1 - y0) > 1.0 - CROP_MIN_GAIN:
+        return None
+    return x0, y0, x1, y1
+
+
+def _content_clip(page: "fitz.Page") -> Optional["fitz.Rect"]:
+    """Área de conteúdo da página (coordenadas já rotacionadas), detectada numa renderização reduzida."""
+    box = content_bbox(render_pdf_page(page, _CROP_DETECT_EDGE, grayscale=True))
+    if box is None:
+        return None
+    rect = page.rect
+    return fitz.Rect(rect.x0 + box[0] * rect.width, rect.y0 + box[1] * rect.height,
+                     rect.x0 + box[2] * rect.width, rect.y0 + box[3] * rect.height)
+
+
+def crop_to_content(img: Image.Image, box: Optional[Tuple[float, float, float, float]],
+                    max_edge: Optional[int] = None) -> Image.Image:
+    """Recorta uma imagem avulsa na caixa de content_bbox, ampliando no máximo CROP_MAX_MAGNIFICATION."""
+    if box is None:
+        return img
+    width, height = img.size
+    cropped = img.crop((round(box[0] * width), round(box[1] * height),
+                        round(box[2] * width), round(box[3] * height)))
+    if max_edge:
+        area_ratio = (box[2] - box[0]) * (box[3] - box[1])
+        scale = min(1.0, max_edge / max(width, height)) * min(CROP_MAX_MAGNIFICATION, area_ratio ** -0.5)
+        if scale < 1.0:
+            cropped.thumbnail((max(1, round(cropped.size[0] * scale)), max(1, round(cropped.size[1] * scale))),
+                              Image.Resampling.LANCZOS)
+    return cropped
+
+
+def _iter_page_renderers(file_path: str, grayscale: bool = False,
+                         page_range: Optional[Tuple[int, int]] = None,
+                         crop: bool = False) -> Iterator[Callable[[Optional[int]], Image.Image]]:
+    """
+    Gera, para cada página, uma função que a renderiza com o maior lado indicado.
+    page_range=(início, fim) restringe o PDF às páginas [início, fim), base 0.
+    """
+    ext = os.path.splitext(file_path.lower())[1]
+    if ext == ".pdf":
+        doc = fitz.open(file_path)
+        try:
+            start, end = page_range if page_range is not None else (0, len(doc))
+            for page_num in range(max(0, start), min(end, len(doc))):
+                check_cancelled()
+                page = doc[page_num]
+                yield lambda max_edge, page=page: render_pdf_page(page, max_edge, grayscale, crop)
+        finally:
+            doc.close()
+    elif ext in SUPPORTED_IMAGE_EXTENSIONS:
+        with Image.open(file_path) as img:
+            img.load()
+            if grayscale and img.mode != 'L':
+                page_img = img.convert('L')
+            else:
+                page_img = img
+            if crop:
+                box = content_bbox(page_img)
+                yield lambda max_edge: crop_to_content(page_img, box, max_edge)
+            else:
+                yield lambda max_edge: page_img
+    else:
+        raise ValueError(f"Formato de arquivo não suportado para análise visual: {ext}")
+
+
+def iter_document_images(file_path: str, max_edge: Optional[int] = None,
+                         grayscale: bool = False) -> Iterator[Image.Image]:
+    """Gera as imagens de um PDF (página a página) ou de um arquivo de imagem."""
+    for render in _iter_page_renderers(file_path, grayscale):
+        yield render(max_edge)
+
+
+@asynccontextmanager
+async def prepare_slot(prepare_semaphore: Optional[asyncio.Semaphore]):
+    """Vaga de rasterização no lote assíncrono; o prazo do arquivo começa a contar ao obtê-la."""
+    if prepare_semaphore is None:
+        arm_deadline()
+        yield
+        return
+    async with prepare_semaphore:
+        arm_deadline()
+        yield
+
+
+@span("codificacao")
+def _encode_page(img: Image.Image, page_number: int, max_size: int, jpeg_quality: int) -> str:
+    """Valida, redimensiona e codifica uma página (data URL do menor codec), liberando o raster ao final."""
+    try:
+        if not img.size or img.size[0] <= 0 or img.size[1] <= 0:
+            logger.warning("⚠️ Página %d inválida ou vazia", page_number)
+            return ""
+        try:
+            codec, data = encode_image(fit_image(img, max_size), jpeg_quality)
+        except Exception as e:
+            logger.warning("⚠️ Falha ao processar página %d: %s", page_number, e)
+            return ""
+        return to_data_url(codec.mime, data)
+    finally:
+        img.close()
+
+
+def iter_encoded_pages(file_path: str, max_size: int = 1536, jpeg_quality: int = 85,
+                       grayscale: Optional[bool] = None,
+                       budgeter: Optional[PayloadBudgeter] = None,
+                       workers: Optional[int] = None,
+                       page_range: Optional[Tuple[int, int]] = None,
+                       page_filter: Optional[PageFilter] = None,
+                       crop: Optional[bool] = None) -> Iterator[str]:
+    """
+    Pipeline renderizar → codificar em streaming, com data URLs na ordem das páginas.
+
+    A renderização (PyMuPDF) é sequencial e a codificação roda em `workers`
+    threads, com no máximo 2 × workers páginas em memória. Com budgeter, o
+    tamanho de cada página vem do orçamento. None usa RENDER_GRAYSCALE,
+    ENCODE_WORKERS e AUTO_CROP.
+    """
+    if grayscale is None:
+        grayscale = RENDER_GRAYSCALE
+    if crop is None:
+        crop = AUTO_CROP
+    if workers is None:
+        workers = ENCODE_WORKERS
+    workers = max(1, workers)
+
+    def settings() -> Tuple[int, int]:
+        if budgeter is not None:
+            return budgeter.next_settings()
+        return max_size, jpeg_quality
+
+    def accept(b64: str, tier: Tuple[int, int]) -> bool:
+        if budgeter is not None:
+            if b64:
+                budgeter.record(len(b64), tier)
+            else:
+                budgeter.skip(tier)
+        return bool(b64)
+
+    def rendered(render, i: int, tier: Tuple[int, int]) -> Optional[Image.Image]:
+        with span("renderizacao"):
+            img = render(tier[0])
+        if page_filter is None:
+            return img
+        with span("filtro_paginas"):
+            keep = page_filter.check(img, i)
+        if not keep:
+            img.close()
+            if budgeter is not None:
+                budgeter.skip(tier)
+            return None
+        return img
+
+    renderers = _iter_page_renderers(file_path, grayscale, page_range, crop)
+    first_page = page_range[0] + 1 if page_range is not None else 1
+
+    if workers == 1:
+        for i, render in enumerate(renderers, first_page):
+            tier = settings()
+            img = rendered(render, i, tier)
+            if img is None:
+                continue
+            b64 = _encode_page(img, i, *tier)
+            if accept(b64, tier):
+                yield b64
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg") as executor:
+        in_flight = deque()
+        for i, render in enumerate(renderers, first_page):
+            tier = settings()
+            img = rendered(render, i, tier)
+            if img is None:
+                continue
+            in_flight.append((submit_in_context(executor, _encode_page, img, i, *tier), tier))
+            while len(in_flight) >= workers * 2:
+                future, done_tier = in_flight.popleft()
+                b64 = future.result()
+                if accept(b64, done_tier):
+                    yield b64
+        while in_flight:
+            future, done_tier = in_flight.popleft()
+            b64 = future.result()
+            if accept(b64, done_tier):
+                yield b64
+
+
+def prepare_vision_images(file_path: str, page_filter: Optional[PageFilter] = None) -> List[str]:
+    """Rasteriza e codifica as páginas dentro do orçamento; se o filtro descartar todas, refaz sem ele."""
+    fname_placeholder = os.path.basename(file_path)
+    logger.info("🔍 Convertendo %s para análise visual...", fname_placeholder)
+    
+    # Converte arquivo para imagens
+    ext = os.path.splitext(file_path.lower())[1]
+    if ext == ".pdf":
+        # Verifica o número de páginas ANTES de processar
+        try:
+            total_pages = get_pdf_page_count(file_path)
+            logger.debug("📊 PDF contém %d página(s)", total_pages)
+        except Exception as e:
+            logger.warning("⚠️ Erro ao contar páginas: %s", e)
+            total_pages = 0
+        
+        if total_pages > 100:
+            logger.info("⚠️ PDF com %d páginas - processamento pode demorar", total_pages)
+    elif ext in SUPPORTED_IMAGE_EXTENSIONS:
+        total_pages = 1
+    else:
+        raise ValueError(f"Formato de arquivo não suportado para análise visual: {ext}")
+
+    budgeter = new_payload_budgeter(total_pages)
+    max_size, jpeg_quality = budgeter.next_settings()
+    if total_pages > MANY_PAGES_THRESHOLD:
+        logger.info("⚠️ Muitas páginas (%d) - otimizando qualidade automaticamente", total_pages)
+    logger.debug("🔄 Preparando %d página(s) para envio à IA (%dpx, qualidade %d)...",
+                 total_pages, max_size, jpeg_quality)
+
+    if total_pages <= 1:
+        page_filter = None
+
+    images_b64 = []
+    try:
+        for i, b64 in enumerate(iter_encoded_pages(file_path, budgeter=budgeter, page_filter=page_filter), 1):
+            images_b64.append(b64)
+            logger.debug("✅ Página %d preparada (%dKB) - total acumulado: %dKB",
+                         i, len(b64) // 1024, budgeter.used_bytes // 1024)
+        if not images_b64 and page_filter is not None and page_filter.dropped:
+            logger.warning("⚠️ Todas as páginas foram descartadas pelo filtro - enviando sem filtro")
+            page_filter.dropped.clear()
+            budgeter = new_payload_budgeter(total_pages)
+            images_b64 = list(iter_encoded_pages(file_path, budgeter=budgeter))
+    except (ValueError, AnalysisCancelledError):
+        raise
+    except Exception as e:
+        logger.error("❌ Erro ao converter %s: %s: %s", fname_placeholder, type(e).__name__, e)
+        raise ValueError(f"Erro ao converter arquivo para imagens: {e}")
+
+    logger.info("📈 %s: %s", fname_placeholder, budgeter.summary())
+    if page_filter is not None and page_filter.dropped:
+        logger.info("🗑️ %d página(s) descartada(s) pelo filtro", len(page_filter.dropped))
+    
+    if not images_b64:
+        raise ValueError("Não foi possível converter nenhuma imagem para envio")
+    return images_b64
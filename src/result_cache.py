@@ -0,0 +1,189 @@
+"""
+Cache persistente de resultados de análise
+
+Guarda o JSON já interpretado (``raw_json``) de cada análise em SQLite, com
+chave derivada do conteúdo do arquivo (SHA-256), do modelo e da versão dos
+prompts. Reabrir o mesmo PDF com o mesmo modelo/prompt devolve o resultado
+sem rasterizar páginas nem chamar a API.
+
+Configuração por variáveis de ambiente:
+- RESULT_CACHE_DISABLED=1   desativa leitura e gravação
+- RESULT_CACHE_DIR          diretório do banco (padrão: cache do usuário)
+- RESULT_CACHE_MAX_MB       tamanho máximo antes da remoção LRU (padrão: 200)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict
+
+try:
+    from .log_config import get_logger
+except ImportError:
+    from log_config import get_logger
+
+logger = get_logger("cache")
+
+CACHE_FILENAME = "resultados_cache.sqlite3"
+DEFAULT_MAX_MB = 200
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """Calcula SHA-256 do arquivo lendo em blocos."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(*parts: str) -> str:
+    """Hash estável de um ou mais textos (usado para versionar prompts)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def make_cache_key(file_hash: str, model: str, prompt_hash: str) -> str:
+    """Compõe a chave do cache a partir do conteúdo, modelo e versão do prompt."""
+    return text_sha256(file_hash, model, prompt_hash)
+
+
+def _default_cache_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "analisador_matriculas")
+
+
+class ResultCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None, enabled: bool = True):
+        """
+        Cache LRU em SQLite limitado por tamanho
+
+        Args:
+            cache_dir: Diretório do banco (se None, usa RESULT_CACHE_DIR ou cache do usuário)
+            max_bytes: Tamanho máximo somado das entradas (se None, usa RESULT_CACHE_MAX_MB)
+            enabled: Se False, get/put não fazem nada
+        """
+        self.enabled = enabled
+        self.cache_dir = cache_dir or os.environ.get("RESULT_CACHE_DIR") or _default_cache_dir()
+        if max_bytes is None:
+            try:
+                max_mb = float(os.environ.get("RESULT_CACHE_MAX_MB", DEFAULT_MAX_MB))
+            except ValueError:
+                max_mb = DEFAULT_MAX_MB
+            max_bytes = int(max_mb * 1024 * 1024)
+        self.max_bytes = max(0, max_bytes)
+        self.db_path = os.path.join(self.cache_dir, CACHE_FILENAME)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resultados ("
+                " chave TEXT PRIMARY KEY,"
+                " valor TEXT NOT NULL,"
+                " tamanho INTEGER NOT NULL,"
+                " criado_em REAL NOT NULL,"
+                " acessado_em REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_acesso ON resultados(acessado_em)")
+            self._initialized = True
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Retorna o JSON armazenado para a chave (ou None) e atualiza o acesso LRU."""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                conn = self._connect()
+                try:
+                    row = conn.execute("SELECT valor FROM resultados WHERE chave = ?", (key,)).fetchone()
+                    if row is None:
+                        return None
+                    with conn:
+                        conn.execute("UPDATE resultados SET acessado_em = ? WHERE chave = ?", (time.time(), key))
+                finally:
+                    conn.close()
+            return json.loads(row[0])
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logger.warning("[Cache] Erro ao ler cache: %s", e)
+            return None
+
+    def put(self, key: str, value: Dict) -> bool:
+        """Armazena o JSON e remove as entradas menos usadas se o limite for excedido."""
+        if not self.enabled:
+            return False
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+            size = len(payload.encode("utf-8"))
+            if self.max_bytes and size > self.max_bytes:
+                return False
+            now = time.time()
+            with self._lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO resultados (chave, valor, tamanho, criado_em, acessado_em)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            (key, payload, size, now, now)
+                        )
+                        self._evict(conn)
+                finally:
+                    conn.close()
+            return True
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            logger.warning("[Cache] Erro ao gravar cache: %s", e)
+            return False
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Remove entradas por ordem de último acesso até caber no limite."""
+        if not self.max_bytes:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM resultados").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for chave, tamanho in conn.execute(
+            "SELECT chave, tamanho FROM resultados ORDER BY acessado_em ASC"
+        ).fetchall():
+            conn.execute("DELETE FROM resultados WHERE chave = ?", (chave,))
+            total -= tamanho
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Remove todas as entradas do cache."""
+        if not os.path.exists(self.db_path):
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM resultados")
+            finally:
+                conn.close()
+
+
+# Instância global
+_cache_instance: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Retorna a instância global do cache de resultados"""
+    global _cache_instance
+    if _cache_instance is None:
+        disabled = os.environ.get("RESULT_CACHE_DISABLED", "").strip().lower() in ("1", "true", "sim", "yes")
+        _cache_instance = ResultCache(enabled=not disabled)
+    return _cache_instance
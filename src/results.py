@@ -0,0 +1,415 @@
+"""Estruturas do resultado da análise e interpretação do JSON retornado pelo modelo."""
+
+import json
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
+
+try:
+    from .normalization import matricula_key, normalize_analysis, safe_get_dict, safe_get_list
+    from .json_repair import parse_json_response, salvage_analysis_response
+    from .log_config import get_logger
+    from .run_metrics import span
+except ImportError:
+    from normalization import matricula_key, normalize_analysis, safe_get_dict, safe_get_list
+    from json_repair import parse_json_response, salvage_analysis_response
+    from log_config import get_logger
+    from run_metrics import span
+
+logger = get_logger("analysis")
+
+@dataclass
+class TransmissaoInfo:
+    """Informações sobre uma transmissão na cadeia dominial"""
+    data: Optional[str] = None
+    tipo_transmissao: Optional[str] = None
+    proprietario_anterior: Optional[str] = None
+    novo_proprietario: Optional[str] = None
+    percentual: Optional[str] = None
+    valor: Optional[str] = None
+    registro: Optional[str] = None
+
+@dataclass
+class RestricaoInfo:
+    """Informações sobre restrições e gravames"""
+    tipo: str
+    data_registro: Optional[str] = None
+    credor: Optional[str] = None
+    valor: Optional[str] = None
+    situacao: str = "vigente"  # "vigente" ou "baixada"
+    data_baixa: Optional[str] = None
+    observacoes: Optional[str] = None
+
+
+@dataclass
+class MatriculaInfo:
+    numero: str
+    proprietarios: List[str]
+    descricao: str
+    confrontantes: List[str]
+    evidence: List[str]
+    lote: Optional[str] = None  # número do lote
+    quadra: Optional[str] = None  # número da quadra
+    cadeia_dominial: List[TransmissaoInfo] = None  # histórico de transmissões
+    restricoes: List[RestricaoInfo] = None  # restrições e gravames
+    
+    def __post_init__(self):
+        if self.cadeia_dominial is None:
+            self.cadeia_dominial = []
+        if self.restricoes is None:
+            self.restricoes = []
+
+@dataclass
+class LoteConfronta:
+    """Informações sobre um lote confrontante"""
+    identificador: str  # "lote 10", "matrícula 1234", etc.
+    tipo: str  # "lote", "matrícula", "pessoa", "via_publica", "estado", "outros"
+    matricula_anexada: Optional[str] = None  # número da matrícula se foi anexada
+    direcao: Optional[str] = None  # norte, sul, leste, oeste, etc.
+    
+@dataclass
+class EstadoMSDireitos:
+    """Informações sobre direitos do Estado de MS"""
+    tem_direitos: bool = False
+    detalhes: List[Dict] = None
+    criticidade: str = "baixa"  # "alta", "media", "baixa"
+    observacao: str = ""
+    
+    def __post_init__(self):
+        if self.detalhes is None:
+            self.detalhes = []
+
+@dataclass
+class ResumoAnalise:
+    """Resumo estruturado da análise para o relatório"""
+    cadeia_dominial_completa: Dict[str, List[Dict]] = None  # matrícula -> lista cronológica
+    restricoes_vigentes: List[Dict] = None  # restrições ainda em vigor
+    restricoes_baixadas: List[Dict] = None  # restrições já canceladas
+    estado_ms_direitos: EstadoMSDireitos = None  # direitos do Estado de MS
+    
+    def __post_init__(self):
+        if self.cadeia_dominial_completa is None:
+            self.cadeia_dominial_completa = {}
+        if self.restricoes_vigentes is None:
+            self.restricoes_vigentes = []
+        if self.restricoes_baixadas is None:
+            self.restricoes_baixadas = []
+        if self.estado_ms_direitos is None:
+            self.estado_ms_direitos = EstadoMSDireitos()
+
+@dataclass
+class AnalysisResult:
+    arquivo: str
+    matriculas_encontradas: List[MatriculaInfo]
+    matricula_principal: Optional[str]  # número da matrícula de usucapião
+    matriculas_confrontantes: List[str]  # números das matrículas confrontantes
+    # NOVOS CAMPOS PARA MELHOR CONTROLE
+    lotes_confrontantes: List[LoteConfronta]  # todos os confrontantes identificados
+    matriculas_nao_confrontantes: List[str]  # matrículas anexadas que NÃO são confrontantes
+    lotes_sem_matricula: List[str]  # lotes confrontantes sem matrícula anexada
+    confrontacao_completa: Optional[bool]  # se todas confrontantes foram apresentadas
+    proprietarios_identificados: Dict[str, List[str]]  # número -> lista proprietários
+    resumo_analise: Optional[ResumoAnalise] = None  # resumo estruturado da análise
+    confidence: Optional[float] = None
+    reasoning: str = ""
+    raw_json: Dict = None
+    parcial: bool = False  # resposta truncada/inválida: só o que pôde ser recuperado
+    metricas: Dict = None  # tempos por etapa, bytes e tokens da execução (ver run_metrics)
+    
+    def __post_init__(self):
+        if self.resumo_analise is None:
+            self.resumo_analise = ResumoAnalise()
+        if self.raw_json is None:
+            self.raw_json = {}
+        if self.metricas is None:
+            self.metricas = {}
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ("matriculas_encontradas", "proprietarios_identificados"):
+            self.reindex()
+
+    def reindex(self):
+        """Descarta os índices por número de matrícula; chame após alterar as coleções no lugar."""
+        self.__dict__.pop("_indices", None)
+
+    def _index(self) -> Tuple[Dict[str, MatriculaInfo], Dict[str, List[str]]]:
+        indices = self.__dict__.get("_indices")
+        if indices is None:
+            matriculas: Dict[str, MatriculaInfo] = {}
+            for mat in self.matriculas_encontradas:
+                matriculas.setdefault(matricula_key(mat.numero), mat)
+            proprietarios: Dict[str, List[str]] = {}
+            for numero, nomes in (self.proprietarios_identificados or {}).items():
+                proprietarios.setdefault(matricula_key(numero), nomes)
+            indices = self.__dict__["_indices"] = (matriculas, proprietarios)
+        return indices
+
+    def matricula(self, numero) -> Optional[MatriculaInfo]:
+        """Matrícula encontrada com esse número, em qualquer grafia ("12.345", "Mat. 12345")."""
+        key = matricula_key(numero) if numero else ""
+        return self._index()[0].get(key) if key else None
+
+    def proprietarios_de(self, numero) -> List[str]:
+        """Proprietários da matrícula: proprietarios_identificados ou, na falta, os da própria matrícula."""
+        key = matricula_key(numero) if numero else ""
+        if not key:
+            return []
+        matriculas, proprietarios = self._index()
+        nomes = proprietarios.get(key)
+        if not nomes:
+            mat = matriculas.get(key)
+            nomes = mat.proprietarios if mat is not None else []
+        return list(nomes) if isinstance(nomes, list) else [str(nomes)]
+    
+    # Campos de compatibilidade (para não quebrar código existente)
+    @property
+    def is_confrontante(self) -> Optional[bool]:
+        """Compatibilidade: retorna se encontrou Estado MS como confrontante"""
+        estado_patterns = ['estado de mato grosso do sul', 'estado de ms', 'estado do ms', 
+                          'fazenda do estado', 'governo do estado', 'fazenda pública estadual']
+        for matricula in self.matriculas_encontradas:
+            for confrontante in matricula.confrontantes:
+                if any(pattern in confrontante.lower() for pattern in estado_patterns):
+                    return True
+        return False
+    
+
+
+# Colunas da exportação CSV (GUI e modo em lote)
+CSV_HEADER = ["arquivo", "matricula_principal", "matriculas_confrontantes", "estado_ms_confrontante",
+              "confianca_percentual", "proprietarios", "reasoning"]
+
+
+def result_to_csv_row(res: AnalysisResult) -> List[str]:
+    """Formata um AnalysisResult como linha do CSV de exportação."""
+    # Formata confiança (já vem como percentual da API)
+    confianca_pct = f"{int(res.confidence)}%" if res.confidence is not None else "N/A"
+
+    # Prepara proprietários para CSV
+    proprietarios_csv = []
+    for numero, props in res.proprietarios_identificados.items():
+        if props:
+            proprietarios_csv.append(f"{numero}: {'; '.join(props)}")
+
+    return [
+        res.arquivo,
+        res.matricula_principal or "Não identificada",
+        " | ".join(res.matriculas_confrontantes),
+        "SIM" if res.is_confrontante else "NÃO",
+        confianca_pct,
+        " | ".join(proprietarios_csv),
+        res.reasoning.replace("\n", " ").strip()
+    ]
+
+
+def _safe_process_matricula_data(m_data):
+    """Processa dados de matrícula de forma robusta, evitando erros com campos vazios."""
+    if not isinstance(m_data, dict):
+        return None
+    
+    try:
+        # Processa cadeia dominial
+        cadeia_dominial_obj = []
+        cadeia_data = safe_get_list(m_data, "cadeia_dominial")
+        for transmissao_data in cadeia_data:
+            if isinstance(transmissao_data, dict):
+                transmissao = TransmissaoInfo(
+                    data=transmissao_data.get("data"),
+                    tipo_transmissao=transmissao_data.get("tipo_transmissao"),
+                    proprietario_anterior=transmissao_data.get("proprietario_anterior"),
+                    novo_proprietario=transmissao_data.get("novo_proprietario"),
+                    percentual=transmissao_data.get("percentual"),
+                    valor=transmissao_data.get("valor"),
+                    registro=transmissao_data.get("registro")
+                )
+                cadeia_dominial_obj.append(transmissao)
+        
+        # Processa restrições
+        restricoes_obj = []
+        restricoes_data = safe_get_list(m_data, "restricoes")
+        for restricao_data in restricoes_data:
+            if isinstance(restricao_data, dict):
+                restricao = RestricaoInfo(
+                    tipo=restricao_data.get("tipo", ""),
+                    data_registro=restricao_data.get("data_registro"),
+                    credor=restricao_data.get("credor"),
+                    valor=restricao_data.get("valor"),
+                    situacao=restricao_data.get("situacao", "vigente"),
+                    data_baixa=restricao_data.get("data_baixa"),
+                    observacoes=restricao_data.get("observacoes")
+                )
+                restricoes_obj.append(restricao)
+        
+        
+        # Processa listas principais com validação
+        proprietarios = safe_get_list(m_data, "proprietarios")
+        confrontantes_list = safe_get_list(m_data, "confrontantes")
+        evidence = safe_get_list(m_data, "evidence")
+        
+        matricula = MatriculaInfo(
+            numero=str(m_data.get("numero", "")),
+            proprietarios=proprietarios,
+            descricao=str(m_data.get("descricao", "")),
+            confrontantes=confrontantes_list,
+            evidence=evidence,
+            lote=m_data.get("lote"),
+            quadra=m_data.get("quadra"),
+            cadeia_dominial=cadeia_dominial_obj,
+            restricoes=restricoes_obj,
+        )
+        return matricula
+        
+    except Exception as e:
+        logger.warning("⚠️ Erro ao processar dados da matrícula: %s", e)
+        return None
+
+def build_analysis_result(arquivo: str, parsed: Dict) -> AnalysisResult:
+    """Converte o JSON retornado pela LLM em AnalysisResult (normalizado por normalize_analysis)."""
+    raw = parsed
+    parsed = normalize_analysis(raw)
+    # Converte dados das matrículas para objetos MatriculaInfo usando processamento seguro
+    matriculas_obj = []
+    for m_data in parsed.get("matriculas_encontradas", []):
+        matricula = _safe_process_matricula_data(m_data)
+        if matricula is not None:
+            matriculas_obj.append(matricula)
+
+    # Processa lotes confrontantes
+    lotes_confrontantes_obj = []
+    lotes_confrontantes_raw = parsed.get("lotes_confrontantes", [])
+    logger.debug("🔍 lotes_confrontantes encontrados: %d itens", len(lotes_confrontantes_raw))
+
+    try:
+        for i, lote_data in enumerate(lotes_confrontantes_raw):
+            if isinstance(lote_data, dict):
+                lote_confronta = LoteConfronta(
+                    identificador=lote_data.get("identificador", ""),
+                    tipo=lote_data.get("tipo", "outros"),
+                    matricula_anexada=lote_data.get("matricula_anexada"),
+                    direcao=lote_data.get("direcao")
+                )
+                lotes_confrontantes_obj.append(lote_confronta)
+            else:
+                logger.warning("⚠️ Lote %d não é dict: %r", i + 1, lote_data)
+    except Exception as e:
+        logger.error("❌ ERRO ao processar lotes confrontantes: %s: %s", type(e).__name__, e)
+        raise
+
+    # Processa resumo da análise com tratamento seguro
+    resumo_data = safe_get_dict(parsed, "resumo_analise")
+
+    # Processa direitos do Estado de MS
+    estado_ms_data = safe_get_dict(resumo_data, "estado_ms_direitos")
+    estado_ms_direitos = EstadoMSDireitos(
+        tem_direitos=bool(estado_ms_data.get("tem_direitos", False)),
+        detalhes=safe_get_list(estado_ms_data, "detalhes"),
+        criticidade=str(estado_ms_data.get("criticidade", "baixa")),
+        observacao=str(estado_ms_data.get("observacao", ""))
+    )
+
+    resumo_analise = ResumoAnalise(
+        cadeia_dominial_completa=safe_get_list(resumo_data, "cadeia_dominial_completa"),
+        restricoes_vigentes=safe_get_list(resumo_data, "restricoes_vigentes"),
+        restricoes_baixadas=safe_get_list(resumo_data, "restricoes_baixadas"),
+        estado_ms_direitos=estado_ms_direitos
+    )
+
+    return AnalysisResult(
+        arquivo=arquivo,
+        matriculas_encontradas=matriculas_obj,
+        matricula_principal=parsed.get("matricula_principal"),
+        matriculas_confrontantes=parsed.get("matriculas_confrontantes", []),
+        lotes_confrontantes=lotes_confrontantes_obj,
+        matriculas_nao_confrontantes=parsed.get("matriculas_nao_confrontantes", []),
+        lotes_sem_matricula=parsed.get("lotes_sem_matricula", []),
+        confrontacao_completa=parsed.get("confrontacao_completa"),
+        proprietarios_identificados=parsed.get("proprietarios_identificados", {}),
+        resumo_analise=resumo_analise,
+        confidence=parsed.get("confidence"),
+        reasoning=parsed.get("reasoning", ""),
+        raw_json=raw,
+        parcial=bool(parsed.get("parcial")),
+    )
+
+
+@span("interpretacao")
+def parse_vision_content(data: Dict) -> Tuple[Dict, bool]:
+    """Extrai e interpreta o JSON do conteúdo da resposta. Retorna (parsed, parse_ok)."""
+    # Acesso seguro ao conteúdo da resposta
+    try:
+        if not data.get("choices") or len(data["choices"]) == 0:
+            raise IndexError("Lista 'choices' vazia na resposta da API")
+        
+        choice = data["choices"][0]
+        if not choice.get("message"):
+            raise KeyError("Campo 'message' não encontrado na resposta")
+            
+        content = choice["message"].get("content", "")
+        
+        if content:
+            logger.debug("🔍 Conteúdo recebido: %d chars (finish_reason=%s) - início: %.500s",
+                         len(content), choice.get('finish_reason'), content)
+        else:
+            logger.warning("⚠️ Conteúdo da resposta vazio (finish_reason=%s)", choice.get('finish_reason'))
+            
+    except (IndexError, KeyError, TypeError) as e:
+        logger.error("❌ Erro ao acessar conteúdo da resposta: %s (estrutura: %s)", e,
+                     list(data.keys()) if isinstance(data, dict) else type(data))
+        raise RuntimeError(f"Estrutura de resposta inválida da API: {e}")
+    
+    try:
+        # Ignora marcadores de código markdown e texto em volta do JSON
+        parsed = parse_json_response(content)
+        parse_ok = isinstance(parsed, dict)
+        logger.debug("✅ JSON interpretado (%d chars): %s", len(content),
+                     list(parsed.keys()) if isinstance(parsed, dict) else type(parsed))
+    except json.JSONDecodeError as e:
+        parse_ok = False
+        logger.debug("📄 Conteúdo completo da resposta:\n%s", content)
+        salvaged = salvage_analysis_response(content)
+        if salvaged is not None:
+            logger.warning("✂️ JSON da visão incompleto (%s, finish_reason=%s): resultado parcial com %d matrícula(s)",
+                           e, choice.get('finish_reason'), len(safe_get_list(salvaged, "matriculas_encontradas")))
+            return salvaged, parse_ok
+        logger.error("❌ Erro ao fazer parse do JSON da visão: %s", e)
+        parsed = {
+            "matriculas_encontradas": [],
+            "matricula_principal": None,
+            "matriculas_confrontantes": [],
+            "lotes_confrontantes": [],
+            "matriculas_nao_confrontantes": [],
+            "lotes_sem_matricula": [],
+            "confrontacao_completa": None,
+            "proprietarios_identificados": {},
+            "confidence": None,
+            "reasoning": f"Erro de parsing JSON da análise visual: {content[:500]}..."
+        }
+    return parsed, parse_ok
+
+
+@span("interpretacao")
+def parse_text_content(content: str) -> Tuple[Dict, bool]:
+    """Interpreta o JSON retornado pelo modelo de texto. Retorna (parsed, parse_ok)."""
+    try:
+        parsed = parse_json_response(content)
+        if isinstance(parsed, dict):
+            return parsed, True
+    except json.JSONDecodeError as e:
+        salvaged = salvage_analysis_response(content)
+        if salvaged is not None:
+            logger.warning("✂️ JSON da análise textual incompleto (%s): resultado parcial com %d matrícula(s)",
+                           e, len(safe_get_list(salvaged, "matriculas_encontradas")))
+            return salvaged, False
+        logger.error("❌ Erro ao fazer parse do JSON da análise textual: %s", e)
+    return {
+        "matriculas_encontradas": [],
+        "matricula_principal": None,
+        "matriculas_confrontantes": [],
+        "lotes_confrontantes": [],
+        "matriculas_nao_confrontantes": [],
+        "lotes_sem_matricula": [],
+        "confrontacao_completa": None,
+        "proprietarios_identificados": {},
+        "confidence": None,
+        "reasoning": f"Erro de parsing JSON da análise textual: {content[:500]}..."
+    }, False
@@ -0,0 +1,224 @@
+"""
+Métricas de execução do Sistema de Análise de Matrículas
+
+Cada análise abre um RunMetrics com ``track_run``, guardado num ContextVar: as
+etapas do pipeline são medidas com ``span("etapa")`` (gerenciador de contexto
+ou decorador) e o cliente HTTP registra bytes e tokens sem que o objeto precise
+ser passado de função em função. Fora de uma execução rastreada, span() e os
+registros não fazem nada.
+
+O contexto acompanha ``asyncio`` e ``asyncio.to_thread`` automaticamente; em
+ThreadPoolExecutor use ``submit_in_context``. Etapas executadas em paralelo
+somam o tempo de cada thread, e algumas se aninham (a chamada "http" da
+segmentação também conta em "segmentacao").
+
+Exportação: ``to_json_line``/``append_jsonl`` (uma linha por arquivo) e
+``prometheus_text``/``write_prometheus`` (formato texto do Prometheus, para o
+textfile collector do node_exporter). Com METRICS_JSONL definido, toda análise
+concluída é acrescentada ao arquivo indicado.
+"""
+
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Iterator, Iterable
+
+METRICS_JSONL = os.environ.get("METRICS_JSONL", "")
+
+# Campos de "usage" da OpenRouter somados por execução
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+_current: contextvars.ContextVar[Optional["RunMetrics"]] = contextvars.ContextVar("run_metrics", default=None)
+_jsonl_lock = threading.Lock()
+
+
+class RunMetrics:
+    def __init__(self, arquivo: str = ""):
+        """
+        Tempos, bytes e tokens de uma análise
+
+        Args:
+            arquivo: Nome do arquivo analisado
+        """
+        self.arquivo = arquivo
+        self.etapas: Dict[str, Dict[str, float]] = {}
+        self.requisicoes = 0
+        self.tentativas = 0
+        self.bytes_enviados = 0
+        self.bytes_recebidos = 0
+        self.tokens: Dict[str, int] = {field: 0 for field in USAGE_FIELDS}
+        self.custo = 0.0
+        # Degraus de qualidade pulados por orçamento de tokens (ver TokenBudget)
+        self.degrau_imagem = 0
+        self.total_s = 0.0
+        self.iniciado_em = time.time()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            stage = self.etapas.setdefault(name, {"segundos": 0.0, "vezes": 0})
+            stage["segundos"] += seconds
+            stage["vezes"] += 1
+
+    def add_request(self, sent: int, received: int, attempts: int = 1):
+        with self._lock:
+            self.requisicoes += 1
+            self.tentativas += attempts
+            self.bytes_enviados += sent
+            self.bytes_recebidos += received
+
+    def add_received(self, received: int):
+        """Bytes lidos depois da requisição registrada (respostas em streaming)."""
+        with self._lock:
+            self.bytes_recebidos += received
+
+    def add_usage(self, usage: Optional[Dict]):
+        if not isinstance(usage, dict):
+            return
+        with self._lock:
+            for field in USAGE_FIELDS:
+                value = usage.get(field)
+                if isinstance(value, (int, float)):
+                    self.tokens[field] += int(value)
+            cost = usage.get("cost")
+            if isinstance(cost, (int, float)):
+                self.custo += float(cost)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "arquivo": self.arquivo,
+                "iniciado_em": round(self.iniciado_em, 3),
+                "total_s": round(self.total_s, 4),
+                "etapas": {name: {"segundos": round(stage["segundos"], 4), "vezes": int(stage["vezes"])}
+                           for name, stage in self.etapas.items()},
+                "requisicoes": self.requisicoes,
+                "tentativas": self.tentativas,
+                "bytes_enviados": self.bytes_enviados,
+                "bytes_recebidos": self.bytes_recebidos,
+                "tokens": dict(self.tokens),
+                "custo": round(self.custo, 6),
+                "degrau_imagem": self.degrau_imagem,
+            }
+
+
+def current_metrics() -> Optional[RunMetrics]:
+    """Métricas da execução em andamento neste contexto (ou None)."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Mede o bloco (ou a função decorada) como etapa `name` da execução atual."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def track_run(arquivo: str) -> Iterator[RunMetrics]:
+    """Abre as métricas de uma análise; ao final grava em METRICS_JSONL, se configurado."""
+    metrics = RunMetrics(arquivo)
+    token = _current.set(metrics)
+    started = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.total_s = time.perf_counter() - started
+        _current.reset(token)
+        if METRICS_JSONL:
+            try:
+                append_jsonl(METRICS_JSONL, [metrics.to_dict()])
+            except OSError:
+                pass
+
+
+def record_usage(usage: Optional[Dict]):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_usage(usage)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit levando o contexto atual (métricas) para a thread do pool."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# =========================
+# Exportação
+# =========================
+def to_json_line(metrics: Dict) -> str:
+    return json.dumps(metrics, ensure_ascii=False, separators=(",", ":"))
+
+
+def append_jsonl(path: str, runs: Iterable[Dict]):
+    """Acrescenta uma linha JSON por execução (seguro entre threads)."""
+    lines = "".join(to_json_line(run) + "\n" for run in runs)
+    with _jsonl_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text(runs: List[Dict], prefix: str = "analisador") -> str:
+    """Agrega as execuções em contadores no formato texto do Prometheus."""
+    stage_seconds: Dict[str, float] = {}
+    stage_count: Dict[str, int] = {}
+    tokens = {field: 0 for field in USAGE_FIELDS}
+    cost = 0.0
+    totals = {"requisicoes": 0, "tentativas": 0, "bytes_enviados": 0, "bytes_recebidos": 0}
+    total_seconds = 0.0
+    for run in runs:
+        total_seconds += run.get("total_s", 0.0)
+        for name, stage in run.get("etapas", {}).items():
+            stage_seconds[name] = stage_seconds.get(name, 0.0) + stage.get("segundos", 0.0)
+            stage_count[name] = stage_count.get(name, 0) + stage.get("vezes", 0)
+        for field in USAGE_FIELDS:
+            tokens[field] += run.get("tokens", {}).get(field, 0)
+        cost += run.get("custo", 0.0)
+        for key in totals:
+            totals[key] += run.get(key, 0)
+
+    lines: List[str] = []
+
+    def metric(name: str, help_text: str, samples: List[tuple]):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape_label(str(val))}"' for key, val in labels)
+            lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+
+    metric("arquivos_total", "Arquivos analisados.", [((), len(runs))])
+    metric("analise_segundos_total", "Tempo total das análises.", [((), round(total_seconds, 4))])
+    metric("etapa_segundos_total", "Tempo acumulado por etapa do pipeline.",
+           [((("etapa", name),), round(value, 4)) for name, value in sorted(stage_seconds.items())])
+    metric("etapa_execucoes_total", "Execuções de cada etapa do pipeline.",
+           [((("etapa", name),), stage_count[name]) for name in sorted(stage_count)])
+    metric("requisicoes_total", "Requisições concluídas à OpenRouter.", [((), totals["requisicoes"])])
+    metric("tentativas_total", "Tentativas HTTP, incluindo retentativas.", [((), totals["tentativas"])])
+    metric("bytes_enviados_total", "Bytes enviados nos corpos das requisições.", [((), totals["bytes_enviados"])])
+    metric("bytes_recebidos_total", "Bytes recebidos nas respostas.", [((), totals["bytes_recebidos"])])
+    metric("tokens_total", "Tokens informados no campo usage das respostas.",
+           [((("tipo", field.replace("_tokens", "")),), tokens[field]) for field in USAGE_FIELDS])
+    metric("custo_creditos_total", "Custo informado pela OpenRouter (créditos).", [((), round(cost, 6))])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, runs: List[Dict]):
+    """Grava o arquivo .prom de forma atômica (o coletor nunca lê um arquivo pela metade)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(runs))
+    os.replace(tmp_path, path)
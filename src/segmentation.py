@@ -0,0 +1,294 @@
+"""Segmentação de PDFs com várias certidões em intervalos de páginas por matrícula."""
+
+import os
+import re
+import asyncio
+import logging
+from typing import List, Dict, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+try:
+    from .settings import env_int, SEGMENT_MODEL
+    from .normalization import matricula_key, safe_get_list
+    from .json_repair import parse_json_response
+    from .image_codecs import fit_image, encode_image, to_data_url
+    from .rendering import MAX_RENDER_DPI, prepare_slot
+    from .chunking import MAP_REDUCE_PAGE_THRESHOLD, plan_page_chunks
+    from .openrouter_api import call_openrouter_vision, call_openrouter_vision_async
+    from .openrouter_client import AsyncOpenRouterClient
+    from .log_config import get_logger
+    from .run_metrics import span
+    from .cancellation import AnalysisCancelledError, check_cancelled
+except ImportError:
+    from settings import env_int, SEGMENT_MODEL
+    from normalization import matricula_key, safe_get_list
+    from json_repair import parse_json_response
+    from image_codecs import fit_image, encode_image, to_data_url
+    from rendering import MAX_RENDER_DPI, prepare_slot
+    from chunking import MAP_REDUCE_PAGE_THRESHOLD, plan_page_chunks
+    from openrouter_api import call_openrouter_vision, call_openrouter_vision_async
+    from openrouter_client import AsyncOpenRouterClient
+    from log_config import get_logger
+    from run_metrics import span
+    from cancellation import AnalysisCancelledError, check_cancelled
+
+logger = get_logger("segmentacao")
+
+# "texto" (padrão) lê só a camada de texto; "auto" também faz, em PDFs digitalizados,
+# uma chamada de visão com os cabeçalhos das páginas; "off" desativa
+SEGMENTATION_MODE = os.environ.get("SEGMENTATION_MODE", "texto").strip().lower()
+SEGMENT_MIN_PAGES = env_int("SEGMENT_MIN_PAGES", 4)
+SEGMENT_MAX_CHUNKS = env_int("SEGMENT_MAX_CHUNKS", 8)  # acima disso, segmentos vizinhos são agrupados
+
+# Cabeçalho típico das certidões: "MATRÍCULA Nº 12.345", "Matrícula: 12345 - Ficha 01"
+_MATRICULA_HEADER_RE = re.compile(
+    r"matr[íi]cula\s*(?:n[º°o]?\.?|n[úu]mero|no\.?)?\s*[:\-–]?\s*(\d{1,3}(?:\.\d{3})+|\d{2,7})\b",
+    re.IGNORECASE,
+)
+HEADER_FRACTION = 0.3       # parte superior da página onde o cabeçalho é procurado
+MIN_TEXT_LAYER_CHARS = 50   # abaixo disso a página é tratada como imagem digitalizada
+_SEGMENT_HEADER_EDGE = 1024
+_SEGMENT_HEADER_QUALITY = 50
+
+SEGMENT_PROMPT = (
+    "Cada imagem é a faixa superior (cabeçalho) de uma página de um PDF, na ordem. "
+    "Para cada uma, informe o número da matrícula que aparece no cabeçalho, ou null se não houver. "
+    'Responda APENAS JSON: {"paginas": [{"pagina": 1, "matricula": "12345"}, {"pagina": 2, "matricula": null}]}'
+)
+SEGMENT_SYSTEM_PROMPT = "Você identifica números de matrícula em cabeçalhos de certidões de registro de imóveis."
+
+
+def header_matricula(text: str) -> Optional[str]:
+    """Número da matrícula encontrado no texto do cabeçalho, ou None."""
+    match = _MATRICULA_HEADER_RE.search(text or "")
+    return match.group(1) if match else None
+
+
+def _render_page_header(page: "fitz.Page") -> str:
+    """Faixa superior da página em tons de cinza e baixa resolução, como data URL."""
+    rect = page.rect
+    clip = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * HEADER_FRACTION)
+    zoom = min(MAX_RENDER_DPI / 72.0, _SEGMENT_HEADER_EDGE / max(1.0, rect.width))
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    try:
+        codec, data = encode_image(fit_image(img, _SEGMENT_HEADER_EDGE), _SEGMENT_HEADER_QUALITY)
+        return to_data_url(codec.mime, data)
+    finally:
+        img.close()
+
+
+def _render_page_headers(file_path: str) -> List[str]:
+    """Faixas de cabeçalho de todas as páginas, para a pré-passagem de segmentação."""
+    doc = fitz.open(file_path)
+    try:
+        headers = []
+        for page in doc:
+            check_cancelled()
+            headers.append(_render_page_header(page))
+    finally:
+        doc.close()
+    logger.info("🔎 Segmentação visual: %d cabeçalho(s), %dKB", len(headers), sum(len(h) for h in headers) // 1024)
+    return headers
+
+
+def _parse_header_labels(data: Dict, page_count: int) -> List[Optional[str]]:
+    """Matrícula de cada página a partir da resposta da pré-passagem de segmentação."""
+    content = data["choices"][0]["message"].get("content") or ""
+    parsed = parse_json_response(content)
+    labels: List[Optional[str]] = [None] * page_count
+    for item in safe_get_list(parsed, "paginas"):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("pagina")) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < len(labels) and item.get("matricula"):
+            labels[index] = str(item["matricula"]).strip()
+    return labels
+
+
+def _vision_header_labels(file_path: str, model: str, api_key: Optional[str]) -> List[Optional[str]]:
+    """Pré-passagem barata: pergunta ao modelo o número da matrícula no cabeçalho de cada página."""
+    headers = _render_page_headers(file_path)
+    data = call_openrouter_vision(
+        model=model,
+        system_prompt=SEGMENT_SYSTEM_PROMPT,
+        user_prompt=SEGMENT_PROMPT,
+        images_base64=headers,
+        temperature=0.0,
+        max_tokens=4000,
+        api_key=api_key
+    )
+    return _parse_header_labels(data, len(headers))
+
+
+async def _vision_header_labels_async(client: AsyncOpenRouterClient, file_path: str, model: str,
+                                      api_key: Optional[str],
+                                      prepare_semaphore: Optional[asyncio.Semaphore] = None) -> List[Optional[str]]:
+    """Versão assíncrona de _vision_header_labels."""
+    async with prepare_slot(prepare_semaphore):
+        headers = await asyncio.to_thread(_render_page_headers, file_path)
+    data = await call_openrouter_vision_async(
+        client, model=model, system_prompt=SEGMENT_SYSTEM_PROMPT, user_prompt=SEGMENT_PROMPT,
+        images_base64=headers, temperature=0.0, max_tokens=4000, api_key=api_key
+    )
+    return _parse_header_labels(data, len(headers))
+
+
+def segments_from_labels(labels: List[Optional[str]]) -> List[Tuple[Tuple[int, int], Optional[str]]]:
+    """Agrupa páginas consecutivas por matrícula: [((início, fim), número)], base 0 e fim exclusivo."""
+    segments: List[Tuple[Tuple[int, int], Optional[str]]] = []
+    start, current_key, current_label = 0, None, None
+    for index, label in enumerate(labels):
+        key = matricula_key(label) if label else ""
+        if not key:
+            continue
+        if current_key is not None and key != current_key:
+            segments.append(((start, index), current_label))
+            start = index
+        if key != current_key:
+            current_key, current_label = key, label
+    if labels:
+        segments.append(((start, len(labels)), current_label))
+    return segments
+
+
+def _text_header_labels(file_path: str) -> Tuple[List[Optional[str]], int]:
+    """Matrícula do cabeçalho de cada página pela camada de texto e quantas páginas têm texto."""
+    doc = fitz.open(file_path)
+    try:
+        labels: List[Optional[str]] = []
+        text_pages = 0
+        for page in doc:
+            if len(page.get_text("text").strip()) >= MIN_TEXT_LAYER_CHARS:
+                text_pages += 1
+            rect = page.rect
+            header = page.get_text("text", clip=fitz.Rect(rect.x0, rect.y0, rect.x1,
+                                                          rect.y0 + rect.height * HEADER_FRACTION))
+            labels.append(header_matricula(header))
+    finally:
+        doc.close()
+    return labels, text_pages
+
+
+def _segments_without_vision(labels: List[Optional[str]],
+                             text_pages: int) -> Optional[Tuple[List[Tuple[Tuple[int, int], Optional[str]]], str]]:
+    """Segmentação que dispensa a pré-passagem de visão, ou None se ela for necessária."""
+    if text_pages * 2 >= len(labels):
+        return segments_from_labels(labels), "texto"
+    if SEGMENTATION_MODE != "auto":
+        return [((0, len(labels)), None)], "nenhum"
+    return None
+
+
+def detect_matricula_segments(file_path: str, model: str = None, api_key: str = None) -> Tuple[List[Tuple[Tuple[int, int], Optional[str]]], str]:
+    """
+    Segmenta o PDF por matrícula pela camada de texto ou, com SEGMENTATION_MODE=auto,
+    por uma chamada de visão com os cabeçalhos. Retorna (segmentos, método).
+    """
+    labels, text_pages = _text_header_labels(file_path)
+    resolved = _segments_without_vision(labels, text_pages)
+    if resolved is not None:
+        return resolved
+    try:
+        return segments_from_labels(_vision_header_labels(file_path, model or SEGMENT_MODEL, api_key)), "visao"
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        logger.warning("⚠️ Segmentação visual indisponível: %s", e)
+        return [((0, len(labels)), None)], "nenhum"
+
+
+async def detect_matricula_segments_async(client: AsyncOpenRouterClient, file_path: str, model: str = None,
+                                          api_key: str = None,
+                                          prepare_semaphore: Optional[asyncio.Semaphore] = None
+                                          ) -> Tuple[List[Tuple[Tuple[int, int], Optional[str]]], str]:
+    """Versão assíncrona de detect_matricula_segments (pré-passagem de visão pelo cliente assíncrono)."""
+    labels, text_pages = await asyncio.to_thread(_text_header_labels, file_path)
+    resolved = _segments_without_vision(labels, text_pages)
+    if resolved is not None:
+        return resolved
+    try:
+        return segments_from_labels(await _vision_header_labels_async(
+            client, file_path, model or SEGMENT_MODEL, api_key, prepare_semaphore)), "visao"
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        logger.warning("⚠️ Segmentação visual indisponível: %s", e)
+        return [((0, len(labels)), None)], "nenhum"
+
+
+def _pack_segments(segments: List[Tuple[Tuple[int, int], Optional[str]]],
+                   max_chunks: int) -> List[Tuple[Tuple[int, int], Optional[str]]]:
+    """Agrupa segmentos vizinhos, sem quebrá-los, quando há mais que max_chunks."""
+    if len(segments) <= max_chunks:
+        return segments
+    total = segments[-1][0][1] - segments[0][0][0]
+    target = -(-total // max_chunks)
+    packed: List[Tuple[Tuple[int, int], Optional[str]]] = []
+    for (start, end), label in segments:
+        if packed:
+            (p_start, p_end), p_label = packed[-1]
+            if end - p_start <= target:
+                labels = ", ".join(l for l in (p_label, label) if l) or None
+                packed[-1] = ((p_start, end), labels)
+                continue
+        packed.append(((start, end), label))
+    return packed
+
+
+def _should_segment(total_pages: int) -> bool:
+    return SEGMENTATION_MODE != "off" and total_pages >= SEGMENT_MIN_PAGES
+
+
+def _plan_from_segments(segments: Optional[List[Tuple[Tuple[int, int], Optional[str]]]], method: Optional[str],
+                        total_pages: int) -> Tuple[List[Tuple[int, int]], List[Optional[str]], Dict]:
+    """Blocos a partir dos segmentos detectados (None = segmentação não executada)."""
+    info: Dict = {}
+    if segments is not None:
+        info = {"metodo": method, "segmentos": [[s + 1, e, label] for (s, e), label in segments]}
+        if len(segments) > 1:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("🗂️ %d matrícula(s) detectada(s) (%s): %s", len(segments), method,
+                            ", ".join(f"{label or '?'} (págs. {s + 1}-{e})" for (s, e), label in segments))
+            chunks, labels = [], []
+            for (start, end), label in _pack_segments(segments, SEGMENT_MAX_CHUNKS):
+                for sub_start, sub_end in plan_page_chunks(end - start):
+                    chunks.append((start + sub_start, start + sub_end))
+                    labels.append(label)
+            return chunks, labels, info
+    if MAP_REDUCE_PAGE_THRESHOLD and total_pages > MAP_REDUCE_PAGE_THRESHOLD:
+        chunks = plan_page_chunks(total_pages)
+        return chunks, [None] * len(chunks), info
+    return [], [], info
+
+
+@span("segmentacao")
+def plan_document_chunks(file_path: str, total_pages: int,
+                         api_key: str = None) -> Tuple[List[Tuple[int, int]], List[Optional[str]], Dict]:
+    """
+    Divide o documento por matrícula ou, acima de MAP_REDUCE_PAGE_THRESHOLD páginas,
+    em blocos fixos. Retorna (blocos, matrícula de cada bloco, informações); blocos
+    vazio = análise única.
+    """
+    segments, method = None, None
+    if _should_segment(total_pages):
+        segments, method = detect_matricula_segments(file_path, api_key=api_key)
+    return _plan_from_segments(segments, method, total_pages)
+
+
+async def plan_document_chunks_async(client: AsyncOpenRouterClient, file_path: str, total_pages: int,
+                                     api_key: str = None,
+                                     prepare_semaphore: Optional[asyncio.Semaphore] = None
+                                     ) -> Tuple[List[Tuple[int, int]], List[Optional[str]], Dict]:
+    """Versão assíncrona de plan_document_chunks."""
+    with span("segmentacao"):
+        segments, method = None, None
+        if _should_segment(total_pages):
+            segments, method = await detect_matricula_segments_async(client, file_path, api_key=api_key,
+                                                                     prepare_semaphore=prepare_semaphore)
+        return _plan_from_segments(segments, method, total_pages)
@@ -0,0 +1,31 @@
+"""Configuração compartilhada do pipeline de análise (modelos, API key e leitura do ambiente)."""
+
+import os
+
+from dotenv import load_dotenv
+
+# Carrega .env
+load_dotenv()
+
+
+DEFAULT_MODEL = os.environ.get("OPENROUTER_MODEL", "google/gemini-2.5-pro")
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "")
+FULL_REPORT_MODEL = "google/gemini-2.5-flash"
+SEGMENT_MODEL = os.environ.get("SEGMENT_MODEL", FULL_REPORT_MODEL)
+
+
+def env_int(name: str, default: int, minimum: int = 1) -> int:
+    """Lê inteiro de variável de ambiente, aplicando padrão e valor mínimo."""
+    try:
+        value = int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, value)
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Lê variável de ambiente booleana (1/true/sim/yes)."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "sim", "yes", "on")
@@ -0,0 +1,271 @@
+"""Caminho rápido: PDFs com camada de texto completa são analisados por um modelo de texto."""
+
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+try:
+    from .settings import env_int, env_flag
+    from .prompts import SYSTEM_PROMPT, AGGREGATE_PROMPT
+    from .segmentation import header_matricula, segments_from_labels
+    from .chunking import (MAP_REDUCE_WORKERS, PARTIAL_CHUNK_NOTE, chunk_user_prompt, merge_chunk_results,
+                           reduce_user_prompt, finalize_map_reduce)
+    from .openrouter_api import call_openrouter_text, call_openrouter_text_async
+    from .openrouter_client import AsyncOpenRouterClient
+    from .results import parse_text_content
+    from .log_config import get_logger
+    from .run_metrics import span, submit_in_context
+    from .cancellation import AnalysisCancelledError, check_cancelled
+except ImportError:
+    from settings import env_int, env_flag
+    from prompts import SYSTEM_PROMPT, AGGREGATE_PROMPT
+    from segmentation import header_matricula, segments_from_labels
+    from chunking import (MAP_REDUCE_WORKERS, PARTIAL_CHUNK_NOTE, chunk_user_prompt, merge_chunk_results,
+                          reduce_user_prompt, finalize_map_reduce)
+    from openrouter_api import call_openrouter_text, call_openrouter_text_async
+    from openrouter_client import AsyncOpenRouterClient
+    from results import parse_text_content
+    from log_config import get_logger
+    from run_metrics import span, submit_in_context
+    from cancellation import AnalysisCancelledError, check_cancelled
+
+logger = get_logger("texto")
+
+TEXT_FAST_PATH = env_flag("TEXT_FAST_PATH", True)
+TEXT_SINGLE_CALL_CHARS = env_int("TEXT_SINGLE_CALL_CHARS", 120000)  # acima disso, blocos de texto
+TEXT_MIN_PAGE_CHARS = 200          # páginas com menos texto só passam se não tiverem imagens
+TEXT_MAX_GARBAGE_RATIO = 0.05      # caracteres de controle/substituição (fonte sem ToUnicode)
+TEXT_MIN_WORD_RATIO = 0.8          # fração mínima de palavras "legíveis"
+TEXT_MAX_IMAGE_COVERAGE = 0.5      # página coberta por imagem = digitalizada (camada de OCR)
+
+_TEXT_WORD_RE = re.compile(r"[^\W\d_]+|\d+(?:[.,/\-]\d+)*[ºª°]?|[^\W\d_]*\d+[^\W\d_]*", re.UNICODE)
+_TEXT_STRIP = ".,;:!?()[]{}\"'«»“”‘’-–—/\\|*"
+
+
+def page_text_quality(page: "fitz.Page") -> Tuple[str, Optional[str]]:
+    """Texto da página e o motivo pelo qual ele não substitui a imagem (None se substitui)."""
+    text = page.get_text("text")
+    stripped = text.strip()
+    area = abs(page.rect) or 1.0
+    image_area = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+
+    if image_area / area > TEXT_MAX_IMAGE_COVERAGE:
+        return text, "página digitalizada"
+    if len(stripped) < TEXT_MIN_PAGE_CHARS:
+        # Página em branco ou quase: nada se perde; com imagens, o conteúdo pode estar nelas
+        return text, ("pouco texto e imagens na página" if image_area > 0 else None)
+
+    garbage = sum(1 for ch in stripped if ch == "\ufffd" or (not ch.isprintable() and not ch.isspace()))
+    if garbage / len(stripped) > TEXT_MAX_GARBAGE_RATIO:
+        return text, "caracteres ilegíveis na camada de texto"
+
+    tokens = [t.strip(_TEXT_STRIP) for t in stripped.split()]
+    tokens = [t for t in tokens if t]
+    readable = sum(1 for t in tokens if _TEXT_WORD_RE.fullmatch(t))
+    if tokens and readable / len(tokens) < TEXT_MIN_WORD_RATIO:
+        return text, "texto com muitas palavras ilegíveis"
+    return text, None
+
+
+@span("camada_texto")
+def extract_text_layer(file_path: str) -> Optional[List[str]]:
+    """Texto de cada página se TODAS tiverem camada de texto de boa qualidade; senão None."""
+    if not file_path.lower().endswith(".pdf"):
+        return None
+    try:
+        doc = fitz.open(file_path)
+    except Exception as e:
+        logger.warning("⚠️ Não foi possível ler a camada de texto: %s", e)
+        return None
+    try:
+        texts = []
+        for index, page in enumerate(doc, 1):
+            check_cancelled()
+            text, reason = page_text_quality(page)
+            if reason:
+                logger.info("🖼️ Camada de texto insuficiente (página %d: %s) - usando análise visual", index, reason)
+                return None
+            texts.append(text)
+    finally:
+        doc.close()
+    if not any(t.strip() for t in texts):
+        return None
+    return texts
+
+
+def _join_page_texts(page_texts: List[str], first_page: int = 1) -> str:
+    return "\n\n".join(f"=== Página {first_page + i} ===\n{text.strip()}" for i, text in enumerate(page_texts))
+
+
+def plan_text_chunks(page_texts: List[str], max_chars: int) -> List[Tuple[int, int]]:
+    """Blocos de até max_chars caracteres, começando um novo onde o cabeçalho indica outra matrícula."""
+    labels = [header_matricula(text[:400]) for text in page_texts]
+    boundaries = {start for (start, _), _label in segments_from_labels(labels)}
+    chunks: List[Tuple[int, int]] = []
+    start, size = 0, 0
+    for index, text in enumerate(page_texts):
+        length = len(text)
+        if index > start and (size + length > max_chars or index in boundaries):
+            chunks.append((start, index))
+            start, size = index, 0
+        size += length
+    if page_texts:
+        chunks.append((start, len(page_texts)))
+    return chunks
+
+
+def _text_user_prompt(page_texts: List[str]) -> str:
+    """Prompt da chamada única com o texto de todas as páginas."""
+    return AGGREGATE_PROMPT + "\n\nTEXTO:\n" + _join_page_texts(page_texts)
+
+
+def _text_chunk_prompt(page_texts: List[str], chunks: List[Tuple[int, int]], index: int) -> str:
+    """Prompt do bloco `index` da análise de texto longo."""
+    start, end = chunks[index]
+    return (chunk_user_prompt(index, chunks, len(page_texts))
+            + "\n\nTEXTO:\n" + _join_page_texts(page_texts[start:end], start + 1))
+
+
+def _parse_text_chunk(content: str) -> Dict:
+    """Interpreta a resposta de um bloco de texto; JSON inválido sem nada aproveitável é falha do bloco."""
+    parsed, parse_ok = parse_text_content(content)
+    if not parse_ok and not parsed.get("parcial"):
+        raise RuntimeError("JSON inválido na resposta do bloco")
+    return parsed
+
+
+def analyze_text_with_llm(model: str, page_texts: List[str], api_key: str = None) -> Tuple[Dict, bool]:
+    """
+    Analisa o documento pela camada de texto: chamada única até TEXT_SINGLE_CALL_CHARS,
+    senão blocos consolidados como na análise em blocos. Retorna (parsed, parse_ok).
+    """
+    total_chars = sum(len(t) for t in page_texts)
+    logger.info("📝 Camada de texto: %d página(s), %d caracteres - dispensando imagens", len(page_texts), total_chars)
+    info = {"paginas": len(page_texts), "caracteres": total_chars}
+
+    if total_chars <= TEXT_SINGLE_CALL_CHARS:
+        content = call_openrouter_text(
+            model=model,
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=_text_user_prompt(page_texts),
+            temperature=0.0,
+            max_tokens=32000,
+            api_key=api_key
+        )
+        parsed, parse_ok = parse_text_content(content)
+        parsed["analise_texto"] = info
+        return parsed, parse_ok
+
+    chunks = plan_text_chunks(page_texts, TEXT_SINGLE_CALL_CHARS // 2)
+    logger.info("🧩 Texto longo em %d bloco(s)", len(chunks))
+
+    def extract(index: int) -> Dict:
+        content = call_openrouter_text(
+            model=model,
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=_text_chunk_prompt(page_texts, chunks, index),
+            temperature=0.0,
+            max_tokens=16000,
+            api_key=api_key
+        )
+        return _parse_text_chunk(content)
+
+    partials: List[Optional[Dict]] = [None] * len(chunks)
+    failures: List[str] = []
+    with ThreadPoolExecutor(max_workers=min(MAP_REDUCE_WORKERS, len(chunks)), thread_name_prefix="texto") as executor:
+        futures = [submit_in_context(executor, extract, i) for i in range(len(chunks))]
+        for i, future in enumerate(futures):
+            start, end = chunks[i]
+            try:
+                partials[i] = future.result()
+                if partials[i].get("parcial"):
+                    failures.append(f"págs. {start + 1}-{end}: {PARTIAL_CHUNK_NOTE}")
+            except AnalysisCancelledError:
+                continue
+            except Exception as e:
+                failures.append(f"págs. {start + 1}-{end}: {e}")
+                logger.error("❌ Bloco de texto %d/%d (págs. %d-%d) falhou: %s", i + 1, len(chunks), start + 1, end, e)
+    check_cancelled()
+    if len(failures) == len(chunks):
+        raise RuntimeError(f"Todos os {len(chunks)} blocos de texto falharam: {failures[0]}")
+
+    merged = merge_chunk_results([p for p in partials if p is not None])
+    final_content, final_error = None, None
+    try:
+        final_content = call_openrouter_text(
+            model=model,
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=reduce_user_prompt(merged, chunks, failures),
+            temperature=0.0,
+            max_tokens=16000,
+            api_key=api_key
+        )
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        final_error = e
+    parsed, parse_ok = finalize_map_reduce(merged, chunks, failures, final_content, final_error)
+    parsed["analise_texto"] = info
+    return parsed, parse_ok
+
+
+async def analyze_text_with_llm_async(client: AsyncOpenRouterClient, model: str, page_texts: List[str],
+                                      api_key: str = None) -> Tuple[Dict, bool]:
+    """Versão assíncrona de analyze_text_with_llm (blocos disparados no event loop)."""
+    total_chars = sum(len(t) for t in page_texts)
+    logger.info("📝 Camada de texto: %d página(s), %d caracteres - dispensando imagens", len(page_texts), total_chars)
+    info = {"paginas": len(page_texts), "caracteres": total_chars}
+
+    if total_chars <= TEXT_SINGLE_CALL_CHARS:
+        content = await call_openrouter_text_async(
+            client, model=model, system_prompt=SYSTEM_PROMPT,
+            user_prompt=_text_user_prompt(page_texts),
+            temperature=0.0, max_tokens=32000, api_key=api_key
+        )
+        parsed, parse_ok = parse_text_content(content)
+        parsed["analise_texto"] = info
+        return parsed, parse_ok
+
+    chunks = plan_text_chunks(page_texts, TEXT_SINGLE_CALL_CHARS // 2)
+    logger.info("🧩 Texto longo em %d bloco(s)", len(chunks))
+
+    async def one(index: int) -> Dict:
+        content = await call_openrouter_text_async(
+            client, model=model, system_prompt=SYSTEM_PROMPT,
+            user_prompt=_text_chunk_prompt(page_texts, chunks, index),
+            temperature=0.0, max_tokens=16000, api_key=api_key
+        )
+        return _parse_text_chunk(content)
+
+    outcomes = await asyncio.gather(*(one(i) for i in range(len(chunks))), return_exceptions=True)
+    check_cancelled()
+    partials, failures = [], []
+    for i, ((start, end), outcome) in enumerate(zip(chunks, outcomes)):
+        if isinstance(outcome, BaseException):
+            failures.append(f"págs. {start + 1}-{end}: {outcome}")
+            logger.error("❌ Bloco de texto %d/%d (págs. %d-%d) falhou: %s", i + 1, len(chunks), start + 1, end, outcome)
+        else:
+            partials.append(outcome)
+            if outcome.get("parcial"):
+                failures.append(f"págs. {start + 1}-{end}: {PARTIAL_CHUNK_NOTE}")
+    if not partials:
+        raise RuntimeError(f"Todos os {len(chunks)} blocos de texto falharam: {failures[0]}")
+
+    merged = merge_chunk_results(partials)
+    final_content, final_error = None, None
+    try:
+        final_content = await call_openrouter_text_async(
+            client, model=model, system_prompt=SYSTEM_PROMPT,
+            user_prompt=reduce_user_prompt(merged, chunks, failures),
+            temperature=0.0, max_tokens=16000, api_key=api_key
+        )
+    except AnalysisCancelledError:
+        raise
+    except Exception as e:
+        final_error = e
+    parsed, parse_ok = finalize_map_reduce(merged, chunks, failures, final_content, final_error)
+    parsed["analise_texto"] = info
+    return parsed, parse_ok
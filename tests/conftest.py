@@ -0,0 +1,7 @@
+"""Configuração comum dos testes unitários (módulos de src importados sem pacote)."""
+
+import os
+import sys
+
+os.environ.setdefault("LOG_FILE_DISABLED", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,50 @@
+"""AsyncOpenRouterClient: falhas de transporte do httpx são repetidas e contam no disjuntor."""
+
+import asyncio
+
+import pytest
+
+from openrouter_client import AsyncOpenRouterClient, CircuitBreaker
+
+httpx = pytest.importorskip("httpx")
+
+
+async def _no_sleep(delay):
+    return None
+
+
+def _post(handler, breaker, max_retries=2):
+    async def run():
+        async with AsyncOpenRouterClient(max_retries=max_retries, sleep=_no_sleep,
+                                         circuit_breaker=breaker) as client:
+            await client._http.aclose()
+            client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            return await client.post("http://mock/api", {}, {"model": "m"})
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("error", [httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError])
+def test_transport_error_is_retried(error):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise error("conexão encerrada", request=request)
+        return httpx.Response(200, text="{}")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    assert _post(handler, breaker) == (200, "{}")
+    assert len(calls) == 2
+    assert not breaker.is_open
+
+
+def test_transport_error_after_retries_counts_as_failure():
+    def handler(request):
+        raise httpx.ReadError("conexão encerrada", request=request)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    with pytest.raises(ConnectionError):
+        _post(handler, breaker, max_retries=1)
+    assert breaker.is_open
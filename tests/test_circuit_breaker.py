@@ -0,0 +1,95 @@
+"""Transições do CircuitBreaker: fechado → aberto → meio-aberto (uma chamada de teste)."""
+
+import pytest
+
+from openrouter_client import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=60.0, clock=clock)
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_closed_until_threshold(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    assert breaker.before_call() is False
+    breaker.record_failure()
+    assert breaker.is_open
+
+
+def test_success_resets_consecutive_failures(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_open_rejects_calls(breaker):
+    _open(breaker)
+    with pytest.raises(CircuitOpenError, match="3 falhas"):
+        breaker.before_call()
+
+
+def test_half_open_allows_a_single_probe(breaker, clock):
+    _open(breaker)
+    clock.now += 60
+    assert not breaker.is_open
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError, match="chamada de teste"):
+        breaker.before_call()
+
+
+def test_probe_success_closes(breaker, clock):
+    _open(breaker)
+    clock.now += 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.before_call() is False
+    assert breaker.before_call() is False
+
+
+def test_probe_failure_reopens(breaker, clock):
+    _open(breaker)
+    clock.now += 60
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError, match="nova tentativa em 60s"):
+        breaker.before_call()
+    clock.now += 60
+    assert breaker.before_call() is True
+
+
+def test_guard_releases_probe_without_verdict(breaker, clock):
+    _open(breaker)
+    clock.now += 60
+    with pytest.raises(KeyError):
+        with breaker.guard():
+            raise KeyError("cancelada")
+    # Sem veredito o circuito segue meio-aberto e a próxima chamada testa de novo
+    with breaker.guard():
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+    assert breaker.before_call() is False
@@ -0,0 +1,91 @@
+"""Extração, reparo e aproveitamento do JSON das respostas do modelo."""
+
+import json
+
+import pytest
+
+from json_repair import find_json_span, parse_json_response, repair_json_response, salvage_analysis_response
+
+
+def _span_text(content):
+    start, end = find_json_span(content)
+    return content[start:end]
+
+
+def test_find_json_span_plain_object():
+    assert _span_text('{"a": 1}') == '{"a": 1}'
+
+
+def test_find_json_span_prose_around_object():
+    content = 'Segue a análise:\n{"a": {"b": "chave } dentro de texto"}}\nObrigado.'
+    assert json.loads(_span_text(content)) == {"a": {"b": "chave } dentro de texto"}}
+
+
+def test_find_json_span_prefers_json_fence():
+    content = 'Exemplo: ```\n{"x": 0}\n```\nResposta:\n```json\n{"a": 1}\n```'
+    assert _span_text(content) == '{"a": 1}'
+
+
+def test_find_json_span_truncated_object_runs_to_end():
+    content = '{"a": [1, 2'
+    assert find_json_span(content) == (0, len(content))
+
+
+def test_find_json_span_without_json():
+    assert find_json_span("sem nenhum objeto aqui") is None
+
+
+def test_parse_json_response_skips_invalid_candidate():
+    assert parse_json_response('Nota {1} antes.\n{"a": 1}') == {"a": 1}
+
+
+def test_parse_json_response_raises_like_json_loads():
+    with pytest.raises(json.JSONDecodeError):
+        parse_json_response('{"a": }')
+
+
+def test_repair_json_response_truncated_string():
+    value, path = repair_json_response('{"a": [{"b": 1}, {"b": "cor')
+    assert value == {"a": [{"b": 1}, {}]}
+    assert path == [None, "a", None]
+
+
+def test_repair_json_response_fenced_and_truncated():
+    value, path = repair_json_response('```json\n{"a": 1, "b": [true, nu')
+    assert value == {"a": 1, "b": [True]}
+    assert path == [None, "b"]
+
+
+def test_repair_json_response_complete_json_is_unchanged():
+    value, path = repair_json_response('{"a": [1, 2]}')
+    assert value == {"a": [1, 2]}
+    assert path == []
+
+
+def test_repair_json_response_nothing_to_recover():
+    assert repair_json_response("sem json") is None
+    assert repair_json_response('{"a') == ({}, [None])
+
+
+def test_salvage_drops_the_matricula_cut_midway():
+    content = (
+        '```json\n{"matricula_principal": "123", "matriculas_encontradas": ['
+        '{"numero": "123", "proprietarios": ["Ana"]}, {"numero": "456", "propri'
+    )
+    parsed = salvage_analysis_response(content)
+    assert parsed["parcial"] is True
+    assert [m["numero"] for m in parsed["matriculas_encontradas"]] == ["123"]
+    assert "1 matrícula(s)" in parsed["reasoning"]
+
+
+def test_salvage_keeps_complete_matriculas_when_cut_after_list():
+    content = '{"matriculas_encontradas": [{"numero": "1"}, {"numero": "2"}], "reasoning": "ok'
+    parsed = salvage_analysis_response(content)
+    assert [m["numero"] for m in parsed["matriculas_encontradas"]] == ["1", "2"]
+    assert parsed["parcial"] is True
+
+
+def test_salvage_rejects_empty_or_non_object():
+    assert salvage_analysis_response("{") is None
+    assert salvage_analysis_response("[1, 2") is None
+    assert salvage_analysis_response("nada") is None
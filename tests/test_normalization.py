@@ -0,0 +1,112 @@
+"""Normalização determinística do JSON do modelo (números, nomes, direções e tipos)."""
+
+import pytest
+
+from normalization import (normalize_analysis, normalize_direcao, normalize_matricula_numero, normalize_names,
+                           normalize_tipo)
+from results import MatriculaInfo, build_analysis_result
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("12345", "12345"),
+    ("Mat. nº 12.345", "12345"),
+    ("Matrícula 12 345", "12345"),
+    ("012345", "12345"),
+    ("12.345-a", "12345A"),
+    ("12345B", "12345B"),
+    (12345, "12345"),
+    ("r 4 - matrícula 555", "555"),
+])
+def test_normalize_matricula_numero(value, expected):
+    assert normalize_matricula_numero(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("R-3/12.345", "12345"),
+    ("Av.2-12.345", "12345"),
+    ("AV-12/7.001", "7001"),
+    ("R.1/12345", "12345"),
+])
+def test_normalize_matricula_numero_skips_act_numbers(value, expected):
+    assert normalize_matricula_numero(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "sem número", "R-3", "Av. 10"])
+def test_normalize_matricula_numero_without_number(value):
+    assert normalize_matricula_numero(value) is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("N", "norte"),
+    ("ao Norte", "norte"),
+    ("lado NORTE", "norte"),
+    ("SE", "sudeste"),
+    ("Fundo", "fundos"),
+    ("à direita", "direita"),
+    ("  lindeiro  ", "lindeiro"),
+    (None, None),
+])
+def test_normalize_direcao(value, expected):
+    assert normalize_direcao(value) == expected
+
+
+def test_normalize_direcao_keeps_common_words():
+    # "no"/"se" só são abreviação quando são o texto inteiro
+    assert normalize_direcao("se estende no fundo") == "fundos"
+
+
+def test_normalize_tipo():
+    assert normalize_tipo("Via Pública") == "via_publica"
+    assert normalize_tipo(" lote-vizinho ") == "lote_vizinho"
+    assert normalize_tipo(None) == "outros"
+
+
+def test_normalize_names_drops_case_and_accent_duplicates():
+    assert normalize_names(["José  da Silva", "JOSE DA SILVA", "Maria,", "", 3]) == ["José da Silva", "Maria"]
+    assert normalize_names("Ana") == ["Ana"]
+
+
+def test_normalize_analysis_merges_spellings_of_the_same_matricula():
+    parsed = {
+        "matricula_principal": "Mat. 1.234",
+        "matriculas_encontradas": [
+            {"numero": "1.234", "proprietarios": ["Ana"]},
+            {"numero": "matrícula nº 1234", "proprietarios": ["ANA", "Bruno"]},
+            {"numero": "R-2/5.678", "proprietarios": []},
+        ],
+        "matriculas_confrontantes": ["5.678", "5678", "Av.1-9.999"],
+        "proprietarios_identificados": {"1.234": ["Ana"], "1234": ["Bruno"]},
+        "lotes_confrontantes": [
+            {"identificador": " Lote  7 ", "tipo": "Via Pública", "matricula_anexada": "5.678", "direcao": "N"},
+        ],
+        "lotes_sem_matricula": ["Lote 9", "lote 9"],
+    }
+    data = normalize_analysis(parsed)
+
+    assert data["matricula_principal"] == "1234"
+    assert [m["numero"] for m in data["matriculas_encontradas"]] == ["1234", "5678"]
+    assert data["matriculas_encontradas"][0]["proprietarios"] == ["Ana", "Bruno"]
+    assert data["matriculas_confrontantes"] == ["5678", "9999"]
+    assert data["proprietarios_identificados"] == {"1234": ["Ana", "Bruno"]}
+    assert data["lotes_confrontantes"] == [
+        {"identificador": "Lote 7", "tipo": "via_publica", "matricula_anexada": "5678", "direcao": "norte"},
+    ]
+    assert data["lotes_sem_matricula"] == ["Lote 9"]
+    # O dict original (raw_json/cache) não é alterado
+    assert parsed["matriculas_encontradas"][0]["numero"] == "1.234"
+
+
+def test_analysis_result_lookups_follow_changes():
+    result = build_analysis_result("a.pdf", {
+        "matriculas_encontradas": [{"numero": "1.234", "proprietarios": ["Ana"]}],
+        "proprietarios_identificados": {},
+    })
+    assert result.matricula("Mat. 1234").proprietarios == ["Ana"]
+    assert result.proprietarios_de("1234") == ["Ana"]
+
+    result.proprietarios_identificados = {"1234": ["Bruno"]}
+    assert result.proprietarios_de("1.234") == ["Bruno"]
+
+    result.matriculas_encontradas.append(MatriculaInfo("5678", ["Carla"], "", [], []))
+    result.reindex()
+    assert result.matricula("5.678").proprietarios == ["Carla"]
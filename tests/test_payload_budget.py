@@ -0,0 +1,56 @@
+"""PayloadBudgeter: degrau de resolução/qualidade por página dentro do orçamento de bytes."""
+
+from budgets import ENCODING_TIERS, PayloadBudgeter, _tier_cost
+
+MB = 1024 * 1024
+
+
+def test_small_document_starts_at_best_tier():
+    assert PayloadBudgeter(5, budget_bytes=20 * MB).next_settings() == ENCODING_TIERS[0]
+
+
+def test_many_pages_start_at_economic_tier():
+    assert PayloadBudgeter(60, budget_bytes=20 * MB).next_settings() == (800, 50)
+
+
+def test_impossible_budget_uses_last_tier():
+    assert PayloadBudgeter(10, budget_bytes=1024).next_settings() == ENCODING_TIERS[-1]
+
+
+def test_steps_down_when_pages_are_heavier_than_expected():
+    budgeter = PayloadBudgeter(10, budget_bytes=8 * MB)
+    tier = budgeter.next_settings()
+    assert tier == ENCODING_TIERS[0]
+    budgeter.record(2 * MB, tier)
+    assert ENCODING_TIERS.index(budgeter.next_settings()) > 0
+
+
+def test_steps_back_up_but_not_above_initial_tier():
+    budgeter = PayloadBudgeter(10, budget_bytes=8 * MB)
+    budgeter.record(2 * MB, budgeter.next_settings())
+    lowered = budgeter.tier_index
+    for _ in range(6):  # páginas seguintes quase em branco
+        budgeter.record(20 * 1024, budgeter.next_settings())
+    assert budgeter.tier_index < lowered
+    assert budgeter.tier_index == budgeter.max_tier_index
+
+
+def test_projection_counts_pages_still_encoding():
+    alone = PayloadBudgeter(4, budget_bytes=2 * MB)
+    alone.record(600 * 1024, alone.next_settings())
+
+    concurrent = PayloadBudgeter(4, budget_bytes=2 * MB)
+    tiers = [concurrent.next_settings() for _ in range(3)]
+    concurrent.record(600 * 1024, tiers[0])
+    # As duas páginas ainda em codificação no degrau mais alto entram na projeção
+    assert concurrent.tier_index > alone.tier_index
+
+    concurrent.skip(tiers[1])
+    assert concurrent.used_bytes == 600 * 1024
+    assert concurrent.pages_per_tier == {ENCODING_TIERS[0]: 1}
+    assert "1 página(s)" in concurrent.summary()
+
+
+def test_tier_cost_decreases_along_tiers():
+    costs = [_tier_cost(tier) for tier in ENCODING_TIERS]
+    assert costs == sorted(costs, reverse=True)
@@ -0,0 +1,91 @@
+"""ResultCache: gravação, leitura e remoção LRU por tamanho."""
+
+import json
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, make_cache_key, text_sha256
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio controlado: o LRU ordena por acessado_em."""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(result_cache.time, "time", tick)
+    return now
+
+
+def _entry(n, size=100):
+    return {"n": n, "texto": "x" * size}
+
+
+def _size(value):
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def test_put_and_get_roundtrip(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 1024)
+    assert cache.get("a") is None
+    assert cache.put("a", {"numero": "12345", "nome": "José"})
+    assert cache.get("a") == {"numero": "12345", "nome": "José"}
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = ResultCache(str(tmp_path), max_bytes=int(_size(_entry(0)) * 3.5))
+    for key in ("a", "b", "c"):
+        cache.put(key, _entry(key))
+    assert cache.get("a") is not None  # "a" passa a ser o mais recente
+    cache.put("d", _entry("d"))
+
+    assert cache.get("b") is None
+    assert [cache.get(key)["n"] for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+def test_replacing_a_key_does_not_count_twice(tmp_path, clock):
+    cache = ResultCache(str(tmp_path), max_bytes=int(_size(_entry(0)) * 2.5))
+    cache.put("a", _entry("a"))
+    cache.put("b", _entry("b"))
+    cache.put("a", _entry("a"))
+    assert cache.get("a") is not None
+    assert cache.get("b") is not None
+
+
+def test_entry_larger_than_limit_is_not_stored(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=50)
+    assert cache.put("a", _entry("a")) is False
+    assert cache.get("a") is None
+
+
+def test_disabled_cache_is_a_no_op(tmp_path):
+    cache = ResultCache(str(tmp_path), enabled=False)
+    assert cache.put("a", _entry("a")) is False
+    assert cache.get("a") is None
+
+
+def test_clear(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 1024)
+    cache.put("a", _entry("a"))
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_cache_key_depends_on_every_part():
+    base = make_cache_key("arquivo", "modelo", text_sha256("prompt"))
+    assert base == make_cache_key("arquivo", "modelo", text_sha256("prompt"))
+    assert base != make_cache_key("arquivo", "outro-modelo", text_sha256("prompt"))
+    assert base != make_cache_key("arquivo", "modelo", text_sha256("outro prompt"))
+
+
+@pytest.mark.parametrize("name, value", [("RENDER_GRAYSCALE", True), ("MAX_RENDER_DPI", 150),
+                                         ("MAX_PAYLOAD_MB", 5), ("ENCODING_TIERS", [(1024, 60)])])
+def test_image_pipeline_options_follow_render_settings(monkeypatch, name, value):
+    import analysis
+    before = analysis._image_pipeline_options()
+    monkeypatch.setattr(analysis, name, value)
+    assert analysis._image_pipeline_options() != before
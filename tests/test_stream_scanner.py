@@ -0,0 +1,68 @@
+"""JSONStreamScanner: o resultado não depende de como o texto chega em pedaços."""
+
+import json
+
+import pytest
+
+from json_repair import JSONStreamScanner
+
+DOCUMENT = json.dumps({
+    "matricula_principal": "12345",
+    "matriculas_encontradas": [
+        {"numero": "12345", "proprietarios": ["Ana \"Tuca\" Souza", "João {Neto}"], "area": 360.5},
+        {"numero": "678", "proprietarios": [], "ativa": True, "obs": None},
+    ],
+    "lotes_confrontantes": [{"identificador": "Lote 7", "direcao": "norte"}],
+    "confidence": 0.87,
+}, ensure_ascii=False, indent=1)
+
+WATCH = {"matriculas_encontradas": "matricula", "lotes_confrontantes": "confrontante"}
+
+
+def _scan(chunks):
+    items = []
+    scanner = JSONStreamScanner(on_item=lambda kind, item: items.append((kind, item)), watch=WATCH)
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner, items
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_chunked_feed_matches_one_shot(size):
+    text = "Resposta:\n" + DOCUMENT
+    one_shot, one_shot_items = _scan([text])
+    chunked, chunked_items = _scan(_chunks(text, size))
+
+    assert chunked.done and one_shot.done
+    assert not chunked.failed
+    assert chunked_items == one_shot_items
+    assert json.loads(chunked.closed_text(text)) == json.loads(DOCUMENT)
+    assert (chunked.start, chunked.safe_end) == (one_shot.start, one_shot.safe_end)
+
+
+def test_items_delivered_as_they_close():
+    _, items = _scan([DOCUMENT])
+    parsed = json.loads(DOCUMENT)
+    assert items == (
+        [("matricula", m) for m in parsed["matriculas_encontradas"]]
+        + [("confrontante", lote) for lote in parsed["lotes_confrontantes"]]
+    )
+
+
+@pytest.mark.parametrize("size", [1, 5])
+def test_truncated_stream_closes_at_last_safe_point(size):
+    text = DOCUMENT[:DOCUMENT.index('"678"') + 3]
+    scanner, items = _scan(_chunks(text, size))
+    assert not scanner.done and not scanner.failed
+    assert [item["numero"] for _, item in items] == ["12345"]
+    closed = json.loads(scanner.closed_text(text))
+    assert closed["matriculas_encontradas"][0]["numero"] == "12345"
+
+
+def test_structure_error_stops_scanning():
+    scanner, _ = _scan(['{"a": 1 "b": 2}'])
+    assert scanner.failed
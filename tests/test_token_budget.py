@@ -0,0 +1,65 @@
+"""Orçamento de tokens do lote (TokenBudget)."""
+
+import pytest
+
+from budgets import BudgetExceededError, TokenBudget
+from run_metrics import RunMetrics
+
+
+def _metrics(total_tokens=0):
+    metrics = RunMetrics("a.pdf")
+    metrics.tokens["total_tokens"] = total_tokens
+    return metrics
+
+
+def test_token_reserve_and_settle_swap_estimate_for_usage():
+    budget = TokenBudget(100000, "parar", page_tokens=1000, call_tokens=1000)
+    metrics = _metrics()
+    assert budget.reserve(metrics, pages=9) == 10000
+    assert budget.reserved_tokens == 10000
+
+    metrics.tokens["total_tokens"] = 5000
+    budget.settle(metrics)
+    assert budget.reserved_tokens == 0
+    assert budget.used_tokens == 5000
+    assert budget.files == 1
+    # Consumo real foi metade do estimado: as próximas estimativas se corrigem
+    assert budget.correction == pytest.approx(0.5)
+    assert budget.estimate(9) == 5000
+
+
+def test_token_reserve_counts_concurrent_reservations():
+    budget = TokenBudget(15000, "parar", page_tokens=1000, call_tokens=1000)
+    budget.reserve(_metrics(), pages=9)
+    with pytest.raises(BudgetExceededError):
+        budget.reserve(_metrics(), pages=9)
+    assert budget.refused == 1
+
+
+def test_token_reserve_reduces_image_tier_before_refusing():
+    budget = TokenBudget(6000, "reduzir", page_tokens=1000, call_tokens=1000)
+    metrics = _metrics()
+    reserved = budget.reserve(metrics, pages=9)
+    assert metrics.degrau_imagem > 0
+    assert reserved <= 6000
+    assert reserved == budget.estimate(9, metrics.degrau_imagem)
+
+
+def test_token_reserve_text_uses_characters():
+    budget = TokenBudget(100000, "reduzir", call_tokens=1000)
+    metrics = _metrics()
+    assert budget.reserve(metrics, pages=3, text_chars=7000) == 3000
+    assert metrics.degrau_imagem == 0
+
+
+def test_token_settle_without_reservation_only_adds_usage():
+    budget = TokenBudget(100000, "parar")
+    budget.settle(_metrics(total_tokens=700))
+    assert budget.used_tokens == 700
+    assert budget.files == 0
+    assert budget.correction == 1.0
+
+
+def test_token_budget_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        TokenBudget(1000, "ignorar")